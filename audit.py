@@ -0,0 +1,272 @@
+# audit.py - Запись журнала аудита
+#
+# Два режима (Config.AUDIT_MODE):
+#   'transaction' - запись сразу; внутри открытой транзакции вызывающего кода
+#                   строка фиксируется вместе с ней, иначе - отдельным коммитом;
+#   'async'       - события вне транзакции копятся в очереди и пишутся фоновым
+#                   потоком пачками (executemany, один коммит на пачку) по
+#                   достижении AUDIT_BATCH_SIZE событий или раз в AUDIT_FLUSH_INTERVAL.
+#
+# Гарантии: в обоих режимах событие внутри транзакции вызывающего кода
+# записывается в ту же транзакцию - откат операции откатывает и запись аудита.
+# В режиме 'async' отдельные события могут быть потеряны только при аварийном
+# завершении процесса (не более одной пачки); flush() ждет записи всех ранее
+# поставленных событий, при штатном завершении очередь дописывается (atexit).
+# Пока БД недоступна, поток повторяет запись текущей пачки и не разбирает
+# очередь: память ограничена AUDIT_QUEUE_MAX + AUDIT_BATCH_SIZE событиями.
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Optional, Any, Dict, List, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = '''
+    INSERT INTO audit_log
+    (employee_id, action, table_name, record_id, old_values, new_values, ip_address, user_agent)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+AuditRow = Tuple[Optional[int], str, Optional[str], Optional[int], Optional[str], Optional[str], Optional[str], Optional[str]]
+
+def make_audit_row(employee_id: Optional[int], action: str, table_name: str = None,
+                   record_id: int = None, old_values: Any = None, new_values: Any = None,
+                   ip: str = None, user_agent: str = None) -> AuditRow:
+    """Строка audit_log (значения сериализуются в JSON)"""
+    return (
+        employee_id,
+        action,
+        table_name,
+        record_id,
+        json.dumps(old_values) if old_values else None,
+        json.dumps(new_values) if new_values else None,
+        ip,
+        user_agent
+    )
+
+class AuditWriter:
+    """Запись аудита в режиме 'transaction'"""
+    
+    mode = 'transaction'
+    
+    def __init__(self, pool):
+        self.pool = pool
+        self._closed = False
+        self._stats = {'written': 0, 'inline': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+    
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+    
+    def log(self, row: AuditRow):
+        """Запись события"""
+        conn = self.pool.acquire()
+        # Если вызывающий код уже открыл транзакцию на этом соединении,
+        # запись войдет в нее и будет зафиксирована вместе с ней
+        in_caller_transaction = conn.in_transaction
+        
+        try:
+            if not in_caller_transaction:
+                self._write_now(conn, row)
+                return
+            conn.execute(INSERT_SQL, row)
+            self._count('inline')
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Ошибка при записи в аудит-лог: {e}")
+            if not in_caller_transaction:
+                conn.rollback()
+        finally:
+            conn.close()
+    
+    def _write_now(self, conn, row: AuditRow):
+        """Событие вне транзакции: отдельный коммит"""
+        conn.execute(INSERT_SQL, row)
+        conn.commit()
+        self._count('written')
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Все события уже записаны"""
+        return True
+    
+    def close(self):
+        """Завершение работы"""
+        self._closed = True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики записи аудита"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mode'] = self.mode
+        return stats
+
+# Служебная отметка в очереди: записать накопленное немедленно
+_FLUSH = object()
+
+class BatchedAuditWriter(AuditWriter):
+    """Запись аудита в режиме 'async': очередь и фоновый поток"""
+    
+    mode = 'async'
+    
+    def __init__(self, pool, batch_size: int = None, flush_interval: float = None,
+                 max_queue: int = None):
+        super().__init__(pool)
+        self.batch_size = batch_size or Config.AUDIT_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.AUDIT_FLUSH_INTERVAL
+        # Переполненная очередь блокирует вызывающего, события не теряются
+        self._queue = queue.Queue(maxsize=max_queue or Config.AUDIT_QUEUE_MAX)
+        self._seq_lock = threading.Lock()
+        self._written = threading.Condition()
+        self._enqueued_seq = 0
+        self._written_seq = 0
+        self._stats.update({'batches': 0, 'queued': 0})
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+    
+    def _write_now(self, conn, row: AuditRow):
+        """Событие вне транзакции: в очередь"""
+        with self._seq_lock:
+            queued = not self._closed
+            if queued:
+                self._enqueued_seq += 1
+                self._queue.put((self._enqueued_seq, row))
+        
+        if queued:
+            self._count('queued')
+        else:
+            # После остановки потока пишем синхронно
+            super()._write_now(conn, row)
+    
+    def _run(self):
+        """Фоновый поток: сбор пачек и запись"""
+        batch: List[Tuple[int, AuditRow]] = []
+        deadline = None
+        
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _FLUSH
+            
+            if item is None:
+                self._write_batch(batch)
+                return
+            if item is not _FLUSH:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            
+            if item is _FLUSH or len(batch) >= self.batch_size:
+                while not self._write_batch(batch):
+                    # БД недоступна: очередь не разбираем, пока пачка не записана.
+                    # Повтор пишет ту же пачку (не больше batch_size событий),
+                    # заполненная очередь блокирует вызывающих
+                    time.sleep(self.flush_interval)
+                batch = []
+                deadline = None
+    
+    def _write_batch(self, batch: List[Tuple[int, AuditRow]]) -> bool:
+        """Запись пачки одной транзакцией"""
+        if not batch:
+            self._mark_written(None)
+            return True
+        
+        conn = self.pool.acquire()
+        try:
+            conn.executemany(INSERT_SQL, [row for _, row in batch])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self._count('errors')
+            logger.error(f"Ошибка при записи пачки аудита ({len(batch)} событий): {e}")
+            return False
+        finally:
+            conn.close()
+        
+        self._count('written', len(batch))
+        self._count('batches')
+        self._mark_written(batch[-1][0])
+        return True
+    
+    def _mark_written(self, seq: Optional[int]):
+        with self._written:
+            if seq is not None:
+                self._written_seq = max(self._written_seq, seq)
+            self._written.notify_all()
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Ожидание записи всех поставленных ранее событий"""
+        # Без _seq_lock: при заполненной очереди под ней ждет вызывающий
+        target = self._enqueued_seq
+        if self._written_seq >= target:
+            return True
+        if not self._thread.is_alive():
+            return False
+        
+        try:
+            self._queue.put(_FLUSH, timeout=timeout)
+        except queue.Full:
+            return False
+        with self._written:
+            return self._written.wait_for(lambda: self._written_seq >= target, timeout)
+    
+    def close(self, timeout: float = 30):
+        """Дописывание очереди и остановка потока"""
+        if self._closed:
+            return
+        # Пока БД недоступна, очередь заполнена и вызывающие ждут под _seq_lock
+        if not self._seq_lock.acquire(timeout=-1 if timeout is None else timeout):
+            self._closed = True
+            logger.error("Очередь аудита не дописана: БД недоступна")
+            return
+        try:
+            self._closed = True
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.error("Очередь аудита не дописана: БД недоступна")
+            return
+        finally:
+            self._seq_lock.release()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Очередь аудита не дописана за отведенное время")
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+_writers: Dict[str, AuditWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_audit_writer(pool, mode: str = None) -> AuditWriter:
+    """Общий для процесса писатель аудита к файлу БД пула"""
+    mode = mode or Config.AUDIT_MODE
+    with _writers_lock:
+        writer = _writers.get(pool.db_path)
+        if writer is None or writer._closed or writer.pool is not pool:
+            if mode == 'async':
+                writer = BatchedAuditWriter(pool)
+            elif mode == 'transaction':
+                writer = AuditWriter(pool)
+            else:
+                raise ValueError(f"Неизвестный режим аудита: {mode}")
+            _writers[pool.db_path] = writer
+        return writer
+
+def close_all_writers():
+    """Дописывание очередей аудита (при завершении процесса)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+atexit.register(close_all_writers)
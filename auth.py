@@ -1,9 +1,104 @@
 # auth.py - Модуль аутентификации и авторизации
 import jwt
+import hashlib
 import secrets
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from database import Database
+from config import Config
+import cache
+
+def session_id(token: str) -> str:
+    """Идентификатор сессии для cookie: хэш токена (сам токен в cookie не хранится)"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionCache:
+    """Кэш сотрудников и их активных сессий для проверки каждого запроса.
+    
+    Запись по сотруднику: данные из employees и идентификаторы активных
+    сессий user_sessions со сроком действия. Сессия отозвана, если ее нет
+    в записи (выход, сотрудник отключен, срок истек). Запись сбрасывается
+    тегом 'employee:<id>' при входе, выходе и смене пароля в этом процессе;
+    изменения из других процессов обнаруживаются по версии данных 'employees'
+    (одно чтение не чаще раза в USER_CACHE_REVALIDATE секунд, а не на каждый запрос).
+    """
+    
+    def __init__(self, db: Database, max_entries: int = None, ttl: float = None,
+                 revalidate_interval: float = None):
+        self.db = db
+        self.revalidate_interval = (revalidate_interval if revalidate_interval is not None
+                                    else Config.USER_CACHE_REVALIDATE)
+        self._cache = cache.ResponseCache(max_entries or Config.USER_CACHE_SIZE,
+                                          ttl if ttl is not None else Config.USER_CACHE_TTL)
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'revoked': 0, 'revalidations': 0, 'external_changes': 0}
+    
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+    
+    def _revalidate(self):
+        """Сброс кэша, если сотрудники или сессии изменены другим процессом"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.revalidate_interval:
+                return
+            self._checked_at = now
+            self._stats['revalidations'] += 1
+        
+        version = self.db.get_data_version('employees')['version']
+        with self._lock:
+            changed = self._version is not None and version != self._version
+            self._version = version
+            if changed:
+                self._stats['external_changes'] += 1
+        if changed:
+            self._cache.clear()
+    
+    def _load(self, user_id: int) -> Dict[str, Any]:
+        """Сотрудник и его активные сессии из БД"""
+        self._count('loads')
+        conn = self.db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT * FROM employees WHERE id = ? AND is_active = 1", (user_id,)
+            ).fetchone()
+            sessions = {}
+            if row:
+                sessions = {
+                    session_id(s['session_token']): s['expires_at']
+                    for s in self.db.get_active_sessions(user_id)
+                }
+            return {'user': dict(row) if row else None, 'sessions': sessions}
+        finally:
+            conn.close()
+    
+    def get_user(self, user_id: int, sid: str) -> Optional[Dict[str, Any]]:
+        """Данные сотрудника, если сессия sid активна, иначе None"""
+        self._revalidate()
+        key = f"employee:{user_id}"
+        entry = self._cache.get(key)
+        if entry is None:
+            generation = self._cache.generation()
+            entry = self._load(user_id)
+            self._cache.set(key, entry, tags=[key], generation=generation)
+        
+        expires_at = entry['sessions'].get(sid) if sid else None
+        if entry['user'] is None or expires_at is None or expires_at <= datetime.utcnow().isoformat():
+            self._count('revoked')
+            return None
+        return entry['user']
+    
+    def stats(self) -> Dict[str, Any]:
+        """Попадания и промахи кэша, загрузки из БД, отклоненные сессии"""
+        stats = self._cache.stats()
+        with self._lock:
+            stats.update(self._stats)
+        return stats
 
 class AuthManager:
     def __init__(self, db: Database, secret_key: str = None):
@@ -74,6 +169,7 @@ class AuthManager:
                 ))
                 
                 conn.commit()
+                cache.invalidate(f"employee:{user['id']}")
                 
                 # Логируем успешный вход
                 self.db.log_audit(
@@ -150,6 +246,7 @@ class AuthManager:
             ''', (user_id,))
             
             conn.commit()
+            cache.invalidate(f"employee:{user_id}")
             
             # Логируем выход
             self.db.log_audit(
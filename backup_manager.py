@@ -14,6 +14,16 @@ class BackupManager:
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
     
+    def _copy_database(self, source_path: str, target_path: str):
+        """Согласованная копия БД средствами SQLite"""
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    
     def create_backup(self) -> str:
         """Создание резервной копии базы данных"""
         try:
@@ -21,8 +31,9 @@ class BackupManager:
             backup_name = f"backup_{timestamp}.db"
             backup_path = os.path.join(self.backup_dir, backup_name)
             
-            # Копируем файл БД
-            shutil.copy2(self.db_path, backup_path)
+            # Копируем БД через backup API: в режиме WAL часть зафиксированных
+            # данных лежит в файле -wal, и простое копирование файла их теряет
+            self._copy_database(self.db_path, backup_path)
             
             # Создаем метаданные бэкапа
             metadata = {
@@ -102,8 +113,9 @@ class BackupManager:
                 print("✗ Файл базы данных не найден в архиве")
                 return False
             
-            # Заменяем текущую БД
-            shutil.copy2(db_file, self.db_path)
+            # Заменяем текущую БД (через backup API, чтобы не остался
+            # устаревший файл -wal от прежней базы)
+            self._copy_database(db_file, self.db_path)
             
             # Очищаем временные файлы
             shutil.rmtree(temp_dir)
@@ -0,0 +1 @@
+# benchmarks - Нагрузочные и микробенчмарки (запуск: python -m benchmarks.<модуль>)
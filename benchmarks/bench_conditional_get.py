@@ -0,0 +1,86 @@
+# bench_conditional_get.py - Экономия на опросе JSON API условными запросами
+#
+# Виджеты витрины периодически опрашивают /api/products, /api/content и
+# /api/stats. Замер сравнивает обычный опрос (200, полный ответ) с опросом
+# с If-None-Match (304 без тела и без основного запроса): байты ответа
+# (заголовки и тело) и процессорное время на один опрос.
+#
+# Запуск: python -m benchmarks.bench_conditional_get [--polls 500] [--scale 0.2]
+import argparse
+import os
+import tempfile
+import time
+from config import Config
+
+ENDPOINTS = [
+    '/api/products?limit=50',
+    '/api/content?page=index',
+    '/api/stats',
+]
+
+def response_size(response) -> int:
+    """Байты ответа: строка статуса, заголовки и тело"""
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+    return len(f"HTTP/1.1 {response.status}\r\n") + headers + 2 + len(response.get_data())
+
+def poll(client, url: str, polls: int, headers: dict = None) -> dict:
+    """Серия опросов: статус, байт и мс процессорного времени на опрос"""
+    sizes = []
+    statuses = set()
+    started = time.process_time()
+    for _ in range(polls):
+        response = client.get(url, headers=headers or {})
+        statuses.add(response.status_code)
+        sizes.append(response_size(response))
+    cpu_ms = (time.process_time() - started) * 1000 / polls
+    return {'status': '/'.join(map(str, sorted(statuses))), 'bytes': sum(sizes) / polls, 'cpu_ms': cpu_ms}
+
+def main():
+    parser = argparse.ArgumentParser(description="Опрос JSON API с условными запросами и без них")
+    parser.add_argument('--polls', type=int, default=500, help="опросов на точку")
+    parser.add_argument('--scale', type=float, default=0.2, help="объем тестовых данных (см. query_plans.seed_dataset)")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="bench_conditional_") as workdir:
+        Config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+        Config.RESPONSE_CACHE_ENABLED = False
+        
+        import web_app
+        try:
+            run(web_app, args.polls, args.scale)
+        finally:
+            web_app.get_db().close()
+
+def run(web_app, polls: int, scale: float):
+    """Замер точек API и проверка ETag после изменения данных"""
+    from query_plans import seed_dataset
+    seed_dataset(web_app.get_db(), scale)
+    client = web_app.app.test_client()
+    
+    print(f"{'Точка':<26}{'Байт 200':>10}{'Байт 304':>10}{'ЦП 200, мс':>12}{'ЦП 304, мс':>12}"
+          f"{'Экономия байт':>15}{'Экономия ЦП':>13}")
+    for url in ENDPOINTS:
+        full = poll(client, url, polls)
+        etag = client.get(url).headers['ETag']
+        conditional = poll(client, url, polls, headers={'If-None-Match': etag})
+        if conditional['status'] != '304':
+            print(f"{url:<26}ожидался 304, получено {conditional['status']}")
+            continue
+        print(f"{url:<26}{full['bytes']:>10.0f}{conditional['bytes']:>10.0f}"
+              f"{full['cpu_ms']:>12.3f}{conditional['cpu_ms']:>12.3f}"
+              f"{1 - conditional['bytes'] / full['bytes']:>14.0%}"
+              f"{1 - conditional['cpu_ms'] / full['cpu_ms']:>12.0%}")
+    
+    # После изменения данных тот же ETag должен дать полный ответ
+    etag = client.get(ENDPOINTS[0]).headers['ETag']
+    conn = web_app.get_db().get_connection()
+    try:
+        conn.execute("UPDATE products SET quantity = quantity + 1 WHERE id = 1")
+        conn.commit()
+    finally:
+        conn.close()
+    status = client.get(ENDPOINTS[0], headers={'If-None-Match': etag}).status_code
+    print(f"\nПосле изменения товара: {status} ({'верно' if status == 200 else 'ошибка: ожидался 200'})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench_create_order.py - Время создания заказа в зависимости от числа позиций
+#
+# Сравнивает Database.create_order_checked (один запрос на чтение, executemany,
+# одно условное списание) с прежним построчным алгоритмом
+# (SELECT + INSERT + UPDATE на каждую позицию).
+#
+# Запуск: python -m benchmarks.bench_create_order [--sizes 1 100 5000] [--repeat 5]
+import argparse
+import os
+import secrets
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+from database import Database, StockShortageError
+
+def seed(db: Database, products: int):
+    """Тестовые товары с большим запасом и клиент"""
+    conn = db.get_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO products (sku, name, category, unit_price, quantity)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f"SKU{i:06d}", f"Товар {i}", 'Тест', 100 + i % 900, 10 ** 9) for i in range(1, products + 1)])
+        conn.execute("INSERT INTO clients (client_code, full_name) VALUES ('BENCH', 'Клиент для замеров')")
+        conn.commit()
+    finally:
+        conn.close()
+
+def create_order_per_item(db: Database, order_data: dict, employee_id: int) -> int:
+    """Прежний алгоритм: три запроса на каждую позицию"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        order_number = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{secrets.token_hex(2).upper()}"
+        cursor.execute('''
+            INSERT INTO orders (order_number, client_id, employee_id, status, notes)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (order_number, order_data['client_id'], employee_id, 'pending', None))
+        order_id = cursor.lastrowid
+        total_amount = 0
+        for item in order_data['items']:
+            cursor.execute('SELECT unit_price, quantity FROM products WHERE id = ?', (item['product_id'],))
+            product = cursor.fetchone()
+            if product['quantity'] < item['quantity']:
+                raise ValueError("Недостаточно товара в наличии")
+            item_total = product['unit_price'] * item['quantity']
+            total_amount += item_total
+            cursor.execute('''
+                INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (order_id, item['product_id'], item['quantity'], product['unit_price'], item_total))
+            cursor.execute('''
+                UPDATE products SET quantity = quantity - ?, last_updated = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (item['quantity'], item['product_id']))
+        cursor.execute("UPDATE orders SET total_amount = ? WHERE id = ?", (total_amount, order_id))
+        db.log_audit(employee_id, 'CREATE_ORDER', table_name='orders', record_id=order_id,
+                     new_values=order_data)
+        conn.commit()
+        return order_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def measure(func, order_data: dict, repeat: int) -> float:
+    """Медиана времени создания заказа, мс"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(order_data, 1)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер создания заказа по числу позиций")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1, 100, 5000], help="число позиций в заказе")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов на размер")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="bench_orders_") as workdir:
+        db = Database(os.path.join(workdir, 'bench.db'))
+        try:
+            run(db, args.sizes, args.repeat)
+        finally:
+            db.close()
+
+def run(db: Database, sizes: List[int], repeat: int):
+    """Замер по размерам заказа и проверка отказа при нехватке"""
+    seed(db, max(sizes))
+    
+    def per_item(order_data, employee_id):
+        return create_order_per_item(db, order_data, employee_id)
+    
+    print(f"{'Позиций':>8}{'Построчно, мс':>16}{'Пакетно, мс':>14}{'Ускорение':>11}")
+    for size in sizes:
+        order_data = {
+            'client_id': 1,
+            'items': [{'product_id': i, 'quantity': 1} for i in range(1, size + 1)]
+        }
+        old = measure(per_item, order_data, repeat)
+        new = measure(db.create_order_checked, order_data, repeat)
+        print(f"{size:>8}{old:>16.2f}{new:>14.2f}{old / new:>10.1f}x")
+    
+    # Проверка отказа: последняя позиция не может быть выполнена
+    order_data = {
+        'client_id': 1,
+        'items': [{'product_id': 1, 'quantity': 1}, {'product_id': 2, 'quantity': 10 ** 10}]
+    }
+    try:
+        db.create_order_checked(order_data, 1)
+        print("Ошибка: заказ сверх остатка создан")
+    except StockShortageError as e:
+        print(f"Нехватка обнаружена: {', '.join(e.skus)}")
+
+if __name__ == "__main__":
+    main()
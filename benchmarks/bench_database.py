@@ -0,0 +1,252 @@
+# bench_database.py - Микробенчмарки методов Database на БД разного объема
+#
+# Каждый метод выполняется на данных data_generator.py (пресеты 1k, 100k,
+# 1m заказов). Для метода записываются: медиана и p95 времени вызова,
+# число SQL-запросов на вызов (наблюдатель database.add_query_observer) и
+# пик выделенной памяти на вызов (tracemalloc). Время замеряется отдельно,
+# без наблюдателей и tracemalloc.
+#
+# Результаты дописываются в историю (--history, JSON) и сравниваются с
+# сохраненным там базовым прогоном: замедление или рост памяти больше
+# --max-regression процентов либо любой рост числа запросов - код выхода 1.
+# Базовый прогон задается --save-baseline.
+#
+# Сгенерированные БД кэшируются в --data-dir (пресет 1m создается несколько
+# минут); методы с записью работают на копии.
+#
+# Запуск: python -m benchmarks.bench_database [--sizes 1k,100k,1m] [--save-baseline]
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_database_history.json')
+DATA_DIR = os.path.join(tempfile.gettempdir(), 'trade_bench_data')
+# Фиксированный конец периода данных: БД одного пресета одинаковы при каждой генерации
+FIXTURE_END = datetime(2025, 1, 1)
+HISTORY_RUNS = 50
+# Разница меньше этих величин - шум измерения, а не ухудшение
+MIN_DELTA_MS = 0.01
+MIN_DELTA_KB = 1.0
+
+class Context:
+    """Параметры вызовов, подобранные по данным БД"""
+    
+    def __init__(self, db):
+        conn = db.get_connection()
+        try:
+            employee = conn.execute(
+                "SELECT id, username FROM employees WHERE role = 'cashier' ORDER BY id LIMIT 1").fetchone()
+            self.employee_id, self.username = employee['id'], employee['username']
+            clients = conn.execute("SELECT COUNT(*) FROM clients WHERE is_active = 1").fetchone()[0]
+            # Глубокая страница: 90% активных клиентов пропускается через OFFSET
+            self.deep_offset = int(clients * 0.9)
+            self.category = conn.execute(
+                "SELECT category FROM products GROUP BY category ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+            self.client_id = conn.execute("SELECT MAX(id) FROM clients").fetchone()[0]
+            # Товары с большим остатком: заказы не упрутся в нехватку
+            self.product_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM products WHERE is_active = 1 AND quantity >= 100 ORDER BY id LIMIT 50")]
+        finally:
+            conn.close()
+        self.calls = 0
+    
+    def next_client(self) -> Dict[str, Any]:
+        self.calls += 1
+        return {'full_name': f"Бенчмарков Клиент {self.calls}", 'phone': f"+7999{self.calls:07d}",
+                'email': f"bench{self.calls}@example.com", 'address': "г. Москва, ул. Тестовая, д. 1",
+                'personal_data_consent': True}
+    
+    def next_order(self) -> Dict[str, Any]:
+        self.calls += 1
+        products = self.product_ids
+        return {'client_id': self.client_id, 'items': [
+            {'product_id': products[(self.calls + i) % len(products)], 'quantity': 1} for i in range(3)]}
+
+# Метод -> вызов; методы с записью выполняются на копии БД
+CASES: List[Tuple[str, Callable[[Any, Context], Any]]] = [
+    ('get_clients_page', lambda db, ctx: db.get_clients_page(limit=100)),
+    ('get_clients_page_deep_offset', lambda db, ctx: db.get_clients_page(limit=100, offset=ctx.deep_offset)),
+    ('get_products', lambda db, ctx: db.get_products(limit=100)),
+    ('get_products_category', lambda db, ctx: db.get_products(category=ctx.category, limit=100)),
+    ('create_client', lambda db, ctx: db.create_client(ctx.next_client(), ctx.employee_id)),
+    ('create_order', lambda db, ctx: db.create_order_checked(ctx.next_order(), ctx.employee_id)),
+    ('authenticate_user', lambda db, ctx: db.authenticate_user(ctx.username, 'Generated-1')),
+    ('log_audit', lambda db, ctx: db.log_audit(ctx.employee_id, 'BENCHMARK', 'clients', ctx.client_id)),
+    ('update_password', lambda db, ctx: db.update_password(ctx.employee_id, 'Generated-1')),
+]
+
+def fixture_path(preset: str, data_dir: str) -> str:
+    """Сгенерированная БД пресета (создается при первом обращении)"""
+    from data_generator import PRESETS, generate
+    path = os.path.join(data_dir, f"{preset}.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Генерация БД {preset} в {path}...")
+        partial = path + '.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate(partial, PRESETS[preset], end=FIXTURE_END, progress=lambda message: None)
+        os.replace(partial, path)
+    return path
+
+def measure(call: Callable[[], Any], min_time: float, min_iter: int, max_iter: int,
+            probe_iter: int) -> Dict[str, float]:
+    """Время (без наблюдателей), запросы и память на вызов"""
+    import database
+    
+    for _ in range(3):
+        call()
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < max_iter and (len(times) < min_iter or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - started)
+    
+    statements = [0]
+    def count(event):
+        statements[0] += 1
+    database.add_query_observer(count)
+    try:
+        for _ in range(probe_iter):
+            call()
+    finally:
+        database.remove_query_observer(count)
+    
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(probe_iter):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    
+    times.sort()
+    return {
+        'iterations': len(times),
+        'median_ms': round(statistics.median(times) * 1000, 4),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 4),
+        'statements': round(statements[0] / probe_iter, 2),
+        'peak_kb': round(statistics.median(peaks) / 1024, 1),
+    }
+
+def run_size(preset: str, data_dir: str, options: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Все методы на копии БД пресета"""
+    from database import Database
+    from query_plans import copy_database
+    with tempfile.TemporaryDirectory(prefix=f"bench_db_{preset}_") as workdir:
+        work_path = os.path.join(workdir, 'bench.db')
+        copy_database(fixture_path(preset, data_dir), work_path)
+        db = Database(work_path)
+        try:
+            ctx = Context(db)
+            return {name: measure(lambda: case(db, ctx), **options) for name, case in CASES}
+        finally:
+            db.close()
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_history(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {'baseline': None, 'runs': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_history(path: str, history: Dict[str, Any]):
+    history['runs'] = history['runs'][-HISTORY_RUNS:]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Any],
+            max_regression: float) -> List[str]:
+    """Ухудшения против базового прогона"""
+    regressions = []
+    limit = 1 + max_regression / 100
+    for preset, methods in results.items():
+        for name, current in methods.items():
+            base = baseline['results'].get(preset, {}).get(name)
+            if base is None:
+                continue
+            if current['median_ms'] > max(base['median_ms'] * limit, base['median_ms'] + MIN_DELTA_MS):
+                regressions.append(f"{preset} {name}: {current['median_ms']:.3f} мс "
+                                   f"против {base['median_ms']:.3f} мс")
+            if current['statements'] > base['statements']:
+                regressions.append(f"{preset} {name}: {current['statements']:g} запросов "
+                                   f"против {base['statements']:g}")
+            if current['peak_kb'] > max(base['peak_kb'] * limit, base['peak_kb'] + MIN_DELTA_KB):
+                regressions.append(f"{preset} {name}: {current['peak_kb']:.1f} КБ памяти "
+                                   f"против {base['peak_kb']:.1f} КБ")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки методов Database")
+    parser.add_argument('--sizes', default='1k,100k', help="пресеты data_generator через запятую (1k,100k,1m)")
+    parser.add_argument('--methods', help="только эти методы (через запятую)")
+    parser.add_argument('--min-time', type=float, default=0.5, help="замер метода не короче, секунд")
+    parser.add_argument('--min-iter', type=int, default=5)
+    parser.add_argument('--max-iter', type=int, default=2000)
+    parser.add_argument('--probe-iter', type=int, default=5, help="вызовов для подсчета запросов и памяти")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="кэш сгенерированных БД")
+    parser.add_argument('--history', default=HISTORY_PATH, help="файл истории результатов")
+    parser.add_argument('--max-regression', type=float, default=20, help="допустимое ухудшение, процентов")
+    parser.add_argument('--save-baseline', action='store_true', help="сделать этот прогон базовым")
+    args = parser.parse_args()
+    
+    # Замер самих методов: без журнала медленных запросов и метрик
+    Config.SLOW_QUERY_LOG_ENABLED = False
+    if args.methods:
+        selected = set(args.methods.split(','))
+        CASES[:] = [case for case in CASES if case[0] in selected]
+    
+    options = {'min_time': args.min_time, 'min_iter': args.min_iter, 'max_iter': args.max_iter,
+               'probe_iter': args.probe_iter}
+    results = {}
+    for preset in args.sizes.split(','):
+        results[preset] = run_size(preset, args.data_dir, options)
+        print(f"\n{preset}")
+        print(f"{'Метод':<26}{'Медиана, мс':>13}{'p95, мс':>10}{'Запросов':>10}{'Память, КБ':>12}")
+        for name, stats in results[preset].items():
+            print(f"{name:<26}{stats['median_ms']:>13.3f}{stats['p95_ms']:>10.3f}"
+                  f"{stats['statements']:>10g}{stats['peak_kb']:>12.1f}")
+    
+    run = {'time': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+           'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'results': results}
+    history = load_history(args.history)
+    history['runs'].append(run)
+    regressions = []
+    if history['baseline'] and not args.save_baseline:
+        regressions = compare(results, history['baseline'], args.max_regression)
+        print(f"\nСравнение с базовым прогоном {history['baseline']['time']} "
+              f"({history['baseline'].get('commit') or '?'}):")
+        for line in regressions:
+            print(f"  хуже: {line}")
+        if not regressions:
+            print(f"  в пределах {args.max_regression:.0f}%")
+    if args.save_baseline or not history['baseline']:
+        history['baseline'] = run
+        print("\nПрогон сохранен как базовый")
+    save_history(args.history, history)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# bench_sqlite_profiles.py - Сравнение профилей SQLite при параллельном чтении и записи
+#
+# Запуск: python -m benchmarks.bench_sqlite_profiles [--seconds 5] [--readers 4] [--writers 2]
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from config import Config
+from database import ConnectionPool, read_pragmas
+from migrations import run_migrations
+
+CATEGORIES = ['Электроника', 'Аксессуары', 'Аудио', 'Хранение данных', 'Бытовая техника']
+
+def seed(pool: ConnectionPool, products: int):
+    """Схема и тестовые товары"""
+    conn = pool.acquire()
+    try:
+        run_migrations(conn)
+        conn.executemany('''
+            INSERT INTO products (sku, name, category, unit_price, quantity)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (f"SKU{i:06d}", f"Товар {i}", CATEGORIES[i % len(CATEGORIES)], 100 + i % 900, 1000)
+            for i in range(1, products + 1)
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_profile(profile: str, seconds: float, readers: int, writers: int, products: int) -> dict:
+    """Замер одного профиля на временной БД (удаляется после замера)"""
+    with tempfile.TemporaryDirectory(prefix=f"bench_{profile}_") as workdir:
+        return measure_profile(profile, os.path.join(workdir, 'bench.db'), seconds, readers, writers, products)
+
+def measure_profile(profile: str, db_path: str, seconds: float, readers: int, writers: int,
+                    products: int) -> dict:
+    """Замер одного профиля: чтения/записи в секунду и ошибки блокировки"""
+    pool = ConnectionPool(db_path, size=readers + writers + 1, profile=profile)
+    seed(pool, products)
+    
+    conn = pool.acquire()
+    settings = read_pragmas(conn)
+    conn.close()
+    
+    stop = threading.Event()
+    lock = threading.Lock()
+    result = {'reads': 0, 'writes': 0, 'locked': 0, 'write_latency': [], 'read_latency': []}
+    
+    def reader():
+        rnd = random.Random()
+        reads, latency = 0, []
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn = pool.acquire()
+            try:
+                conn.execute('''
+                    SELECT id, sku, name, unit_price, quantity FROM products
+                    WHERE is_active = 1 AND category = ?
+                    ORDER BY id LIMIT 50
+                ''', (rnd.choice(CATEGORIES),)).fetchall()
+                reads += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    result['locked'] += 1
+            finally:
+                conn.close()
+            latency.append(time.perf_counter() - started)
+        with lock:
+            result['reads'] += reads
+            result['read_latency'].extend(latency)
+    
+    def writer():
+        rnd = random.Random()
+        writes, latency = 0, []
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn = pool.acquire()
+            try:
+                product_id = rnd.randint(1, products)
+                conn.execute('''
+                    UPDATE products SET quantity = quantity - 1, last_updated = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (product_id,))
+                conn.execute('''
+                    INSERT INTO audit_log (employee_id, action, table_name, record_id)
+                    VALUES (NULL, 'BENCH_WRITE', 'products', ?)
+                ''', (product_id,))
+                conn.commit()
+                writes += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    result['locked'] += 1
+            finally:
+                conn.close()
+            latency.append(time.perf_counter() - started)
+        with lock:
+            result['writes'] += writes
+            result['write_latency'].extend(latency)
+    
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    pool.close()
+    
+    def p95(values):
+        if len(values) < 2:
+            return values[0] if values else 0.0
+        return statistics.quantiles(values, n=20)[-1]
+    
+    return {
+        'profile': profile,
+        'journal_mode': settings['journal_mode'],
+        'synchronous': settings['synchronous'],
+        'reads_per_sec': result['reads'] / seconds,
+        'writes_per_sec': result['writes'] / seconds,
+        'read_p95_ms': p95(result['read_latency']) * 1000,
+        'write_p95_ms': p95(result['write_latency']) * 1000,
+        'locked_errors': result['locked'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение профилей SQLite из Config.DB_PROFILES")
+    parser.add_argument('--seconds', type=float, default=5.0, help="длительность замера на профиль")
+    parser.add_argument('--readers', type=int, default=4, help="потоков чтения")
+    parser.add_argument('--writers', type=int, default=2, help="потоков записи")
+    parser.add_argument('--products', type=int, default=5000, help="товаров в тестовой БД")
+    parser.add_argument('--profiles', nargs='*', default=list(Config.DB_PROFILES),
+                        help="профили для сравнения")
+    args = parser.parse_args()
+    
+    print(f"Читателей: {args.readers}, писателей: {args.writers}, {args.seconds:.0f} с на профиль")
+    print(f"{'Профиль':<12}{'Журнал':<10}{'Sync':<8}{'Чтений/с':>10}{'Записей/с':>11}"
+          f"{'p95 чт, мс':>12}{'p95 зап, мс':>13}{'Блокировки':>12}")
+    for profile in args.profiles:
+        r = run_profile(profile, args.seconds, args.readers, args.writers, args.products)
+        print(f"{r['profile']:<12}{r['journal_mode']:<10}{r['synchronous']:<8}"
+              f"{r['reads_per_sec']:>10.0f}{r['writes_per_sec']:>11.0f}"
+              f"{r['read_p95_ms']:>12.2f}{r['write_p95_ms']:>13.2f}{r['locked_errors']:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# bench_wsgi_servers.py - Сравнение сервера разработки и gunicorn под нагрузкой
+#
+# Оба сервера запускаются отдельными процессами на одной тестовой БД:
+#   dev  - python web_app.py: Werkzeug, один процесс, отладчик, перечитывание шаблонов
+#          (без перезапуска по изменению файлов - он лишь добавляет процесс-наблюдатель)
+#   prod - gunicorn -c gunicorn.conf.py wsgi:app: воркеры с потоками, профиль production
+# Клиентские потоки с keep-alive запрашивают смесь публичных страниц и API.
+# Кэш страниц (cache.py) по умолчанию выключен: иначе сравнивались бы попадания
+# в кэш, а не серверы; --cache включает его (отмечается в отчете).
+#
+# Запуск: python -m benchmarks.bench_wsgi_servers [--seconds 10] [--clients 16] [--scale 0.2] [--cache]
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+from urllib.parse import urlencode
+from config import Config
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEV_SERVER = ("import web_app; web_app.init_website_content(); "
+              "web_app.app.run(host='127.0.0.1', port={port}, "
+              "debug=web_app.web_profile['debug'], use_reloader=False, threaded=True)")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(kind: str, workdir: str, port: int, cache: bool = None) -> subprocess.Popen:
+    """Запуск сервера в рабочем каталоге с тестовой БД (Config.DATABASE_PATH - относительный);
+    cache - включить или выключить кэш страниц (None - как в окружении)"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    if cache is not None:
+        env['RESPONSE_CACHE_ENABLED'] = '1' if cache else '0'
+    if kind == 'dev':
+        env['WEB_PROFILE'] = 'development'
+        command = [sys.executable, '-c', DEV_SERVER.format(port=port)]
+    else:
+        env['WEB_PROFILE'] = 'production'
+        env['WEB_BIND'] = f'127.0.0.1:{port}'
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'),
+                   'wsgi:app']
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Сервер {kind} не запустился на порту {port}")
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def request_mix(product_ids: List[int]):
+    """Смесь запросов анонимного посетителя (витрина - как в loadtest.browse_products)"""
+    return [
+        lambda: '/',
+        lambda: '/products',
+        lambda: f"/products?{urlencode({'category': f'Категория {random.randrange(50)}'})}",
+        lambda: f"/products?{urlencode({'search': f'Товар {random.randrange(100)}'})}",
+        lambda: f'/product/{random.choice(product_ids)}',
+        lambda: f'/api/products?limit={random.choice((12, 50))}',
+        lambda: '/about',
+    ]
+
+def run_load(port: int, seconds: float, clients: int, product_ids: List[int]) -> dict:
+    """Нагрузка: запросов в секунду, задержки и ошибки"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+    mix = request_mix(product_ids)
+    
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        local_errors = 0
+        while time.monotonic() < stop_at:
+            url = random.choice(mix)()
+            started = time.perf_counter()
+            try:
+                conn.request('GET', url)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+    
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    return {'rps': len(latencies) / elapsed, 'p50': percentile(0.50), 'p95': percentile(0.95),
+            'p99': percentile(0.99), 'errors': errors[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер разработки против gunicorn")
+    parser.add_argument('--seconds', type=float, default=10, help="длительность нагрузки")
+    parser.add_argument('--clients', type=int, default=16, help="параллельных клиентов")
+    parser.add_argument('--scale', type=float, default=0.2, help="объем тестовых данных (см. query_plans.seed_dataset)")
+    parser.add_argument('--servers', default='dev,prod', help="какие серверы сравнить")
+    parser.add_argument('--cache', action='store_true', help="включить кэш страниц (RESPONSE_CACHE_ENABLED)")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="bench_wsgi_") as workdir:
+        Config.DATABASE_PATH = os.path.join(workdir, 'trade_enterprise.db')
+        from database import Database
+        from query_plans import seed_dataset
+        db = Database(Config.DATABASE_PATH)
+        seed_dataset(db, args.scale)
+        conn = db.get_connection()
+        try:
+            product_ids = [row[0] for row in conn.execute("SELECT id FROM products WHERE is_active = 1")]
+        finally:
+            conn.close()
+        db.close()
+        
+        print(f"Кэш страниц: {'включен' if args.cache else 'выключен'}")
+        print(f"{'Сервер':<8}{'Запр./с':>10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'Ошибок':>8}")
+        for kind in args.servers.split(','):
+            port = free_port()
+            process = start_server(kind, workdir, port, cache=args.cache)
+            try:
+                run_load(port, 1, args.clients, product_ids)  # прогрев
+                result = run_load(port, args.seconds, args.clients, product_ids)
+            finally:
+                stop_server(process)
+            print(f"{kind:<8}{result['rps']:>10.0f}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+                  f"{result['p99']:>10.1f}{result['errors']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+# loadtest.py - Нагрузочный тест веб-приложения
+#
+# Смесь сценариев воспроизводит обычный день: анонимные посетители
+# листают витрину (/products, /product/<id>, /api/products), кассиры
+# оформляют заказы, менеджеры смотрят /admin/orders. Заказы в приложении
+# создаются настольным клиентом (main_gui.py), веб-маршрута для них нет,
+# поэтому сценарий кассира вызывает Database.create_order_checked в том же
+# файле БД - он конкурирует с веб-сервером за блокировку записи так же,
+# как касса в магазине.
+#
+# Режимы:
+#   inprocess - web_app.app через тестовый клиент Flask (стоимость самого
+#               приложения без сети и сервера)
+#   http      - настоящие HTTP-запросы к локальному серверу: запускается
+#               --server dev|prod (см. bench_wsgi_servers.py) либо берется
+#               уже работающий --url с его файлом БД --db
+#
+# Ошибка запроса - статус 4xx/5xx, исключение или страница ошибки
+# (templates/error.html), которую приложение отдает и со статусом 200.
+# Отчет: запросов в секунду и задержки p50/p95/p99 по сценариям и в целом.
+# --save сохраняет результат как базовый, --compare сравнивает с ним и
+# завершается с кодом 1 при ухудшении больше --tolerance процентов.
+#
+# Запуск: python -m benchmarks.loadtest [--mode inprocess|http] [--server dev|prod]
+#         [--concurrency 8] [--seconds 20] [--scale 0.2] [--save | --compare]
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+from config import Config
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_baselines.json')
+# Признак страницы ошибки в HTML (templates/error.html)
+ERROR_PAGE_MARKER = b'data-error-page'
+
+# Сотрудники для сценариев с входом: роль -> (логин, пароль)
+USERS = {
+    'manager': ('load_manager', 'LoadTest-manager-1'),
+    'cashier': ('load_cashier', 'LoadTest-cashier-1'),
+}
+
+class Scenario(NamedTuple):
+    name: str
+    weight: int
+    role: Optional[str]                          # вход под сотрудником этой роли
+    run: Callable[['Worker', random.Random], Any]
+
+def browse_products(worker: 'Worker', rnd: random.Random):
+    params = rnd.choice([{}, {'category': f"Категория {rnd.randrange(50)}"},
+                         {'search': f"Товар {rnd.randrange(100)}"}])
+    return worker.get(f"/products?{urlencode(params)}" if params else '/products')
+
+def view_product(worker: 'Worker', rnd: random.Random):
+    return worker.get(f"/product/{rnd.choice(worker.fixture.product_ids)}")
+
+def api_products(worker: 'Worker', rnd: random.Random):
+    return worker.get(f"/api/products?limit={rnd.choice((12, 50))}")
+
+def manager_orders(worker: 'Worker', rnd: random.Random):
+    status = rnd.choice(['Все', 'pending', 'processing', 'completed'])
+    return worker.get(f"/admin/orders?{urlencode({'status': status})}", role='manager')
+
+def cashier_order(worker: 'Worker', rnd: random.Random):
+    from database import StockShortageError
+    items = [{'product_id': rnd.choice(worker.fixture.product_ids), 'quantity': rnd.randint(1, 3)}
+             for _ in range(rnd.randint(1, 5))]
+    try:
+        worker.fixture.db.create_order_checked(
+            {'client_id': rnd.randint(1, worker.fixture.clients), 'items': items},
+            worker.fixture.employees['cashier'])
+    except StockShortageError:
+        pass  # Отказ по остаткам - обычный исход для кассы
+    return 200
+
+SCENARIOS = [
+    Scenario('browse_products', 40, None, browse_products),
+    Scenario('view_product', 30, None, view_product),
+    Scenario('api_products', 15, None, api_products),
+    Scenario('cashier_order', 10, 'cashier', cashier_order),
+    Scenario('manager_orders', 5, 'manager', manager_orders),
+]
+
+def session_cookie(set_cookies: List[str]) -> Optional[str]:
+    """Значение cookie session из заголовков Set-Cookie"""
+    for header in set_cookies:
+        name, _, rest = header.partition('=')
+        if name.strip() == 'session':
+            return rest.split(';', 1)[0]
+    return None
+
+class InProcessClient:
+    """Запросы к web_app.app через тестовый клиент Flask"""
+    
+    def __init__(self, app):
+        self.client = app.test_client(use_cookies=False)
+    
+    def request(self, method: str, url: str, headers: Dict[str, str] = None,
+                body: bytes = None) -> Tuple[int, List[str], bytes]:
+        response = self.client.open(url, method=method, headers=headers or {}, data=body)
+        return response.status_code, response.headers.getlist('Set-Cookie'), response.get_data()
+    
+    def close(self):
+        pass
+
+class HTTPClient:
+    """Запросы по HTTP с keep-alive; после ошибки соединение открывается заново"""
+    
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+    
+    def request(self, method: str, url: str, headers: Dict[str, str] = None,
+                body: bytes = None) -> Tuple[int, List[str], bytes]:
+        try:
+            self.conn.request(method, url, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+        return response.status, response.headers.get_all('Set-Cookie') or [], content
+    
+    def close(self):
+        self.conn.close()
+
+class Fixture:
+    """Тестовая БД и сведения о ней для сценариев"""
+    
+    def __init__(self, db, product_ids: List[int], clients: int, employees: Dict[str, int]):
+        self.db = db
+        self.product_ids = product_ids      # Активные товары (неактивные - 404 на витрине)
+        self.clients = clients
+        self.employees = employees
+        self.cookies: Dict[str, str] = {}
+
+def prepare_database(db_path: str, scale: Optional[float]) -> Fixture:
+    """Заполнение БД (scale=None - взять имеющиеся данные) и сотрудники для сценариев"""
+    from database import Database
+    from query_plans import seed_dataset
+    db = Database(db_path)
+    if scale is not None:
+        seed_dataset(db, scale)
+    
+    employees = {}
+    conn = db.get_connection()
+    try:
+        for role, (username, _) in USERS.items():
+            conn.execute('''
+                INSERT OR IGNORE INTO employees (username, password_hash, full_name, role)
+                VALUES (?, '', ?, ?)
+            ''', (username, f"Нагрузочный тест ({role})", role))
+            employees[role] = conn.execute(
+                "SELECT id FROM employees WHERE username = ?", (username,)).fetchone()[0]
+        conn.commit()
+        product_ids = [row[0] for row in conn.execute("SELECT id FROM products WHERE is_active = 1")]
+        clients = conn.execute("SELECT MAX(id) FROM clients").fetchone()[0] or 1
+    finally:
+        conn.close()
+    for role, (_, password) in USERS.items():
+        db.update_password(employees[role], password)
+    if not product_ids:
+        raise RuntimeError("В БД нет активных товаров для сценариев")
+    return Fixture(db, product_ids, clients, employees)
+
+def login(client, role: str) -> str:
+    """Вход сотрудника; cookie сессии общая для всех потоков"""
+    username, password = USERS[role]
+    status, set_cookies, _ = client.request(
+        'POST', '/login', {'Content-Type': 'application/x-www-form-urlencoded'},
+        urlencode({'username': username, 'password': password}).encode())
+    cookie = session_cookie(set_cookies)
+    if status != 302 or not cookie:
+        raise RuntimeError(f"Не удалось войти как {username}: статус {status}")
+    # Приветственное flash-сообщение забирается одной страницей, дальше cookie не меняется
+    _, set_cookies, _ = client.request('GET', '/profile', {'Cookie': f"session={cookie}"})
+    return session_cookie(set_cookies) or cookie
+
+class Worker:
+    """Поток нагрузки: выбирает сценарии по весам и замеряет их"""
+    
+    def __init__(self, client, fixture: Fixture, scenarios: List[Scenario], seed: int):
+        self.client = client
+        self.fixture = fixture
+        self.scenarios = scenarios
+        self.rnd = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = {s.name: [] for s in scenarios}
+        self.errors: Dict[str, int] = {s.name: 0 for s in scenarios}
+    
+    def get(self, url: str, role: str = None) -> int:
+        headers = {'Cookie': f"session={self.fixture.cookies[role]}"} if role else None
+        status, _, content = self.client.request('GET', url, headers)
+        if ERROR_PAGE_MARKER in content:
+            raise RuntimeError(f"Страница ошибки: {url}")
+        return status
+    
+    def run(self, stop_at: float):
+        weights = [s.weight for s in self.scenarios]
+        while time.monotonic() < stop_at:
+            scenario = self.rnd.choices(self.scenarios, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = scenario.run(self, self.rnd)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - started
+            if status is None or status >= 400:
+                self.errors[scenario.name] += 1
+            else:
+                self.latencies[scenario.name].append(elapsed)
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль отсортированного списка, мс"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {'requests': len(latencies), 'errors': errors, 'rps': round(len(latencies) / elapsed, 1),
+            'p50': round(percentile(latencies, 0.50), 2), 'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2)}
+
+def run_load(make_client: Callable[[], Any], fixture: Fixture, concurrency: int,
+             seconds: float, scenarios: List[Scenario] = None, seed: int = 1) -> Dict[str, Any]:
+    """Нагрузка concurrency потоками в течение seconds: сводка по сценариям и общая"""
+    scenarios = scenarios or SCENARIOS
+    workers = [Worker(make_client(), fixture, scenarios, seed + i) for i in range(concurrency)]
+    stop_at = time.monotonic() + seconds
+    threads = [threading.Thread(target=worker.run, args=(stop_at,)) for worker in workers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.client.close()
+    
+    result = {'scenarios': {}}
+    all_latencies, all_errors = [], 0
+    for scenario in scenarios:
+        latencies = [value for worker in workers for value in worker.latencies[scenario.name]]
+        errors = sum(worker.errors[scenario.name] for worker in workers)
+        result['scenarios'][scenario.name] = summarize(latencies, errors, elapsed)
+        all_latencies.extend(latencies)
+        all_errors += errors
+    result['total'] = summarize(all_latencies, all_errors, elapsed)
+    return result
+
+def print_result(result: Dict[str, Any]):
+    print(f"{'Сценарий':<18}{'Запросов':>10}{'Ошибок':>8}{'Запр./с':>10}"
+          f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    rows = list(result['scenarios'].items()) + [('ИТОГО', result['total'])]
+    for name, stats in rows:
+        print(f"{name:<18}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+              f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(path: str, name: str, result: Dict[str, Any], params: Dict[str, Any]):
+    baselines = load_baselines(path)
+    baselines[name] = {'saved_at': datetime.now().isoformat(timespec='seconds'),
+                       'commit': git_commit(), 'params': params, **result}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Ухудшения против базового результата: меньше запросов в секунду или выше p95"""
+    regressions = []
+    pairs = [('ИТОГО', result['total'], baseline['total'])] + [
+        (name, stats, baseline['scenarios'][name])
+        for name, stats in result['scenarios'].items() if name in baseline.get('scenarios', {})]
+    for name, current, base in pairs:
+        if base['rps'] and current['rps'] < base['rps'] * (1 - tolerance / 100):
+            regressions.append(f"{name}: {current['rps']:.1f} запр./с против {base['rps']:.1f}")
+        if base['p95'] and current['p95'] > base['p95'] * (1 + tolerance / 100):
+            regressions.append(f"{name}: p95 {current['p95']:.2f} мс против {base['p95']:.2f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест веб-приложения")
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--server', choices=('dev', 'prod'), default='prod',
+                        help="какой сервер запустить в режиме http")
+    parser.add_argument('--url', help="уже работающий сервер (режим http), например http://127.0.0.1:8000")
+    parser.add_argument('--db', help="файл БД сервера --url (для входа сотрудников и заказов кассы)")
+    parser.add_argument('--concurrency', type=int, default=8, help="параллельных клиентов")
+    parser.add_argument('--seconds', type=float, default=20, help="длительность замера")
+    parser.add_argument('--warmup', type=float, default=2, help="прогрев перед замером, секунд")
+    parser.add_argument('--scale', type=float, default=0.2, help="объем тестовых данных (см. query_plans.seed_dataset)")
+    parser.add_argument('--baseline-file', default=BASELINE_PATH)
+    parser.add_argument('--name', help="имя базового результата (по умолчанию режим и сервер)")
+    parser.add_argument('--save', action='store_true', help="сохранить результат как базовый")
+    parser.add_argument('--compare', action='store_true', help="сравнить с базовым результатом")
+    parser.add_argument('--tolerance', type=float, default=10, help="допустимое ухудшение, процентов")
+    args = parser.parse_args()
+    
+    if args.url and not args.db:
+        parser.error("для --url нужен --db - файл БД этого сервера")
+    name = args.name or (args.mode if args.mode == 'inprocess' else
+                         f"http-{'external' if args.url else args.server}")
+    
+    server = None
+    workdir = None
+    if args.url:
+        Config.DATABASE_PATH = args.db
+        fixture = prepare_database(args.db, None)
+        address = urlsplit(args.url)
+        make_client = lambda: HTTPClient(address.hostname, address.port or 80)
+    else:
+        workdir = tempfile.mkdtemp(prefix="loadtest_")
+        # Относительный Config.DATABASE_PATH сервера указывает на этот файл (cwd - workdir)
+        Config.DATABASE_PATH = os.path.join(workdir, 'trade_enterprise.db')
+        fixture = prepare_database(Config.DATABASE_PATH, args.scale)
+        if args.mode == 'inprocess':
+            import web_app
+            web_app.init_website_content()
+            make_client = lambda: InProcessClient(web_app.app)
+        else:
+            from benchmarks.bench_wsgi_servers import free_port, start_server
+            port = free_port()
+            server = start_server(args.server, workdir, port)
+            make_client = lambda: HTTPClient('127.0.0.1', port)
+    
+    try:
+        client = make_client()
+        for role in USERS:
+            fixture.cookies[role] = login(client, role)
+        client.close()
+        
+        if args.warmup:
+            run_load(make_client, fixture, args.concurrency, args.warmup)
+        result = run_load(make_client, fixture, args.concurrency, args.seconds)
+    finally:
+        if server is not None:
+            from benchmarks.bench_wsgi_servers import stop_server
+            stop_server(server)
+        fixture.db.close()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    print(f"{name}: {args.concurrency} клиентов, {args.seconds:.0f} с\n")
+    print_result(result)
+    
+    params = {'mode': args.mode, 'server': args.server, 'concurrency': args.concurrency,
+              'seconds': args.seconds, 'scale': args.scale}
+    if args.compare:
+        baseline = load_baselines(args.baseline_file).get(name)
+        if baseline is None:
+            print(f"\nБазовый результат '{name}' не найден в {args.baseline_file}")
+            sys.exit(1)
+        regressions = compare(result, baseline, args.tolerance)
+        print(f"\nСравнение с '{name}' от {baseline['saved_at']} ({baseline.get('commit') or '?'}):")
+        for line in regressions:
+            print(f"  хуже: {line}")
+        if not regressions:
+            print(f"  в пределах {args.tolerance:.0f}%")
+    if args.save:
+        save_baseline(args.baseline_file, name, result, params)
+        print(f"\nБазовый результат '{name}' сохранен в {args.baseline_file}")
+    if args.compare and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
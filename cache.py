@@ -0,0 +1,127 @@
+# cache.py - Кэш ответов и фрагментов страниц
+#
+# ResponseCache хранит значения по ключу (маршрут и аргументы запроса) с
+# ограничением времени жизни (TTL) и числа записей (вытесняются давно не
+# использованные - LRU). Каждая запись помечена тегами данных, из которых она
+# построена ('products', 'product:5', 'content:index', 'orders', 'clients');
+# запись данных вызывает invalidate(тег) и удаляет только зависящие от них записи.
+#
+# Кэш живет в памяти процесса: изменения, сделанные другим процессом
+# (настольное приложение, другой воркер веб-сервера), видны не позже чем
+# через TTL.
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+# Все кэши процесса: invalidate() рассылает теги каждому
+_caches: 'weakref.WeakSet[ResponseCache]' = weakref.WeakSet()
+_caches_lock = threading.Lock()
+
+class ResponseCache:
+    """Кэш с TTL, вытеснением LRU и сбросом по тегам"""
+    
+    def __init__(self, max_entries: int = 500, ttl: float = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # ключ -> (срок годности, значение, теги); порядок - от давно использованных
+        self._entries: 'OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]' = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        # Номер сброса: растет при каждом invalidate()
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0,
+                       'expirations': 0, 'invalidations': 0, 'stale_skips': 0}
+        with _caches_lock:
+            _caches.add(self)
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу или None (нет записи или истек TTL)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+    
+    def generation(self) -> int:
+        """Номер сброса; берется до чтения данных и передается в set()"""
+        with self._lock:
+            return self._generation
+    
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl: float = None,
+            generation: int = None):
+        """Сохранение значения, зависящего от данных с тегами tags.
+        
+        generation - номер сброса на момент чтения данных: если с тех пор был
+        сброс, значение могло устареть и не сохраняется.
+        """
+        tags = tuple(tags)
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats['stale_skips'] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+    
+    def _remove(self, key: str):
+        """Удаление записи и ее тегов (под блокировкой)"""
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def invalidate(self, *tags: str) -> int:
+        """Удаление записей, зависящих от данных с любым из тегов; число удаленных"""
+        removed = 0
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+            self._stats['invalidations'] += removed
+        return removed
+    
+    def clear(self):
+        """Удаление всех записей (прочитанные до сброса значения не сохраняются)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша и доля попаданий"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        return stats
+
+def invalidate(*tags: str) -> int:
+    """Сброс записей с тегами tags во всех кэшах процесса (вызывается после записи данных)"""
+    with _caches_lock:
+        caches = list(_caches)
+    return sum(cache.invalidate(*tags) for cache in caches)
@@ -0,0 +1,152 @@
+# change_log.py - Журнал изменений строк для обновления таблиц настольного приложения
+#
+# Триггеры (миграция 12) на вставку, изменение и удаление строк клиентов,
+# товаров и заказов добавляют в таблицу change_log запись: таблица, id строки,
+# операция. Номер последней записи - версия данных: изменения после версии
+# читаются одним запросом по первичному ключу, и настольное приложение
+# обновляет только измененные строки таблиц, а не изменившиеся таблицы
+# не перечитывает. В журнале остаются последние CHANGE_LOG_KEEP записей
+# (старые удаляет триггер); если версия клиента старше оставшихся записей,
+# клиент перечитывает все таблицы.
+#
+# Журнал аудита только дополняется, а триггер удвоил бы каждую запись в него,
+# поэтому новые записи аудита определяются по MAX(id).
+#
+# ChangeFeed держит отдельное соединение: PRAGMA data_version соединения
+# меняется, только когда транзакцию фиксирует другое соединение, поэтому
+# пока она прежняя, журнал не читается.
+import sqlite3
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Таблицы, изменения строк которых пишутся в журнал
+CHANGE_LOG_TABLES: Tuple[str, ...] = ('clients', 'products', 'orders')
+# Таблица, которая только дополняется (изменения - по MAX(id))
+APPEND_ONLY_TABLE = 'audit_log'
+
+CHANGE_LOG_KEEP = 100000            # Записей журнала хранится не меньше
+CHANGE_LOG_PRUNE_EVERY = 1000       # Старые записи удаляются раз на столько новых
+CHANGE_LIMIT = 5000                 # Больше изменений - перечитать таблицы целиком
+
+class ChangeVersion(NamedTuple):
+    """Версия данных: последняя запись журнала изменений и последняя запись аудита"""
+    change_id: int
+    audit_id: int
+
+def change_triggers(tables: Tuple[str, ...]) -> List[str]:
+    """Триггеры на вставку, изменение и удаление строк таблиц tables"""
+    triggers = []
+    for table in tables:
+        for event, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+            triggers.append(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_change_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation)
+                    VALUES ('{table}', {row}.id, '{event.lower()}');
+                END
+            ''')
+    return triggers
+
+def prune_trigger() -> str:
+    """Триггер, удаляющий записи журнала старше последних CHANGE_LOG_KEEP"""
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_prune
+        AFTER INSERT ON change_log WHEN new.id % {CHANGE_LOG_PRUNE_EVERY} = 0
+        BEGIN
+            DELETE FROM change_log WHERE id <= new.id - {CHANGE_LOG_KEEP};
+        END
+    '''
+
+def mark_reset(cursor: sqlite3.Cursor):
+    """Запись "перечитать все" - после изменения данных в обход триггеров
+    (в транзакции вызывающего кода)"""
+    cursor.execute("INSERT INTO change_log (table_name, row_id, operation) VALUES ('*', 0, 'reset')")
+
+def current_version(conn: sqlite3.Connection) -> ChangeVersion:
+    """Текущая версия данных"""
+    row = conn.execute(
+        f"SELECT (SELECT COALESCE(MAX(id), 0) FROM change_log), (SELECT COALESCE(MAX(id), 0) FROM {APPEND_ONLY_TABLE})"
+    ).fetchone()
+    return ChangeVersion(row[0], row[1])
+
+def read_changes(conn: sqlite3.Connection, since: Optional[ChangeVersion]) -> Dict[str, Any]:
+    """Изменения после версии since.
+    
+    Возвращает словарь: version - новая версия; reset - перечитать все таблицы
+    (since нет, журнал уже удален дальше since или изменений слишком много);
+    tables - таблица -> {'inserted': число, 'deleted': число, 'updated': id строк}
+    только для изменившихся таблиц.
+    """
+    version = current_version(conn)
+    result = {'version': version, 'reset': since is None, 'tables': {}}
+    if since is None or since == version:
+        return result
+    
+    # Версия новее текущей - другая БД (например, восстановленная из копии)
+    if since.change_id > version.change_id or since.audit_id > version.audit_id:
+        result['reset'] = True
+        return result
+    first_id = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+    if since.change_id < version.change_id and (first_id is None or first_id > since.change_id + 1):
+        result['reset'] = True
+        return result
+    
+    rows = conn.execute(
+        "SELECT table_name, row_id, operation FROM change_log WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+        (since.change_id, version.change_id, CHANGE_LIMIT + 1)
+    ).fetchall()
+    if len(rows) > CHANGE_LIMIT:
+        result['reset'] = True
+        return result
+    
+    tables = result['tables']
+    for table_name, row_id, operation in rows:
+        if operation == 'reset':
+            result['reset'] = True
+            return result
+        changes = tables.setdefault(table_name, {'inserted': 0, 'deleted': 0, 'updated': set()})
+        if operation == 'update':
+            changes['updated'].add(row_id)
+        elif operation == 'insert':
+            changes['inserted'] += 1
+        else:
+            changes['deleted'] += 1
+    
+    if version.audit_id != since.audit_id:
+        tables[APPEND_ONLY_TABLE] = {'inserted': max(0, version.audit_id - since.audit_id),
+                                     'deleted': 0, 'updated': set()}
+    return result
+
+class ChangeFeed:
+    """Чтение изменений через отдельное соединение с проверкой PRAGMA data_version"""
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._version = None        # Версия данных при последнем чтении
+    
+    def changes_since(self, since: Optional[ChangeVersion]) -> Dict[str, Any]:
+        """Изменения после версии since (см. read_changes)"""
+        with self._lock:
+            if self._conn is None:
+                # Без транзакции: каждый запрос видит последние зафиксированные данные
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if since is not None and since == self._version and data_version == self._data_version:
+                # Никто не фиксировал транзакций с прошлого чтения
+                return {'version': since, 'reset': False, 'tables': {}}
+            
+            result = read_changes(self._conn, since)
+            self._data_version = data_version
+            self._version = result['version']
+            return result
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
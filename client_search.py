@@ -0,0 +1,112 @@
+# client_search.py - Поиск клиентов по индексам
+#
+# Телефон, email и код клиента ищутся по префиксу через индексы по выражениям
+# (см. миграцию 4), ФИО и адрес - через полнотекстовый индекс clients_fts.
+# Один и тот же текст выражения используется в индексе и в запросе,
+# иначе SQLite не сможет применить индекс.
+import re
+import sqlite3
+from typing import List, Dict, Any
+
+# Символы, которые встречаются в записи телефона помимо цифр
+PHONE_SEPARATORS = (' ', '-', '(', ')', '+', '.')
+
+PHONE_QUERY_RE = re.compile(r'^[\d\s\-\(\)\+\.]+$')
+CODE_QUERY_RE = re.compile(r'^[A-Za-z]\w*$')
+
+def phone_digits_sql(column: str) -> str:
+    """SQL-выражение: только цифры телефона"""
+    expr = column
+    for sep in PHONE_SEPARATORS:
+        expr = f"replace({expr}, '{sep}', '')"
+    return expr
+
+def phone_sql(column: str = 'phone') -> str:
+    """SQL-выражение: телефон в формате E.164 без '+' (для РФ: 7XXXXXXXXXX)"""
+    digits = phone_digits_sql(column)
+    return (
+        f"(CASE WHEN length({digits}) = 11 AND substr({digits}, 1, 1) = '8' "
+        f"THEN '7' || substr({digits}, 2) "
+        f"WHEN length({digits}) = 10 THEN '7' || {digits} "
+        f"ELSE {digits} END)"
+    )
+
+def email_sql(column: str = 'email') -> str:
+    """SQL-выражение: email в нижнем регистре"""
+    return f"lower({column})"
+
+PHONE_EXPR = phone_sql()
+EMAIL_EXPR = email_sql()
+
+def normalize_phone_prefix(text: str) -> str:
+    """Начало номера, приведенное к E.164: 8 (903... и 903... -> 7903..."""
+    digits = re.sub(r'\D', '', text or '')
+    if digits.startswith('8'):
+        return '7' + digits[1:]
+    if digits.startswith('9'):
+        return '7' + digits
+    return digits
+
+def prefix_range(prefix: str) -> tuple:
+    """Границы [prefix, next) для поиска по префиксу через индекс"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _range_lookup(conn: sqlite3.Connection, expr: str, prefix: str, limit: int) -> List[Dict[str, Any]]:
+    """Активные клиенты, у которых expr начинается с prefix"""
+    low, high = prefix_range(prefix)
+    rows = conn.execute(f'''
+        SELECT * FROM clients
+        WHERE {expr} >= ? AND {expr} < ? AND is_active = 1
+        ORDER BY {expr}
+        LIMIT ?
+    ''', (low, high, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def _name_lookup(conn: sqlite3.Connection, match: str, limit: int) -> List[Dict[str, Any]]:
+    """Активные клиенты по словам ФИО и адреса, новые сначала.
+    
+    Сортировка по rowid позволяет FTS5 остановиться после limit совпадений;
+    сортировка по bm25 требует перебрать все совпадения (для частых слов -
+    десятки тысяч строк).
+    """
+    rows = conn.execute('''
+        SELECT c.* FROM clients_fts
+        JOIN clients c ON c.id = clients_fts.rowid
+        WHERE clients_fts MATCH ? AND c.is_active = 1
+        ORDER BY clients_fts.rowid DESC
+        LIMIT ?
+    ''', (match, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def search_clients(conn: sqlite3.Connection, query: str, fts_query: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """Поиск клиентов по коду, телефону, email и словам ФИО/адреса.
+    
+    fts_query - запрос FTS5, построенный из query (см. database.build_fts_query).
+    Точные ключи (код, телефон, email) идут первыми, затем совпадения по ФИО и адресу.
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    
+    results = []
+    seen = set()
+    
+    def add(rows):
+        for row in rows:
+            if row['id'] not in seen and len(results) < limit:
+                seen.add(row['id'])
+                results.append(row)
+    
+    is_phone = bool(PHONE_QUERY_RE.match(query)) and len(re.sub(r'\D', '', query)) >= 3
+    is_email = '@' in query
+    
+    if CODE_QUERY_RE.match(query):
+        add(_range_lookup(conn, 'client_code', query.upper(), limit))
+    if is_email or (' ' not in query and '.' in query):
+        add(_range_lookup(conn, EMAIL_EXPR, query.lower(), limit))
+    if is_phone:
+        add(_range_lookup(conn, PHONE_EXPR, normalize_phone_prefix(query), limit))
+    if not is_phone and not is_email and fts_query and len(results) < limit:
+        add(_name_lookup(conn, fts_query, limit))
+    
+    return results
@@ -14,6 +14,120 @@ class Config:
     BACKUP_PATH = 'backups/'
     BACKUP_RETENTION_DAYS = 30
     
+    # Профиль веб-приложения: 'development' - python web_app.py (сервер Werkzeug,
+    # отладчик, шаблоны перечитываются с диска); 'production' - gunicorn (wsgi.py)
+    WEB_PROFILE = os.environ.get('WEB_PROFILE', 'development')
+    WEB_PROFILES = {
+        'development': {
+            'debug': True,
+            'templates_auto_reload': True,
+        },
+        'production': {
+            'debug': False,
+            'templates_auto_reload': False,
+        },
+    }
+    
+    # Сервер gunicorn (gunicorn.conf.py): процессы-воркеры с потоками
+    WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', '0'))    # 0 - по числу ядер
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))    # Потоков в воркере
+    WEB_MAX_REQUESTS = 5000             # Воркер перезапускается после стольких запросов
+    WEB_MAX_REQUESTS_JITTER = 500       # ... плюс случайно до стольких, чтобы не все сразу
+    WEB_TIMEOUT = 60                    # Зависший дольше воркер перезапускается, секунд
+    WEB_GRACEFUL_TIMEOUT = 30           # Время на завершение текущих запросов при перезапуске
+    # Доверенных обратных прокси (nginx и т.п.) перед приложением. 0 - приложение
+    # доступно напрямую, адрес клиента - адрес соединения; N - адрес, схема и хост
+    # берутся из заголовков X-Forwarded-*, добавленных последними N прокси.
+    # От значения зависят ограничение частоты запросов и журнал аудита: при
+    # прокси и 0 у всех клиентов один адрес (прокси), без прокси и N > 0
+    # клиент подставляет любой адрес в X-Forwarded-For.
+    WEB_PROXY_HOPS = int(os.environ.get('WEB_PROXY_HOPS', '0'))
+    
+    # Пул соединений с БД
+    DB_POOL_SIZE = 10                   # Максимум открытых соединений на файл БД
+    DB_POOL_TIMEOUT = 30                # Ожидание свободного соединения, секунд
+    DB_POOL_HEALTHCHECK_INTERVAL = 60   # Проверять простаивающее соединение не чаще, секунд
+    
+    # Журнал аудита: 'transaction' - запись сразу (в транзакции вызывающего кода,
+    # если она открыта); 'async' - события вне транзакций пишутся пачками фоновым потоком
+    AUDIT_MODE = os.environ.get('AUDIT_MODE', 'transaction')
+    AUDIT_BATCH_SIZE = 200              # Размер пачки в режиме async
+    AUDIT_FLUSH_INTERVAL = 1.0          # Максимальная задержка записи события, секунд
+    AUDIT_QUEUE_MAX = 10000             # При переполнении очереди вызывающий ждет
+    
+    # Кэш публичных страниц для анонимных посетителей (cache.py)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_TTL = 60             # Изменения из других процессов видны не позже, секунд
+    RESPONSE_CACHE_SIZE = 500           # Максимум страниц в кэше (вытесняются давно не запрошенные)
+    
+    # Кэш сотрудников и сессий для проверки входа на каждом запросе (auth.SessionCache)
+    USER_CACHE_SIZE = 1000
+    USER_CACHE_TTL = 300                # Запись перечитывается из БД не реже, секунд
+    USER_CACHE_REVALIDATE = 5           # Изменения из других процессов видны не позже, секунд
+    
+    # Ограничение частоты запросов с одного IP (security.py): 'memory' - в процессе,
+    # 'sqlite' - общая для всех процессов веб-сервера БД RATE_LIMIT_DB_PATH
+    RATE_LIMIT_MODE = os.environ.get('RATE_LIMIT_MODE', 'memory')
+    RATE_LIMIT_DB_PATH = 'rate_limits.db'
+    RATE_LIMIT_MAX_KEYS = 100000        # Ведер в памяти, давно не использованные вытесняются
+    RATE_LIMITS = {                     # Действие -> (попыток, за секунд)
+        'login': (10, 60),
+        'api_write': (60, 60),
+    }
+    
+    # Метрики веб-запросов (metrics.py): гистограммы на /metrics и журнал медленных запросов
+    REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', '1') == '1'
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', '0.5'))  # секунд
+    SLOW_REQUEST_QUERIES = 10           # Самых долгих SQL-запросов в записи журнала
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer-токен для сборщика вместо входа администратора
+    
+    # Журнал медленных SQL-запросов с планами (slow_queries.py); ротация по размеру
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', '1') == '1'
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', '0.1'))  # секунд
+    SLOW_QUERY_LOG_PATH = 'logs/slow_queries.log'
+    SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+    
+    # Файл для сбора всех SQL-запросов приложения (анализ планов: query_plans.py --capture)
+    SQL_CAPTURE_PATH = os.environ.get('SQL_CAPTURE_PATH')
+    
+    # Фоновое выполнение запросов настольного приложения (gui_tasks.py)
+    GUI_WORKERS = 4                     # Потоков для запросов к БД (не больше DB_POOL_SIZE)
+    GUI_POLL_INTERVAL = 50              # Проверка готовых результатов, мс
+    GUI_SEARCH_DELAY = 250              # Поиск при вводе запускается после паузы, мс
+    GUI_FETCH_CHUNK = 100               # Строк таблицы в одном запросе при прокрутке (virtual_list.py)
+    GUI_CACHED_CHUNKS = 6               # Порций строк в памяти у таблицы
+    GUI_PREFETCH_ROWS = 50              # Следующая порция загружается, когда до края осталось строк
+    
+    # Профили настроек SQLite (PRAGMA), применяются к каждому новому соединению
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'production')
+    DB_PROFILES = {
+        # Настройки SQLite по умолчанию (журнал отката, synchronous=FULL)
+        'default': {
+            'busy_timeout': 5000,
+        },
+        # WAL: читатели не блокируют писателя; NORMAL безопасен для WAL
+        # (при сбое питания теряется только последняя транзакция, БД не портится)
+        'production': {
+            'busy_timeout': 5000,
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -65536,        # 64 МБ страничного кэша на соединение
+            'mmap_size': 268435456,      # 256 МБ отображения файла в память
+            'temp_store': 'MEMORY',
+        },
+        # WAL с fsync на каждую транзакцию - для машин без ИБП
+        'durable': {
+            'busy_timeout': 10000,
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'cache_size': -32768,
+            'mmap_size': 0,
+            'temp_store': 'MEMORY',
+        },
+    }
+    
     # Права доступа
     ROLE_PERMISSIONS = {
         'admin': {
@@ -0,0 +1,144 @@
+# counters.py - Счетчики для панелей управления
+#
+# Таблица counters хранит готовые значения COUNT(*) (активные товары и клиенты,
+# заказы всего и по статусам). Значения поддерживаются триггерами (миграция 6)
+# на вставку, изменение и удаление строк, поэтому все счетчики читаются
+# одним запросом к таблице из нескольких строк.
+#
+# Таблица data_versions хранит версии ресурсов API (товары, контент,
+# статистика): триггеры (миграция 9) увеличивают версию и обновляют время
+# изменения при любой записи в таблицы ресурса. По ним строятся ETag и
+# Last-Modified, не выполняя основной запрос.
+#
+# Проверка: python counters.py [путь_к_БД]
+# Исправление расхождений: python counters.py [путь_к_БД] --repair
+import sqlite3
+from typing import List, Dict, Any, Tuple, Optional
+
+ORDER_STATUSES = ('pending', 'processing', 'completed', 'cancelled')
+
+# Счетчик -> запрос, вычисляющий его точное значение
+COUNTER_QUERIES: Dict[str, str] = {
+    'products_active': "SELECT COUNT(*) FROM products WHERE is_active = 1",
+    'clients_active': "SELECT COUNT(*) FROM clients WHERE is_active = 1",
+    'orders_total': "SELECT COUNT(*) FROM orders",
+}
+COUNTER_QUERIES.update({
+    f'orders_{status}': f"SELECT COUNT(*) FROM orders WHERE status = '{status}'"
+    for status in ORDER_STATUSES
+})
+
+# Ресурс -> таблицы, изменение которых меняет ответ API ресурса
+DATA_VERSION_SOURCES: Dict[str, Tuple[str, ...]] = {
+    'products': ('products',),
+    'content': ('website_content',),
+    'stats': ('products', 'clients', 'orders', 'order_items'),
+    # Сотрудники и их сессии - для кэша пользователей веб-приложения
+    'employees': ('employees', 'user_sessions'),
+}
+
+def counter_sql(name_expr: str, delta: str) -> str:
+    """Оператор триггера: прибавить delta к счетчику name_expr (SQL-выражение)"""
+    return f'''
+        INSERT INTO counters (name, value) VALUES ({name_expr}, {delta})
+        ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+    '''
+
+def order_status_counter(row: str) -> str:
+    """SQL-выражение: имя счетчика статуса заказа row ('new'/'old')"""
+    return f"'orders_' || COALESCE({row}.status, 'none')"
+
+def version_sql(name_expr: str) -> str:
+    """Оператор триггера: новая версия ресурса name_expr (SQL-выражение)"""
+    return f'''
+        INSERT INTO data_versions (name, version, modified_at) VALUES ({name_expr}, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1, modified_at = excluded.modified_at;
+    '''
+
+def version_triggers(resources: Tuple[str, ...]) -> List[str]:
+    """Триггеры на вставку, изменение и удаление строк таблиц ресурсов resources
+    (ресурсы с общей таблицей создаются одной миграцией - у таблицы один триггер)"""
+    resources_by_table: Dict[str, List[str]] = {}
+    for resource in resources:
+        for table in DATA_VERSION_SOURCES[resource]:
+            resources_by_table.setdefault(table, []).append(resource)
+    
+    triggers = []
+    for table, resources in resources_by_table.items():
+        body = ''.join(version_sql(f"'{resource}'") for resource in resources)
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            triggers.append(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    {body}
+                END
+            ''')
+    return triggers
+
+def init_versions(cursor: sqlite3.Cursor):
+    """Начальные версии ресурсов (в транзакции вызывающего кода)"""
+    cursor.executemany(
+        "INSERT OR IGNORE INTO data_versions (name, version, modified_at) VALUES (?, 1, CURRENT_TIMESTAMP)",
+        [(name,) for name in DATA_VERSION_SOURCES]
+    )
+
+def read_version(conn: sqlite3.Connection, name: str) -> Tuple[int, Optional[str]]:
+    """Версия ресурса и время последнего изменения (UTC, 'YYYY-MM-DD HH:MM:SS')"""
+    row = conn.execute(
+        "SELECT version, modified_at FROM data_versions WHERE name = ?", (name,)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+def read_counters(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Текущие значения всех счетчиков"""
+    values = {name: 0 for name in COUNTER_QUERIES}
+    placeholders = ', '.join('?' for _ in values)
+    values.update({row[0]: row[1] for row in conn.execute(
+        f"SELECT name, value FROM counters WHERE name IN ({placeholders})", list(values)
+    )})
+    return values
+
+def check_counters(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Расхождения счетчиков с точными значениями: [{'name', 'stored', 'actual'}]"""
+    stored = read_counters(conn)
+    mismatches = []
+    for name, query in COUNTER_QUERIES.items():
+        actual = conn.execute(query).fetchone()[0]
+        if stored[name] != actual:
+            mismatches.append({'name': name, 'stored': stored[name], 'actual': actual})
+    return mismatches
+
+def repair_counters(cursor: sqlite3.Cursor):
+    """Пересчет всех счетчиков (в транзакции вызывающего кода)"""
+    cursor.execute("DELETE FROM counters")
+    for name, query in COUNTER_QUERIES.items():
+        cursor.execute(f"INSERT INTO counters (name, value) SELECT ?, ({query})", (name,))
+
+if __name__ == "__main__":
+    import sys
+    from config import Config
+    
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    db_path = args[0] if args else Config.DATABASE_PATH
+    repair = '--repair' in sys.argv
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        from migrations import run_migrations
+        run_migrations(conn)
+        mismatches = check_counters(conn)
+        print(f"База данных: {db_path}")
+        for m in mismatches:
+            print(f"  ✗ {m['name']}: сохранено {m['stored']}, фактически {m['actual']}")
+        if not mismatches:
+            print("Счетчики согласованы")
+        elif repair:
+            conn.execute("BEGIN IMMEDIATE")
+            repair_counters(conn.cursor())
+            conn.commit()
+            print("Счетчики пересчитаны")
+        else:
+            sys.exit(1)
+    finally:
+        conn.close()
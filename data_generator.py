@@ -0,0 +1,484 @@
+# data_generator.py - Генератор тестовых данных для замеров производительности
+#
+# Заполняет БД правдоподобными данными любого объема: сотрудники, товары,
+# клиенты, заказы с позициями, журнал аудита и сессии. Распределения:
+#   - популярность товаров и клиентов по закону Ципфа (немногие товары дают
+#     большую часть продаж, постоянные клиенты заказывают чаще);
+#   - объем заказов по дням с сезонностью (пик в декабре, провал летом),
+#     выходными и часами работы магазина;
+#   - ФИО, адреса и телефоны на кириллице в разных форматах записи.
+# Результат воспроизводим: одинаковые параметры и --seed дают одинаковую БД
+# (дата окончания периода задается --end, по умолчанию - сегодня).
+#
+# Строки вставляются пачками executemany в больших транзакциях. Триггеры
+# сводных таблиц, счетчиков, версий данных и журнала изменений на время
+# загрузки снимаются, а после нее сводки и счетчики пересчитываются целиком
+# (rollups, counters) - это быстрее, чем срабатывание триггеров на каждую
+# строку; в журнал изменений пишется отметка "перечитать все" (change_log).
+# Триггеры полнотекстового поиска остаются. Идентификаторы задаются явно, поэтому
+# данные можно добавлять в непустую БД.
+#
+# Запуск: python data_generator.py БД [--preset 1k|100k|1m] [--orders N ...] [--seed 1]
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from migrations import run_migrations
+from rollups import rebuild_rollups
+from counters import repair_counters
+from change_log import mark_reset
+
+# Объемы по умолчанию; имя - примерное число заказов
+PRESETS: Dict[str, Dict[str, int]] = {
+    '1k': {'employees': 10, 'products': 200, 'clients': 1000, 'orders': 1000,
+           'audit': 2000, 'sessions': 500},
+    '100k': {'employees': 50, 'products': 10000, 'clients': 100000, 'orders': 100000,
+             'audit': 200000, 'sessions': 20000},
+    '1m': {'employees': 200, 'products': 50000, 'clients': 1000000, 'orders': 1000000,
+           'audit': 2000000, 'sessions': 100000},
+}
+TABLES = ('employees', 'products', 'clients', 'orders', 'audit', 'sessions')
+
+# Пароль всех сгенерированных сотрудников
+DEFAULT_PASSWORD = 'Generated-1'
+
+# Триггеры, чьи данные пересчитываются после загрузки
+_REBUILT_TRIGGERS = ('trg_%_rollup_%', 'trg_%_counter_%', 'trg_%_version_%', 'trg_%_change_%')
+
+MALE_FIRST = ['Александр', 'Алексей', 'Андрей', 'Артём', 'Борис', 'Вадим', 'Владимир', 'Дмитрий',
+              'Евгений', 'Иван', 'Игорь', 'Кирилл', 'Максим', 'Михаил', 'Николай', 'Олег',
+              'Павел', 'Роман', 'Сергей', 'Фёдор', 'Юрий']
+FEMALE_FIRST = ['Алёна', 'Анастасия', 'Анна', 'Валентина', 'Дарья', 'Екатерина', 'Елена', 'Ирина',
+                'Ксения', 'Людмила', 'Мария', 'Наталья', 'Ольга', 'Светлана', 'Татьяна', 'Юлия']
+SURNAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+            'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров',
+            'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин',
+            'Захаров', 'Зайцев', 'Соловьёв', 'Борисов', 'Яковлев', 'Григорьев', 'Романов', 'Воробьёв']
+PATRONYMIC_BASES = ['Александров', 'Алексеев', 'Андреев', 'Владимиров', 'Дмитриев', 'Иванов',
+                    'Михайлов', 'Николаев', 'Олегов', 'Павлов', 'Сергеев', 'Юрьев']
+CITIES = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Нижний Новгород',
+          'Самара', 'Ростов-на-Дону', 'Уфа', 'Красноярск', 'Воронеж', 'Пермь']
+STREETS = ['ул. Ленина', 'ул. Гагарина', 'пр. Мира', 'ул. Пушкина', 'ул. Советская', 'ул. Садовая',
+           'ул. Молодёжная', 'ул. Школьная', 'ул. Лесная', 'Цветной б-р', 'ул. Чехова', 'наб. Реки']
+EMAIL_DOMAINS = ['mail.ru', 'yandex.ru', 'gmail.com', 'bk.ru', 'rambler.ru', 'inbox.ru']
+
+# Категория -> (диапазон цен, типы товаров, бренды)
+CATEGORIES = {
+    'Электроника': ((5000, 150000), ['Ноутбук', 'Смартфон', 'Планшет', 'Монитор', 'Телевизор'],
+                    ['Dell', 'Lenovo', 'Samsung', 'Apple', 'Xiaomi', 'LG', 'Huawei']),
+    'Аксессуары': ((300, 15000), ['Мышь', 'Клавиатура', 'Чехол', 'Кабель', 'Зарядное устройство'],
+                   ['Logitech', 'Razer', 'Defender', 'Baseus', 'Anker', 'Ugreen']),
+    'Аудио': ((1000, 60000), ['Наушники', 'Колонка', 'Саундбар', 'Микрофон'],
+              ['Sony', 'JBL', 'Sennheiser', 'Marshall', 'Яндекс']),
+    'Хранение данных': ((500, 30000), ['Флешка', 'Внешний диск', 'SSD', 'Карта памяти'],
+                        ['SanDisk', 'Kingston', 'WD', 'Seagate', 'Transcend']),
+    'Бытовая техника': ((2000, 90000), ['Чайник', 'Пылесос', 'Микроволновка', 'Кофемашина', 'Утюг'],
+                        ['Bosch', 'Philips', 'Tefal', 'Redmond', 'Polaris']),
+    'Канцтовары': ((30, 2000), ['Тетрадь', 'Ручка', 'Блокнот', 'Папка', 'Маркер'],
+                   ['Erich Krause', 'Brauberg', 'Attache', 'Hatber']),
+}
+SUPPLIERS = ['ООО «Техноторг»', 'АО «Ситилинк Опт»', 'ООО «Электрон»', 'ИП Смирнов А. В.',
+             'ООО «Мегаполис-Дистрибуция»', 'АО «Мерлион»', 'ООО «Офисмаг»']
+AUDIT_ACTIONS = [  # (действие, таблица, вес)
+    ('LOGIN', 'employees', 20), ('WEB_LOGIN_SUCCESS', 'employees', 5), ('LOGOUT', 'employees', 10),
+    ('CREATE_ORDER', 'orders', 30), ('UPDATE_ORDER_STATUS', 'orders', 15),
+    ('CREATE_CLIENT', 'clients', 8), ('UPDATE_PRODUCT', 'products', 10), ('VIEW_CLIENT', 'clients', 12),
+]
+USER_AGENTS = ['TradingApp/1.0 (Windows 10)', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0',
+               'Mozilla/5.0 (X11; Linux x86_64) Firefox/121.0', 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1)']
+
+_TRANSLIT = dict(zip('абвгдеёжзийклмнопрстуфхцчшщъыьэюя',
+                     ['a', 'b', 'v', 'g', 'd', 'e', 'e', 'zh', 'z', 'i', 'y', 'k', 'l', 'm', 'n', 'o',
+                      'p', 'r', 's', 't', 'u', 'f', 'kh', 'ts', 'ch', 'sh', 'shch', '', 'y', '', 'e',
+                      'yu', 'ya']))
+
+def translit(text: str) -> str:
+    return ''.join(_TRANSLIT.get(ch, ch) for ch in text.lower() if ch.isalnum())
+
+class ZipfSampler:
+    """Выбор идентификаторов с вероятностью 1/ранг^s; ранги перемешаны,
+    чтобы популярность не совпадала с порядком идентификаторов"""
+    
+    def __init__(self, ids: Sequence[int], s: float, rnd: random.Random):
+        self.ids = list(ids)
+        rnd.shuffle(self.ids)
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(self.ids) + 1)))
+        self.rnd = rnd
+    
+    def sample(self, k: int = 1) -> List[int]:
+        return self.rnd.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+class Calendar:
+    """Моменты событий за период с сезонностью, днями недели и часами работы"""
+    
+    # Доля событий по часам 9:00-21:00 (пики в обед и вечером)
+    HOURS = list(range(9, 21))
+    HOUR_WEIGHTS = [3, 5, 6, 8, 9, 7, 6, 6, 7, 9, 8, 5]
+    
+    def __init__(self, end: datetime, days: int, season: float, rnd: random.Random):
+        self.start = end - timedelta(days=days)
+        self.rnd = rnd
+        weights = []
+        for day in range(days):
+            date = self.start + timedelta(days=day)
+            # Пик сезона - середина декабря, провал - середина июня
+            weight = 1 + season * math.cos(2 * math.pi * (date.timetuple().tm_yday - 350) / 365)
+            if date.weekday() >= 5:
+                weight *= 1.25
+            if date.month == 12 and date.day >= 20:
+                weight *= 1.5
+            # Рост бизнеса: к концу периода заказов в полтора раза больше
+            weight *= 1 + 0.5 * day / days
+            weights.append(weight)
+        self.cum_weights = list(itertools.accumulate(weights))
+        self.hour_cum = list(itertools.accumulate(self.HOUR_WEIGHTS))
+    
+    def moments(self, count: int) -> Iterator[datetime]:
+        """count моментов по возрастанию (память - по числу дней, а не событий)"""
+        per_day = [0] * len(self.cum_weights)
+        for start in range(0, count, 100000):
+            for day in self.rnd.choices(range(len(per_day)), cum_weights=self.cum_weights,
+                                        k=min(100000, count - start)):
+                per_day[day] += 1
+        for day, events in enumerate(per_day):
+            date = self.start + timedelta(days=day)
+            hours = self.rnd.choices(self.HOURS, cum_weights=self.hour_cum, k=events)
+            for offset in sorted(hour * 3600 + self.rnd.randrange(3600) for hour in hours):
+                yield date + timedelta(seconds=offset)
+
+def fmt(moment: Optional[datetime]) -> Optional[str]:
+    """Формат столбцов TIMESTAMP (как CURRENT_TIMESTAMP)"""
+    return moment.strftime('%Y-%m-%d %H:%M:%S') if moment else None
+
+class DataGenerator:
+    """Генерация строк таблиц; идентификаторы начинаются после уже имеющихся"""
+    
+    def __init__(self, conn: sqlite3.Connection, counts: Dict[str, int], seed: int = 1,
+                 zipf: float = 1.1, season: float = 0.35, days: int = 730, end: datetime = None,
+                 batch: int = 20000, commit_every: int = 500000,
+                 progress: Callable[[str], None] = print):
+        self.conn = conn
+        self.counts = counts
+        self.rnd = random.Random(seed)
+        self.zipf = zipf
+        self.end = end or datetime.combine(datetime.now(timezone.utc).date(), datetime.min.time())
+        self.calendar = Calendar(self.end, days, season, self.rnd)
+        self.batch = batch
+        self.commit_every = commit_every
+        self.progress = progress
+        self.inserted: Dict[str, int] = {}
+        self._since_commit = 0
+    
+    # -- служебное --
+    
+    def _next_id(self, table: str) -> int:
+        return (self.conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0) + 1
+    
+    def _insert(self, table: str, columns: Sequence[str], rows: Iterable[Tuple],
+                report: bool = True) -> int:
+        """Вставка пачками executemany; фиксация каждые commit_every строк"""
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        total = 0
+        started = time.perf_counter()
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.batch))
+            if not chunk:
+                break
+            self.conn.executemany(sql, chunk)
+            total += len(chunk)
+            self._since_commit += len(chunk)
+            if self._since_commit >= self.commit_every:
+                self.conn.commit()
+                self.conn.execute("BEGIN")
+                self._since_commit = 0
+        self.inserted[table] = self.inserted.get(table, 0) + total
+        elapsed = time.perf_counter() - started
+        if report:
+            self.progress(f"  {table}: {total} строк за {elapsed:.1f} с "
+                          f"({total / elapsed if elapsed else 0:.0f} строк/с)")
+        return total
+    
+    def _person(self) -> Tuple[str, str, str]:
+        """(ФИО, имя латиницей для логина/почты, фамилия)"""
+        rnd = self.rnd
+        surname = rnd.choice(SURNAMES)
+        if rnd.random() < 0.5:
+            first = rnd.choice(MALE_FIRST)
+            patronymic = rnd.choice(PATRONYMIC_BASES) + 'ич'
+        else:
+            first = rnd.choice(FEMALE_FIRST)
+            surname += 'а'
+            patronymic = rnd.choice(PATRONYMIC_BASES) + 'на'
+        return f"{surname} {first} {patronymic}", translit(first), translit(surname)
+    
+    def _phone(self) -> str:
+        """Телефон в одном из привычных форматов записи"""
+        code = self.rnd.choice(['903', '905', '910', '915', '916', '926', '985', '999'])
+        number = f"{self.rnd.randrange(10 ** 7):07d}"
+        return self.rnd.choice([
+            f"+7{code}{number}",
+            f"+7 ({code}) {number[:3]}-{number[3:5]}-{number[5:]}",
+            f"8 {code} {number[:3]} {number[3:5]} {number[5:]}",
+            f"8{code}{number}",
+        ])
+    
+    def _address(self) -> str:
+        return (f"г. {self.rnd.choice(CITIES)}, {self.rnd.choice(STREETS)}, "
+                f"д. {self.rnd.randint(1, 150)}, кв. {self.rnd.randint(1, 300)}")
+    
+    # -- таблицы --
+    
+    def employees(self) -> List[Tuple[int, str]]:
+        """Сотрудники: [(id, роль)]"""
+        first_id = self._next_id('employees')
+        roles = self.rnd.choices(['cashier', 'manager', 'content_manager', 'viewer', 'admin'],
+                                 weights=[60, 20, 8, 10, 2], k=self.counts['employees'])
+        rows = []
+        for i, role in enumerate(roles):
+            full_name, first, surname = self._person()
+            salt = f"{self.rnd.getrandbits(128):032x}"
+            password_hash = salt + ':' + hashlib.sha256((salt + DEFAULT_PASSWORD).encode()).hexdigest()
+            rows.append((first_id + i, f"{first}.{surname}{first_id + i}", password_hash, full_name,
+                         f"{first}.{surname}{first_id + i}@shop.example", self._phone(), role,
+                         fmt(self.calendar.start), 0))
+        self._insert('employees', ('id', 'username', 'password_hash', 'full_name', 'email', 'phone',
+                                   'role', 'created_at', 'must_change_password'), rows)
+        return [(row[0], row[6]) for row in rows]
+    
+    def products(self) -> Dict[int, float]:
+        """Товары: {id: цена}"""
+        first_id = self._next_id('products')
+        prices = {}
+        
+        def rows():
+            categories = list(CATEGORIES)
+            for i in range(self.counts['products']):
+                product_id = first_id + i
+                category = self.rnd.choice(categories)
+                (low, high), kinds, brands = CATEGORIES[category]
+                # Логнормальная цена в диапазоне категории
+                price = round(min(high, max(low, math.exp(self.rnd.uniform(math.log(low), math.log(high))))), 2)
+                prices[product_id] = price
+                kind, brand = self.rnd.choice(kinds), self.rnd.choice(brands)
+                # Часть товаров закончилась или заканчивается (отчет о низких остатках)
+                quantity = self.rnd.choices([0, self.rnd.randint(1, 9), self.rnd.randint(10, 500)],
+                                            weights=[5, 10, 85])[0]
+                yield (product_id, f"P{product_id:07d}",
+                       f"{kind} {brand} {self.rnd.choice('ABCDEFGHKMRSTX')}{self.rnd.randint(10, 999)}",
+                       f"{kind} {brand}: {self.rnd.choice(['новинка', 'хит продаж', 'гарантия 1 год', 'гарантия 2 года'])}",
+                       category, price, quantity, 10, 200, self.rnd.choice(SUPPLIERS),
+                       f"46{product_id:011d}", int(self.rnd.random() > 0.03), fmt(self.calendar.start))
+        
+        self._insert('products', ('id', 'sku', 'name', 'description', 'category', 'unit_price',
+                                  'quantity', 'min_quantity', 'max_quantity', 'supplier', 'barcode',
+                                  'is_active', 'created_at'), rows())
+        return prices
+    
+    def clients(self, employee_ids: List[int]) -> List[int]:
+        first_id = self._next_id('clients')
+        count = self.counts['clients']
+        def rows():
+            for i, registered in enumerate(self.calendar.moments(count)):
+                full_name, first, surname = self._person()
+                consent = int(self.rnd.random() > 0.2)
+                email = (f"{first}.{surname}{self.rnd.randint(1, 9999)}@{self.rnd.choice(EMAIL_DOMAINS)}"
+                         if self.rnd.random() > 0.15 else None)
+                yield (first_id + i, f"C{first_id + i:08d}", full_name, self._phone(), email,
+                       self._address(), fmt(registered), consent,
+                       fmt(registered) if consent else None, int(self.rnd.random() > 0.05),
+                       self.rnd.choice(employee_ids))
+        
+        self._insert('clients', ('id', 'client_code', 'full_name', 'phone', 'email', 'address',
+                                 'registration_date', 'personal_data_consent', 'consent_date',
+                                 'is_active', 'created_by'), rows())
+        return list(range(first_id, first_id + count))
+    
+    def orders(self, client_ids: List[int], employees: List[Tuple[int, str]], prices: Dict[int, float]):
+        """Заказы по времени (id растет вместе с created_at) и их позиции"""
+        first_order = self._next_id('orders')
+        first_item = self._next_id('order_items')
+        count = self.counts['orders']
+        products = ZipfSampler(prices, self.zipf, self.rnd)
+        clients = ZipfSampler(client_ids, 0.8, self.rnd)
+        sellers = [employee_id for employee_id, role in employees if role in ('cashier', 'manager')] \
+            or [employee_id for employee_id, _ in employees]
+        recent = self.end - timedelta(days=3)
+        items: List[Tuple] = []
+        
+        def rows():
+            item_id = first_item
+            for i, moment in enumerate(self.calendar.moments(count)):
+                order_id = first_order + i
+                # Недавние заказы еще в работе, старые - выполнены или отменены
+                if moment >= recent:
+                    status = self.rnd.choices(['pending', 'processing', 'completed'], weights=[3, 3, 4])[0]
+                else:
+                    status = self.rnd.choices(['completed', 'cancelled'], weights=[92, 8])[0]
+                lines = min(1 + int(self.rnd.expovariate(0.7)), 15)
+                total = 0.0
+                for product_id in dict.fromkeys(products.sample(lines)):
+                    quantity = self.rnd.choice((1, 1, 1, 2, 2, 3, 5))
+                    price = prices[product_id]
+                    items.append((item_id, order_id, product_id, quantity, price, round(price * quantity, 2)))
+                    total += price * quantity
+                    item_id += 1
+                completed = moment + timedelta(minutes=self.rnd.randint(1, 240)) if status == 'completed' else None
+                yield (order_id, f"ORD{moment:%Y%m%d}{order_id:08d}", clients.sample()[0],
+                       self.rnd.choice(sellers), status, round(total, 2), fmt(moment), fmt(completed))
+        
+        columns = ('id', 'order_number', 'client_id', 'employee_id', 'status', 'total_amount',
+                   'created_at', 'completed_at')
+        # Позиции пишутся после каждой пачки заказов, чтобы не держать их все в памяти
+        order_rows = rows()
+        inserted_items = 0
+        started = time.perf_counter()
+        while True:
+            chunk = list(itertools.islice(order_rows, self.batch))
+            if not chunk:
+                break
+            self._insert('orders', columns, chunk, report=False)
+            self._insert('order_items', ('id', 'order_id', 'product_id', 'quantity',
+                                         'unit_price', 'total_price'), items, report=False)
+            inserted_items += len(items)
+            items.clear()
+        elapsed = time.perf_counter() - started
+        self.progress(f"  orders: {count} строк, order_items: {inserted_items} строк за {elapsed:.1f} с")
+    
+    def audit(self, employees: List[Tuple[int, str]], max_ids: Dict[str, int]):
+        """Журнал аудита: действия сотрудников по времени"""
+        count = self.counts['audit']
+        weights = [weight for _, _, weight in AUDIT_ACTIONS]
+        employee_ids = [employee_id for employee_id, _ in employees]
+        
+        def rows():
+            for moment in self.calendar.moments(count):
+                action, table, _ = self.rnd.choices(AUDIT_ACTIONS, weights)[0]
+                employee_id = self.rnd.choice(employee_ids)
+                record_id = employee_id if table == 'employees' else self.rnd.randint(1, max(1, max_ids[table]))
+                new_values = (json.dumps({'status': self.rnd.choice(('processing', 'completed'))})
+                              if action == 'UPDATE_ORDER_STATUS' else None)
+                yield (employee_id, action, table, record_id, new_values,
+                       f"192.168.{self.rnd.randint(0, 3)}.{self.rnd.randint(2, 254)}",
+                       self.rnd.choice(USER_AGENTS), fmt(moment))
+        
+        self._insert('audit_log', ('employee_id', 'action', 'table_name', 'record_id', 'new_values',
+                                   'ip_address', 'user_agent', 'created_at'), rows())
+    
+    def sessions(self, employees: List[Tuple[int, str]]):
+        """Сессии входа: истекшие и несколько активных за последние сутки"""
+        count = self.counts['sessions']
+        employee_ids = [employee_id for employee_id, _ in employees]
+        active_since = self.end - timedelta(hours=8)
+        
+        def rows():
+            for moment in self.calendar.moments(count):
+                expires = moment + timedelta(hours=8)
+                yield (self.rnd.choice(employee_ids), f"{self.rnd.getrandbits(256):064x}",
+                       f"192.168.{self.rnd.randint(0, 3)}.{self.rnd.randint(2, 254)}",
+                       self.rnd.choice(USER_AGENTS), fmt(moment),
+                       fmt(moment + timedelta(minutes=self.rnd.randint(1, 480))), fmt(expires),
+                       int(moment >= active_since))
+        
+        self._insert('user_sessions', ('employee_id', 'session_token', 'ip_address', 'user_agent',
+                                       'created_at', 'last_activity', 'expires_at', 'is_active'), rows())
+    
+    def run(self) -> Dict[str, int]:
+        """Генерация всех таблиц в одной последовательности транзакций"""
+        self.conn.execute("BEGIN")
+        employees = self.employees()
+        prices = self.products()
+        client_ids = self.clients([employee_id for employee_id, _ in employees])
+        self.orders(client_ids, employees, prices)
+        max_ids = {table: self._next_id(table) - 1 for table in ('orders', 'clients', 'products')}
+        self.audit(employees, max_ids)
+        self.sessions(employees)
+        self.conn.commit()
+        return self.inserted
+
+def drop_rebuilt_triggers(conn: sqlite3.Connection) -> List[str]:
+    """Снятие триггеров сводок, счетчиков, версий и журнала изменений; возвращает их SQL для восстановления"""
+    where = ' OR '.join("name LIKE ?" for _ in _REBUILT_TRIGGERS)
+    triggers = conn.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND ({where})",
+                            _REBUILT_TRIGGERS).fetchall()
+    for name, _ in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+    return [sql for _, sql in triggers]
+
+def restore_derived_data(conn: sqlite3.Connection, trigger_sql: List[str]):
+    """Возврат триггеров и пересчет того, что они поддерживают"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for sql in trigger_sql:
+            conn.execute(sql)
+        cursor = conn.cursor()
+        rebuild_rollups(cursor)
+        repair_counters(cursor)
+        cursor.execute("UPDATE data_versions SET version = version + 1, modified_at = CURRENT_TIMESTAMP")
+        mark_reset(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def generate(db_path: str, counts: Dict[str, int], analyze: bool = True,
+             progress: Callable[[str], None] = print, **options) -> Dict[str, int]:
+    """Заполнение БД db_path (схема создается миграциями); число вставленных строк по таблицам"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        run_migrations(conn)
+        # Только на время загрузки и только для этого соединения
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -262144")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        
+        conn.execute("BEGIN IMMEDIATE")
+        trigger_sql = drop_rebuilt_triggers(conn)
+        conn.commit()
+        try:
+            inserted = DataGenerator(conn, counts, progress=progress, **options).run()
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            progress("Пересчет сводок и счетчиков...")
+            restore_derived_data(conn, trigger_sql)
+        if analyze:
+            progress("Сбор статистики (ANALYZE)...")
+            conn.execute("ANALYZE")
+        return inserted
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация тестовых данных")
+    parser.add_argument('db_path', help="файл БД (создается, если нет)")
+    parser.add_argument('--preset', choices=list(PRESETS), default='1k', help="объемы по умолчанию")
+    for table in TABLES:
+        parser.add_argument(f'--{table}', type=int, help=f"строк {table} (вместо значения из --preset)")
+    parser.add_argument('--seed', type=int, default=1, help="зерно генератора случайных чисел")
+    parser.add_argument('--zipf', type=float, default=1.1, help="показатель Ципфа популярности товаров")
+    parser.add_argument('--season', type=float, default=0.35, help="амплитуда сезонности заказов (0 - нет)")
+    parser.add_argument('--days', type=int, default=730, help="период данных, дней")
+    parser.add_argument('--end', help="конец периода YYYY-MM-DD (по умолчанию - сегодня)")
+    parser.add_argument('--batch', type=int, default=20000, help="строк в одном executemany")
+    parser.add_argument('--no-analyze', action='store_true', help="не собирать статистику ANALYZE")
+    args = parser.parse_args()
+    
+    counts = dict(PRESETS[args.preset])
+    counts.update({table: getattr(args, table) for table in TABLES if getattr(args, table) is not None})
+    end = datetime.strptime(args.end, '%Y-%m-%d') if args.end else None
+    
+    print(f"Генерация данных в {args.db_path}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+    started = time.perf_counter()
+    inserted = generate(args.db_path, counts, analyze=not args.no_analyze, seed=args.seed,
+                        zipf=args.zipf, season=args.season, days=args.days, end=end, batch=args.batch)
+    print(f"Готово за {time.perf_counter() - started:.1f} с: {sum(inserted.values())} строк")
+
+if __name__ == "__main__":
+    main()
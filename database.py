@@ -1,22 +1,599 @@
 # database.py - Основной модуль базы данных
+import re
 import sqlite3
 import hashlib
 import secrets
 import json
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, NamedTuple, Tuple, Callable
 import logging
+from config import Config
+from migrations import run_migrations, get_schema_version
+from pagination import fetch_page, resolve_sort
+import client_search
+import rollups
+import counters
+import cache
+from change_log import ChangeFeed, ChangeVersion
+from audit import get_audit_writer, make_audit_row
 
 logger = logging.getLogger(__name__)
 
+class StockShortageError(ValueError):
+    """Недостаточно товара на складе для заказа.
+    
+    shortages - список {'product_id', 'sku', 'requested', 'available'}
+    по каждой позиции, которой не хватает.
+    """
+    
+    def __init__(self, shortages: List[Dict[str, Any]]):
+        self.shortages = shortages
+        details = ", ".join(
+            f"{s['sku']} (нужно {s['requested']}, в наличии {s['available']})" for s in shortages
+        )
+        super().__init__(f"Недостаточно товара в наличии: {details}")
+    
+    @property
+    def skus(self) -> List[str]:
+        return [s['sku'] for s in self.shortages]
+
+class TimeRange(NamedTuple):
+    """Полуоткрытый интервал времени [start, end) в UTC.
+    
+    Столбцы TIMESTAMP (created_at, registration_date) хранят строку
+    'YYYY-MM-DD HH:MM:SS' от CURRENT_TIMESTAMP, поэтому условие
+    "столбец >= ? AND столбец < ?" сравнивает сам столбец и использует индекс,
+    в отличие от DATE(столбец) = ... или strftime(...).
+    """
+    start: datetime
+    end: datetime
+    
+    @staticmethod
+    def _now(now: datetime = None) -> datetime:
+        return now or datetime.now(timezone.utc).replace(tzinfo=None)
+    
+    @classmethod
+    def today(cls, now: datetime = None) -> 'TimeRange':
+        """Текущие сутки"""
+        start = datetime.combine(cls._now(now).date(), datetime.min.time())
+        return cls(start, start + timedelta(days=1))
+    
+    @classmethod
+    def last_days(cls, days: int, now: datetime = None) -> 'TimeRange':
+        """С полуночи days дней назад до конца текущих суток"""
+        today = cls.today(now)
+        return cls(today.start - timedelta(days=int(days)), today.end)
+    
+    @classmethod
+    def month(cls, month: str) -> 'TimeRange':
+        """Календарный месяц 'YYYY-MM'"""
+        start = datetime.strptime(month, '%Y-%m')
+        return cls(start, cls._add_months(start, 1))
+    
+    @classmethod
+    def last_months(cls, months: int, now: datetime = None) -> 'TimeRange':
+        """С первого числа месяца months месяцев назад до конца текущего месяца"""
+        current = cls._now(now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return cls(cls._add_months(current, -int(months)), cls._add_months(current, 1))
+    
+    @staticmethod
+    def _add_months(month_start: datetime, months: int) -> datetime:
+        index = month_start.year * 12 + month_start.month - 1 + months
+        return month_start.replace(year=index // 12, month=index % 12 + 1)
+    
+    def sql(self, column: str) -> str:
+        """Условие WHERE для столбца TIMESTAMP (параметры - params)"""
+        return f"{column} >= ? AND {column} < ?"
+    
+    @property
+    def params(self) -> Tuple[str, str]:
+        return (self.start.strftime('%Y-%m-%d %H:%M:%S'), self.end.strftime('%Y-%m-%d %H:%M:%S'))
+    
+    @property
+    def day_keys(self) -> Tuple[str, str]:
+        """Границы для ключей 'YYYY-MM-DD' сводных таблиц"""
+        return (self.start.strftime('%Y-%m-%d'), self.end.strftime('%Y-%m-%d'))
+    
+    @property
+    def month_keys(self) -> Tuple[str, str]:
+        """Границы для ключей 'YYYY-MM' сводных таблиц"""
+        return (self.start.strftime('%Y-%m'), self.end.strftime('%Y-%m'))
+
+def build_fts_query(text: str) -> str:
+    """Запрос FTS5 из пользовательского ввода: каждое слово - префикс, все слова обязательны.
+    
+    Слова берутся в кавычки, поэтому операторы FTS5 (OR, NEAR, *, -) во вводе
+    не интерпретируются. ё заменяется на е, как и при индексации.
+    """
+    words = re.findall(r'\w+', (text or '').replace('ё', 'е').replace('Ё', 'Е'))
+    return ' '.join(f'"{word}"*' for word in words)
+
+# Порядок применения PRAGMA: busy_timeout первым, чтобы смена режима журнала
+# дождалась блокировки, а не упала с "database is locked"
+_PRAGMA_ORDER = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+_SYNCHRONOUS_NAMES = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+_TEMP_STORE_NAMES = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, Any]):
+    """Применение профиля настроек SQLite к соединению"""
+    for name in _PRAGMA_ORDER:
+        if name not in pragmas:
+            continue
+        value = pragmas[name]
+        if name in ('journal_mode', 'synchronous', 'temp_store'):
+            value = str(value).upper()
+            if not value.isalpha():
+                raise ValueError(f"Недопустимое значение PRAGMA {name}: {value}")
+        else:
+            value = int(value)
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+def read_pragmas(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Фактические значения настроек SQLite на соединении"""
+    settings = {}
+    for name in _PRAGMA_ORDER + ('foreign_keys',):
+        settings[name] = conn.execute(f"PRAGMA {name}").fetchone()[0]
+    settings['synchronous'] = _SYNCHRONOUS_NAMES.get(settings['synchronous'], settings['synchronous'])
+    settings['temp_store'] = _TEMP_STORE_NAMES.get(settings['temp_store'], settings['temp_store'])
+    settings['journal_mode'] = str(settings['journal_mode']).upper()
+    return settings
+
+# Наблюдатели выполнения SQL: observer(QueryEvent) вызывается по завершении
+# каждого запроса в потоке, выполнившем его (метрики веб-запросов, журнал медленных запросов)
+_query_observers: List[Callable[['QueryEvent'], None]] = []
+
+def add_query_observer(observer: Callable[['QueryEvent'], None]):
+    """Подписка на выполнение SQL всеми соединениями пулов"""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+def remove_query_observer(observer: Callable[['QueryEvent'], None]):
+    """Отписка наблюдателя"""
+    if observer in _query_observers:
+        _query_observers.remove(observer)
+
+class QueryEvent(NamedTuple):
+    """Выполненный SQL-запрос"""
+    sql: str
+    params: Any                         # None для executemany
+    seconds: float                      # выполнение и выборка строк
+    rows: int                           # выбрано строк (SELECT, RETURNING) или изменено
+    connection: sqlite3.Connection
+
+class ObservedCursor(sqlite3.Cursor):
+    """Курсор, сообщающий наблюдателям время и число строк запросов.
+    
+    Запрос, возвращающий строки, завершается, когда они выбраны до конца,
+    при следующем execute(), закрытии или удалении курсора; время выборки
+    входит во время запроса. Без наблюдателей добавляет только проверку
+    пустого списка.
+    """
+    
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._pending = None  # [sql, params, секунд, строк] незавершенного запроса
+    
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        event = QueryEvent(pending[0], pending[1], pending[2], pending[3], self.connection)
+        for observer in tuple(_query_observers):
+            try:
+                observer(event)
+            except Exception as e:
+                logger.warning(f"Ошибка наблюдателя SQL: {e}")
+    
+    def _run(self, method, sql, parameters, event_params):
+        if self._pending is not None:
+            self._finish()
+        if not _query_observers:
+            return method(self, sql, parameters)
+        started = time.perf_counter()
+        try:
+            return method(self, sql, parameters)
+        finally:
+            self._pending = [sql, event_params, time.perf_counter() - started, 0]
+            if self.description is None:
+                # Строк не возвращает (или ошибка): запрос завершен
+                self._pending[3] = max(self.rowcount, 0)
+                self._finish()
+    
+    def _fetched(self, started: float, rows: int, done: bool):
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += rows
+        if done:
+            self._finish()
+    
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_parameters, None)
+    
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, int(row is not None), row is None)
+        return row
+    
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._pending is None:
+            return super().fetchmany(size)
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+    
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+    
+    def __next__(self):
+        if self._pending is None:
+            return super().__next__()
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        if getattr(self, '_pending', None) is not None:
+            self._finish()
+
+class ObservedConnection(sqlite3.Connection):
+    """Соединение, чьи курсоры (и сокращения execute/executemany) - ObservedCursor"""
+    
+    def cursor(self, factory=ObservedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class PooledConnection:
+    """Соединение, выданное пулом: close() возвращает его в пул, а не закрывает.
+    
+    Вложенная выдача внутри открытой транзакции внешнего кода работает в точке
+    сохранения (SAVEPOINT): ее commit() и rollback() фиксируют или отменяют
+    только свои изменения, а транзакцию целиком фиксирует или откатывает внешний код.
+    """
+    
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection, nested: bool = False):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+        self._savepoint = None
+        if nested and conn.in_transaction:
+            self._savepoint = f"lease_{id(self)}"
+            conn.execute(f"SAVEPOINT {self._savepoint}")
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __enter__(self):
+        if self._savepoint is None:
+            return self._conn.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._savepoint is None:
+            return self._conn.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+    
+    def commit(self):
+        if self._savepoint is None:
+            return self._conn.commit()
+        # Изменения остаются в транзакции внешнего кода; дальше - новая точка сохранения
+        self._conn.execute(f"RELEASE {self._savepoint}")
+        self._conn.execute(f"SAVEPOINT {self._savepoint}")
+    
+    def rollback(self):
+        if self._savepoint is None:
+            return self._conn.rollback()
+        self._conn.execute(f"ROLLBACK TO {self._savepoint}")
+    
+    def close(self):
+        """Возврат соединения в пул"""
+        if not self._released:
+            self._released = True
+            if self._savepoint is not None:
+                try:
+                    self._conn.execute(f"RELEASE {self._savepoint}")
+                except sqlite3.Error as e:
+                    logger.warning(f"Не удалось завершить точку сохранения: {e}")
+            self._pool.release(self._conn)
+
+class ConnectionPool:
+    """Пул соединений SQLite с повторным использованием соединения внутри потока.
+    
+    Поток, уже держащий соединение, получает то же самое соединение при
+    вложенном запросе (например, log_audit внутри create_order), поэтому
+    вложенные вызовы не открывают второе соединение и не ждут блокировку записи.
+    """
+    
+    def __init__(self, db_path: str, size: int = None, timeout: float = None,
+                 healthcheck_interval: float = None, profile: str = None):
+        self.db_path = db_path
+        self.profile = profile or Config.DB_PROFILE
+        if self.profile not in Config.DB_PROFILES:
+            raise ValueError(f"Неизвестный профиль БД: {self.profile}")
+        self.pragmas = Config.DB_PROFILES[self.profile]
+        self.size = size or Config.DB_POOL_SIZE
+        self.timeout = timeout if timeout is not None else Config.DB_POOL_TIMEOUT
+        self.healthcheck_interval = (healthcheck_interval if healthcheck_interval is not None
+                                     else Config.DB_POOL_HEALTHCHECK_INTERVAL)
+        
+        self._idle = deque()  # (соединение, время возврата в пул)
+        self._total = 0
+        self._lock = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+        # Обработчик трассировки SQL (sqlite3 trace callback) для всех соединений пула
+        self.trace_callback = None
+        self._stats = {
+            'created': 0,
+            'acquired': 0,
+            'reused': 0,
+            'nested': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'healthchecks': 0,
+            'discarded': 0,
+        }
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Открытие нового соединения"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=ObservedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        apply_pragmas(conn, self.pragmas)
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+    
+    def _is_healthy(self, conn: sqlite3.Connection, idle_since: float) -> bool:
+        """Проверка соединения, простоявшего дольше интервала проверки"""
+        if time.monotonic() - idle_since < self.healthcheck_interval:
+            return True
+        with self._lock:
+            self._stats['healthchecks'] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Соединение с {self.db_path} не прошло проверку: {e}")
+            return False
+    
+    def _discard(self, conn: sqlite3.Connection):
+        """Закрытие соединения и исключение его из пула"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._total -= 1
+            self._stats['discarded'] += 1
+            self._lock.notify()
+    
+    def acquire(self) -> PooledConnection:
+        """Получение соединения из пула"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            # Поток уже держит соединение - отдаем его же
+            lease[1] += 1
+            with self._lock:
+                self._stats['acquired'] += 1
+                self._stats['nested'] += 1
+            return PooledConnection(self, lease[0], nested=True)
+        
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Пул соединений закрыт")
+                
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    reused = True
+                elif self._total < self.size:
+                    self._total += 1
+                    conn, idle_since = None, None
+                    reused = False
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise sqlite3.OperationalError(
+                            f"Нет свободных соединений в пуле ({self.size}) за {self.timeout} с"
+                        )
+                    self._stats['waits'] += 1
+                    self._lock.wait(remaining)
+                    continue
+            
+            if reused:
+                if not self._is_healthy(conn, idle_since):
+                    self._discard(conn)
+                    continue
+            else:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._total -= 1
+                        self._lock.notify()
+                    raise
+            
+            with self._lock:
+                self._stats['acquired'] += 1
+                if reused:
+                    self._stats['reused'] += 1
+            
+            conn.set_trace_callback(self.trace_callback)
+            self._local.lease = [conn, 1]
+            return PooledConnection(self, conn)
+    
+    def release(self, conn: sqlite3.Connection):
+        """Возврат соединения в пул"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None or lease[0] is not conn:
+            logger.warning("Попытка вернуть в пул соединение, выданное другому потоку")
+            return
+        
+        lease[1] -= 1
+        if lease[1] > 0:
+            return
+        self._local.lease = None
+        
+        try:
+            # Незавершенная транзакция откатывается, как при закрытии соединения
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        
+        with self._lock:
+            if self._closed:
+                self._total -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+    
+    def close(self):
+        """Закрытие всех простаивающих соединений"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+                self._total -= 1
+            self._lock.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Метрики пула"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'profile': self.profile,
+                'size': self.size,
+                'open': self._total,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+            })
+        return stats
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Общий для процесса пул соединений к файлу БД"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path)
+            _pools[db_path] = pool
+        return pool
+
+def close_all_pools():
+    """Закрытие всех пулов (при завершении процесса)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+# Файлы БД, для которых в этом процессе уже выполнена инициализация схемы
+_initialized_paths = set()
+_init_lock = threading.Lock()
+_logging_configured = False
+
 class Database:
+    # Сортировки постраничных выборок: имя -> выражения ORDER BY. Первая - по умолчанию;
+    # последним идет id (стабильный порядок и уникальный ключ курсора). Только столбцы
+    # без NULL: строки с NULL в ключе выпали бы из сравнения с курсором.
+    CLIENT_SORTS = {
+        'id': ["id"],
+        'client_code': ["client_code", "id"],
+        'full_name': ["full_name", "id"],
+        'registration_date': ["registration_date", "id"],
+    }
+    PRODUCT_SORTS = {
+        'name': ["name", "id"],
+        'id': ["id"],
+        'sku': ["sku", "id"],
+        'unit_price': ["unit_price", "id"],
+        'quantity': ["quantity", "id"],
+    }
+    ORDER_SORTS = {
+        'created_at': ["o.created_at", "o.id"],
+        'id': ["o.id"],
+        'order_number': ["o.order_number", "o.id"],
+        'total_amount': ["o.total_amount", "o.id"],
+        'status': ["o.status", "o.created_at", "o.id"],
+    }
+    AUDIT_SORTS = {
+        'created_at': ["a.created_at", "a.id"],
+        'id': ["a.id"],
+        'action': ["a.action", "a.created_at", "a.id"],
+    }
+    
     def __init__(self, db_path: str = "trade_enterprise.db"):
         self.db_path = db_path
-        self.init_db()
-        self.setup_logging()
+        self.pool = get_pool(db_path)
+        
+        # Миграции и настройка логирования выполняются один раз на процесс
+        with _init_lock:
+            self.setup_logging()
+            if db_path not in _initialized_paths:
+                self.init_db()
+                self.log_effective_settings()
+                _initialized_paths.add(db_path)
+        
+        self.audit = get_audit_writer(self.pool)
+        # Изменения строк для обновления таблиц настольного приложения (соединение - при первом запросе)
+        self.change_feed = ChangeFeed(db_path)
+        
+        # Сбор всех выполняемых SQL-запросов для анализа планов (query_plans.py)
+        if Config.SQL_CAPTURE_PATH and self.pool.trace_callback is None:
+            from query_plans import StatementCollector
+            StatementCollector.capture_to_file(self.pool, Config.SQL_CAPTURE_PATH)
+        
+        # Журнал медленных запросов с планами (slow_queries.py)
+        if Config.SLOW_QUERY_LOG_ENABLED:
+            import slow_queries
+            slow_queries.install()
     
     def setup_logging(self):
         """Настройка логирования"""
+        global _logging_configured
+        if _logging_configured:
+            return
+        _logging_configured = True
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -26,171 +603,48 @@ class Database:
             ]
         )
     
-    def get_connection(self) -> sqlite3.Connection:
-        """Создание подключения к базе данных"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
+    def get_connection(self) -> PooledConnection:
+        """Получение подключения к базе данных из пула"""
+        return self.pool.acquire()
+    
+    def get_effective_settings(self) -> Dict[str, Any]:
+        """Профиль и фактические настройки SQLite (для отчета при запуске)"""
+        conn = self.get_connection()
+        try:
+            settings = read_pragmas(conn)
+        finally:
+            conn.close()
+        settings['profile'] = self.pool.profile
+        settings['sqlite_version'] = sqlite3.sqlite_version
+        return settings
+    
+    def log_effective_settings(self):
+        """Запись фактических настроек SQLite в лог"""
+        settings = self.get_effective_settings()
+        logger.info("Настройки SQLite: " + ", ".join(f"{k}={v}" for k, v in settings.items()))
+        return settings
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Метрики пула соединений"""
+        return self.pool.stats()
+    
+    def audit_stats(self) -> Dict[str, Any]:
+        """Счетчики записи аудита"""
+        return self.audit.stats()
+    
+    def close(self):
+        """Дописывание аудита и закрытие пула соединений этой БД"""
+        self.audit.close()
+        self.change_feed.close()
+        self.pool.close()
     
     def init_db(self):
-        """Инициализация базы данных и создание таблиц"""
+        """Инициализация базы данных: миграции схемы и администратор по умолчанию"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Таблица сотрудников
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS employees (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    full_name TEXT NOT NULL,
-                    email TEXT,
-                    phone TEXT,
-                    position TEXT,
-                    role TEXT CHECK(role IN ('admin', 'manager', 'cashier', 'content_manager', 'viewer')) DEFAULT 'viewer',
-                    is_active INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    password_changed_at TIMESTAMP,
-                    failed_login_attempts INTEGER DEFAULT 0,
-                    session_token TEXT,
-                    must_change_password INTEGER DEFAULT 1
-                )
-            ''')
-            
-            # Таблица клиентов (соответствует ФЗ-152)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS clients (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    client_code TEXT UNIQUE NOT NULL,
-                    full_name TEXT NOT NULL,
-                    phone TEXT,
-                    email TEXT,
-                    address TEXT,
-                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    personal_data_consent INTEGER DEFAULT 0,
-                    consent_date TIMESTAMP,
-                    is_active INTEGER DEFAULT 1,
-                    notes TEXT,
-                    created_by INTEGER,
-                    FOREIGN KEY (created_by) REFERENCES employees(id)
-                )
-            ''')
-            
-            # Таблица товаров
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sku TEXT UNIQUE NOT NULL,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    category TEXT,
-                    unit_price REAL NOT NULL CHECK(unit_price >= 0),
-                    quantity INTEGER DEFAULT 0 CHECK(quantity >= 0),
-                    min_quantity INTEGER DEFAULT 10,
-                    max_quantity INTEGER DEFAULT 100,
-                    supplier TEXT,
-                    barcode TEXT,
-                    is_active INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица заказов (ордеров)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_number TEXT UNIQUE NOT NULL,
-                    client_id INTEGER,
-                    employee_id INTEGER NOT NULL,
-                    status TEXT CHECK(status IN ('pending', 'processing', 'completed', 'cancelled')) DEFAULT 'pending',
-                    total_amount REAL DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    notes TEXT,
-                    FOREIGN KEY (client_id) REFERENCES clients(id),
-                    FOREIGN KEY (employee_id) REFERENCES employees(id)
-                )
-            ''')
-            
-            # Таблица позиций заказа
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS order_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    quantity INTEGER NOT NULL CHECK(quantity > 0),
-                    unit_price REAL NOT NULL,
-                    total_price REAL NOT NULL,
-                    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
-                    FOREIGN KEY (product_id) REFERENCES products(id)
-                )
-            ''')
-            
-            # Таблица контента для сайта
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS website_content (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    page_name TEXT NOT NULL,
-                    section TEXT NOT NULL,
-                    content_type TEXT CHECK(content_type IN ('text', 'html', 'json', 'image_path')) DEFAULT 'text',
-                    content TEXT,
-                    metadata TEXT,
-                    is_published INTEGER DEFAULT 1,
-                    created_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    version INTEGER DEFAULT 1,
-                    FOREIGN KEY (created_by) REFERENCES employees(id)
-                )
-            ''')
-            
-            # Таблица логов действий (для аудита)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    employee_id INTEGER,
-                    action TEXT NOT NULL,
-                    table_name TEXT,
-                    record_id INTEGER,
-                    old_values TEXT,
-                    new_values TEXT,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (employee_id) REFERENCES employees(id)
-                )
-            ''')
-            
-            # Таблица сессий
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    employee_id INTEGER NOT NULL,
-                    session_token TEXT UNIQUE NOT NULL,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP,
-                    is_active INTEGER DEFAULT 1,
-                    FOREIGN KEY (employee_id) REFERENCES employees(id)
-                )
-            ''')
-            
-            # Создаем индексы для производительности
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients(phone)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_email ON clients(email)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_client ON orders(client_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_employee ON orders(employee_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_sku ON products(sku)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_username ON employees(username)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_employee ON audit_log(employee_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_log(created_at)')
+            applied = run_migrations(conn)
             
             # Создаем администратора по умолчанию
             admin_exists = cursor.execute("SELECT 1 FROM employees WHERE username = 'admin'").fetchone()
@@ -204,8 +658,9 @@ class Database:
                 logger.info("Создан администратор по умолчанию")
             
             conn.commit()
-            logger.info("База данных успешно инициализирована")
-            
+            logger.info(f"База данных успешно инициализирована (версия схемы {get_schema_version(conn)}, "
+                        f"применено миграций: {len(applied)})")
+        
         except Exception as e:
             logger.error(f"Ошибка при инициализации базы данных: {e}")
             conn.rollback()
@@ -256,50 +711,394 @@ class Database:
                  table_name: str = None, record_id: int = None, 
                  old_values: Any = None, new_values: Any = None, 
                  ip: str = None, user_agent: str = None):
-        """Логирование действий для аудита"""
+        """Логирование действий для аудита (режим записи - Config.AUDIT_MODE)"""
+        self.audit.log(make_audit_row(employee_id, action, table_name, record_id,
+                                      old_values, new_values, ip, user_agent))
+    
+    def flush_audit(self, timeout: float = None) -> bool:
+        """Ожидание записи поставленных в очередь событий аудита"""
+        return self.audit.flush(timeout)
+    
+    def get_clients_page(self, limit: int = 100, cursor: str = None, with_total: bool = False,
+                         sort: str = None, descending: bool = True, offset: int = None,
+                         ids: List[int] = None) -> Dict[str, Any]:
+        """Страница активных клиентов (по умолчанию новые сначала; sort - из CLIENT_SORTS;
+        ids - только эти клиенты)"""
+        order_by, key_fields = resolve_sort(self.CLIENT_SORTS, sort)
+        where = ["is_active = 1"]
+        params = []
+        if ids:
+            where.append(f"id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO audit_log 
-                (employee_id, action, table_name, record_id, old_values, new_values, ip_address, user_agent)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                employee_id, 
-                action, 
-                table_name, 
-                record_id,
-                json.dumps(old_values) if old_values else None,
-                json.dumps(new_values) if new_values else None,
-                ip, 
-                user_agent
-            ))
+            return fetch_page(
+                conn,
+                "SELECT * FROM clients",
+                where, params,
+                order_by=order_by, key_fields=key_fields, descending=descending,
+                limit=limit, cursor=cursor, with_total=with_total,
+                count_sql="SELECT COUNT(*) FROM clients", offset=offset
+            )
+        finally:
+            conn.close()
+    
+    def search_clients(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Поиск активных клиентов по коду, телефону, email, ФИО и адресу"""
+        conn = self.get_connection()
+        
+        try:
+            return client_search.search_clients(conn, query, build_fts_query(query), limit)
+        finally:
+            conn.close()
+    
+    def get_products_page(self, category: str = None, limit: int = 100, cursor: str = None,
+                          with_total: bool = False, sort: str = None, descending: bool = False,
+                          offset: int = None, ids: List[int] = None) -> Dict[str, Any]:
+        """Страница активных товаров (по умолчанию по названию; sort - из PRODUCT_SORTS;
+        ids - только эти товары)"""
+        order_by, key_fields = resolve_sort(self.PRODUCT_SORTS, sort)
+        where = ["is_active = 1"]
+        params = []
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        if ids:
+            where.append(f"id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        
+        conn = self.get_connection()
+        
+        try:
+            return fetch_page(
+                conn,
+                "SELECT * FROM products",
+                where, params,
+                order_by=order_by, key_fields=key_fields, descending=descending,
+                limit=limit, cursor=cursor, with_total=with_total,
+                count_sql="SELECT COUNT(*) FROM products", offset=offset
+            )
+        finally:
+            conn.close()
+    
+    def search_products(self, query: str, category: str = None, limit: int = 50,
+                        cursor: str = None, with_total: bool = False,
+                        offset: int = None, ids: List[int] = None,
+                        sort: str = None, descending: bool = False) -> Dict[str, Any]:
+        """Полнотекстовый поиск активных товаров по названию, артикулу, описанию,
+        поставщику и категории. Каждое слово запроса ищется как префикс,
+        результаты упорядочены по релевантности (bm25) или сортировкой sort
+        из PRODUCT_SORTS; ids - только эти товары."""
+        if sort is None:
+            order_by, key_fields = ["rank", "id"], ["rank", "id"]
+        else:
+            order_by, key_fields = resolve_sort(self.PRODUCT_SORTS, sort)
+        match = build_fts_query(query)
+        if not match:
+            return {'items': [], 'has_more': False, 'next_cursor': None,
+                    'prev_cursor': None, 'total': 0 if with_total else None,
+                    'key_fields': key_fields}
+        
+        # Веса столбцов для bm25: name, sku, description, supplier, category
+        ranked_sql = """
+            SELECT p.*, bm25(products_fts, 10.0, 8.0, 1.0, 2.0, 2.0) AS rank
+            FROM products_fts
+            JOIN products p ON p.id = products_fts.rowid
+            WHERE products_fts MATCH ? AND p.is_active = 1
+        """
+        params = [match]
+        if category:
+            ranked_sql += " AND p.category = ?"
+            params.append(category)
+        if ids:
+            ranked_sql += f" AND p.id IN ({', '.join('?' for _ in ids)})"
+            params.extend(ids)
+        
+        conn = self.get_connection()
+        
+        try:
+            return fetch_page(
+                conn,
+                f"SELECT * FROM ({ranked_sql})",
+                [], params,
+                order_by=order_by, key_fields=key_fields, descending=descending,
+                limit=limit, cursor=cursor, with_total=with_total,
+                count_sql=f"SELECT COUNT(*) FROM ({ranked_sql})", offset=offset
+            )
+        finally:
+            conn.close()
+    
+    def get_dashboard_counts(self) -> Dict[str, Any]:
+        """Счетчики панелей управления одним запросом к таблице counters"""
+        conn = self.get_connection()
+        
+        try:
+            values = counters.read_counters(conn)
+        finally:
+            conn.close()
+        
+        return {
+            'products_count': values['products_active'],
+            'clients_count': values['clients_active'],
+            'orders_count': values['orders_total'],
+            'orders_by_status': {status: values[f'orders_{status}'] for status in counters.ORDER_STATUSES},
+        }
+    
+    def check_counters(self, repair: bool = False) -> List[Dict[str, Any]]:
+        """Сверка счетчиков с таблицами; repair=True - пересчитать при расхождении"""
+        conn = self.get_connection()
+        
+        try:
+            mismatches = counters.check_counters(conn)
+            if mismatches:
+                logger.warning("Расхождение счетчиков: " + ", ".join(
+                    f"{m['name']} {m['stored']} != {m['actual']}" for m in mismatches
+                ))
+                if repair:
+                    conn.execute("BEGIN IMMEDIATE")
+                    counters.repair_counters(conn.cursor())
+                    conn.commit()
+            return mismatches
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def get_data_version(self, resource: str) -> Dict[str, Any]:
+        """Версия данных ресурса API ('products', 'content', 'stats') и время
+        последнего изменения (UTC) - для ETag и Last-Modified"""
+        conn = self.get_connection()
+        
+        try:
+            version, modified_at = counters.read_version(conn, resource)
+        finally:
+            conn.close()
+        
+        return {
+            'version': version,
+            'modified_at': (datetime.strptime(modified_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+                            if modified_at else None),
+        }
+    
+    def get_changes(self, since: ChangeVersion = None) -> Dict[str, Any]:
+        """Изменения клиентов, товаров, заказов и журнала аудита после версии since
+        (без since - только текущая версия); см. change_log.read_changes"""
+        return self.change_feed.changes_since(since)
+    
+    def get_sales_summary(self, months: int = 6, top_days: int = 30, top_limit: int = 10) -> Dict[str, Any]:
+        """Сводка продаж из сводных таблиц: сегодня, по месяцам, топ товаров и сотрудников"""
+        recent = TimeRange.last_days(top_days)
+        conn = self.get_connection()
+        
+        try:
+            return {
+                'today': rollups.get_day_sales(conn, TimeRange.today().day_keys[0]),
+                'monthly': rollups.get_monthly_sales(conn, *TimeRange.last_months(months).month_keys),
+                'top_products': rollups.get_top_products(conn, *recent.day_keys, limit=top_limit),
+                'employees': rollups.get_employee_sales(conn, *recent.day_keys),
+            }
+        finally:
+            conn.close()
+    
+    def get_today_sales(self) -> Dict[str, Any]:
+        """Заказы, выручка и средний чек за сегодня"""
+        conn = self.get_connection()
+        
+        try:
+            return rollups.get_day_sales(conn, TimeRange.today().day_keys[0])
+        finally:
+            conn.close()
+    
+    def get_completed_orders(self, period: TimeRange) -> List[Dict[str, Any]]:
+        """Выполненные заказы за период с клиентом и числом позиций (новые сначала)"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute(f'''
+                SELECT 
+                    o.order_number,
+                    c.full_name as client_name,
+                    o.total_amount,
+                    o.created_at,
+                    (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) as item_count
+                FROM orders o
+                LEFT JOIN clients c ON o.client_id = c.id
+                WHERE o.status = 'completed' AND {period.sql('o.created_at')}
+                ORDER BY o.created_at DESC
+            ''', period.params).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_client_report(self, new_days: int = 30, top_limit: int = 10) -> Dict[str, Any]:
+        """Клиентский отчет: итоги, самые активные и новые клиенты"""
+        today = TimeRange.today()
+        recent = TimeRange.last_days(new_days)
+        conn = self.get_connection()
+        
+        try:
+            stats = {
+                'total_clients': counters.read_counters(conn)['clients_active'],
+                'consented_clients': conn.execute(
+                    "SELECT COUNT(*) FROM clients WHERE is_active = 1 AND personal_data_consent = 1"
+                ).fetchone()[0],
+                'new_today': conn.execute(
+                    f"SELECT COUNT(*) FROM clients WHERE is_active = 1 AND {today.sql('registration_date')}",
+                    today.params
+                ).fetchone()[0],
+            }
+            
+            # Суммы по клиентам считаются по индексу (status, client_id, ...)
+            top_clients = conn.execute('''
+                SELECT 
+                    c.full_name,
+                    c.phone,
+                    c.email,
+                    s.order_count,
+                    s.total_spent,
+                    s.last_order_date
+                FROM (
+                    SELECT client_id,
+                           COUNT(*) as order_count,
+                           SUM(total_amount) as total_spent,
+                           MAX(created_at) as last_order_date
+                    FROM orders
+                    WHERE status = 'completed' AND client_id IS NOT NULL
+                    GROUP BY client_id
+                ) AS s
+                JOIN clients c ON c.id = s.client_id
+                WHERE c.is_active = 1
+                ORDER BY s.total_spent DESC
+                LIMIT ?
+            ''', (top_limit,)).fetchall()
+            
+            new_clients = conn.execute(f'''
+                SELECT 
+                    full_name,
+                    phone,
+                    email,
+                    registration_date
+                FROM clients 
+                WHERE is_active = 1 AND {recent.sql('registration_date')}
+                ORDER BY registration_date DESC
+                LIMIT ?
+            ''', recent.params + (top_limit,)).fetchall()
             
+            return {
+                'stats': stats,
+                'top_clients': [dict(row) for row in top_clients],
+                'new_clients': [dict(row) for row in new_clients],
+            }
+        finally:
+            conn.close()
+    
+    def delete_audit_before(self, days: int) -> int:
+        """Удаление записей аудита старше days дней; возвращает число удаленных"""
+        cutoff = TimeRange.last_days(days).start.strftime('%Y-%m-%d %H:%M:%S')
+        conn = self.get_connection()
+        
+        try:
+            deleted = conn.execute("DELETE FROM audit_log WHERE created_at < ?", (cutoff,)).rowcount
             conn.commit()
-        except Exception as e:
-            logger.error(f"Ошибка при записи в аудит-лог: {e}")
+            return deleted
+        except Exception:
             conn.rollback()
+            raise
         finally:
             conn.close()
     
-    def get_clients(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        """Получение списка клиентов"""
+    def rebuild_rollups(self):
+        """Пересчет сводных таблиц продаж по всем заказам"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                SELECT * FROM clients 
-                WHERE is_active = 1 
-                ORDER BY id DESC 
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
-            
-            return [dict(row) for row in cursor.fetchall()]
+            conn.execute("BEGIN IMMEDIATE")
+            rollups.rebuild_rollups(conn.cursor())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def get_orders_page(self, status: str = None, limit: int = 100, cursor: str = None,
+                        with_total: bool = False, sort: str = None, descending: bool = True,
+                        offset: int = None, ids: List[int] = None) -> Dict[str, Any]:
+        """Страница заказов с именами клиента и сотрудника (по умолчанию новые сначала;
+        sort - из ORDER_SORTS; ids - только эти заказы)"""
+        order_by, key_fields = resolve_sort(self.ORDER_SORTS, sort)
+        where = []
+        params = []
+        if status:
+            where.append("o.status = ?")
+            params.append(status)
+        if ids:
+            where.append(f"o.id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        
+        conn = self.get_connection()
+        
+        try:
+            return fetch_page(
+                conn,
+                """
+                SELECT o.*, c.full_name as client_name, e.full_name as employee_name
+                FROM orders o
+                LEFT JOIN clients c ON o.client_id = c.id
+                LEFT JOIN employees e ON o.employee_id = e.id
+                """,
+                where, params,
+                order_by=order_by, key_fields=key_fields, descending=descending,
+                limit=limit, cursor=cursor, with_total=with_total,
+                count_sql="SELECT COUNT(*) FROM orders o", offset=offset
+            )
         finally:
             conn.close()
     
+    def get_audit_page(self, days: int = None, limit: int = 100, cursor: str = None,
+                       with_total: bool = False, sort: str = None, descending: bool = True,
+                       offset: int = None) -> Dict[str, Any]:
+        """Страница журнала аудита с логином сотрудника (по умолчанию новые записи сначала;
+        sort - из AUDIT_SORTS)"""
+        order_by, key_fields = resolve_sort(self.AUDIT_SORTS, sort)
+        where = []
+        params = []
+        if days:
+            period = TimeRange.last_days(days)
+            where.append(period.sql("a.created_at"))
+            params.extend(period.params)
+        
+        conn = self.get_connection()
+        
+        try:
+            return fetch_page(
+                conn,
+                """
+                SELECT a.*, e.username as employee_username
+                FROM audit_log a
+                LEFT JOIN employees e ON a.employee_id = e.id
+                """,
+                where, params,
+                order_by=order_by, key_fields=key_fields, descending=descending,
+                limit=limit, cursor=cursor, with_total=with_total,
+                count_sql="SELECT COUNT(*) FROM audit_log a", offset=offset
+            )
+        finally:
+            conn.close()
+    
+    def iter_pages(self, page_method, **kwargs):
+        """Последовательный обход всех страниц выборки (для экспорта)"""
+        cursor = None
+        while True:
+            page = page_method(cursor=cursor, **kwargs)
+            yield from page['items']
+            if not page['next_cursor']:
+                break
+            cursor = page['next_cursor']
+    
     def get_products(self, category: str = None, limit: int = 100) -> List[Dict[str, Any]]:
         """Получение списка товаров"""
         conn = self.get_connection()
@@ -325,6 +1124,146 @@ class Database:
         finally:
             conn.close()
     
+    def get_page_content(self, page_name: str) -> List[Dict[str, Any]]:
+        """Опубликованные разделы страницы сайта по порядку"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute('''
+                SELECT * FROM website_content 
+                WHERE page_name = ? AND is_published = 1
+                ORDER BY section
+            ''', (page_name,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def content_section_exists(self, page_name: str, section: str) -> bool:
+        """Есть ли раздел section на странице page_name"""
+        conn = self.get_connection()
+        
+        try:
+            return conn.execute('''
+                SELECT id FROM website_content 
+                WHERE page_name = ? AND section = ?
+            ''', (page_name, section)).fetchone() is not None
+        finally:
+            conn.close()
+    
+    def get_order_items(self, order_id: int) -> List[Dict[str, Any]]:
+        """Позиции заказа с названием, артикулом и категорией товара"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute('''
+                SELECT oi.*, p.name, p.sku, p.category
+                FROM order_items oi
+                JOIN products p ON oi.product_id = p.id
+                WHERE oi.order_id = ?
+            ''', (order_id,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_order_item_quantities(self, order_id: int) -> List[Dict[str, Any]]:
+        """Товары и количества заказа (для возврата на склад; внутри транзакции
+        вызывающего кода читает ее данные)"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute(
+                "SELECT product_id, quantity FROM order_items WHERE order_id = ?", (order_id,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def count_product_orders(self, product_id: int) -> int:
+        """Число позиций заказов с товаром"""
+        conn = self.get_connection()
+        
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) as count FROM order_items WHERE product_id = ?", (product_id,)
+            ).fetchone()['count']
+        finally:
+            conn.close()
+    
+    def get_low_stock(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Активные товары с запасом ниже минимального (меньший запас сначала)"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute('''
+                SELECT * FROM products 
+                WHERE is_active = 1 AND quantity < min_quantity
+                ORDER BY quantity ASC 
+                LIMIT ?
+            ''', (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_recent_orders(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Последние заказы с именем клиента"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute('''
+                SELECT o.*, c.full_name as client_name 
+                FROM orders o
+                LEFT JOIN clients c ON o.client_id = c.id
+                ORDER BY o.created_at DESC 
+                LIMIT ?
+            ''', (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_employee_order_counts(self, employee_id: int) -> Dict[str, int]:
+        """Число заказов сотрудника: всего и выполненных"""
+        conn = self.get_connection()
+        
+        try:
+            total = conn.execute(
+                "SELECT COUNT(*) as count FROM orders WHERE employee_id = ?", (employee_id,)
+            ).fetchone()['count']
+            completed = conn.execute('''
+                SELECT COUNT(*) as count FROM orders 
+                WHERE employee_id = ? AND status = 'completed'
+            ''', (employee_id,)).fetchone()['count']
+            return {'total': total, 'completed': completed}
+        finally:
+            conn.close()
+    
+    def get_employee_actions(self, employee_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние записи журнала аудита сотрудника"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute('''
+                SELECT * FROM audit_log 
+                WHERE employee_id = ? 
+                ORDER BY created_at DESC 
+                LIMIT ?
+            ''', (employee_id, limit)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
+    def get_active_sessions(self, employee_id: int) -> List[Dict[str, Any]]:
+        """Токены и сроки действия активных сессий сотрудника"""
+        conn = self.get_connection()
+        
+        try:
+            rows = conn.execute('''
+                SELECT session_token, expires_at FROM user_sessions
+                WHERE employee_id = ? AND is_active = 1
+            ''', (employee_id,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+    
     def create_client(self, client_data: Dict[str, Any], employee_id: int) -> Optional[int]:
         """Создание нового клиента"""
         conn = self.get_connection()
@@ -364,6 +1303,7 @@ class Database:
             )
             
             conn.commit()
+            cache.invalidate('clients')
             return client_id
         except sqlite3.IntegrityError as e:
             logger.error(f"Ошибка при создании клиента: {e}")
@@ -376,73 +1316,113 @@ class Database:
             conn.close()
     
     def create_order(self, order_data: Dict[str, Any], employee_id: int) -> Optional[int]:
-        """Создание нового заказа"""
+        """Создание нового заказа (None при ошибке, см. create_order_checked)"""
+        try:
+            return self.create_order_checked(order_data, employee_id)
+        except Exception as e:
+            logger.error(f"Ошибка при создании заказа: {e}")
+            return None
+    
+    def create_order_checked(self, order_data: Dict[str, Any], employee_id: int) -> int:
+        """Создание нового заказа одним набором запросов независимо от числа позиций.
+        
+        Все товары читаются одним запросом, позиции вставляются executemany,
+        остатки списываются одним условным UPDATE. При нехватке любого товара
+        заказ не создается и выбрасывается StockShortageError со списком SKU;
+        при неизвестном товаре или неверном количестве - ValueError.
+        """
+        # Одинаковые товары в нескольких строках складываем в одну позицию
+        lines: Dict[int, int] = {}
+        for item in order_data.get('items', []):
+            product_id = int(item.get('product_id'))
+            quantity = int(item.get('quantity'))
+            if quantity <= 0:
+                raise ValueError(f"Неверное количество товара с ID {product_id}: {quantity}")
+            lines[product_id] = lines.get(product_id, 0) + quantity
+        
+        if not lines:
+            raise ValueError("Заказ не содержит товаров")
+        
+        requested = json.dumps([[product_id, quantity] for product_id, quantity in lines.items()])
+        order_number = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{secrets.token_hex(4).upper()}"
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            conn.execute("BEGIN TRANSACTION")
+            # Блокировка записи берется сразу: остатки, прочитанные ниже,
+            # не изменятся до коммита
+            conn.execute("BEGIN IMMEDIATE")
             
-            # Генерация номера заказа
-            from datetime import datetime
-            order_number = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{secrets.token_hex(2).upper()}"
+            # Цены и остатки всех товаров заказа одним запросом
+            products = {row['id']: row for row in cursor.execute('''
+                SELECT p.id, p.sku, p.unit_price, p.quantity
+                FROM json_each(?) AS j
+                JOIN products p ON p.id = json_extract(j.value, '$[0]')
+            ''', (requested,))}
+            
+            missing = [product_id for product_id in lines if product_id not in products]
+            if missing:
+                raise ValueError(f"Товары с ID {', '.join(map(str, missing))} не найдены")
+            
+            shortages = [
+                {'product_id': product_id, 'sku': products[product_id]['sku'],
+                 'requested': quantity, 'available': products[product_id]['quantity']}
+                for product_id, quantity in lines.items()
+                if products[product_id]['quantity'] < quantity
+            ]
+            if shortages:
+                raise StockShortageError(shortages)
+            
+            items = [
+                (product_id, quantity, products[product_id]['unit_price'],
+                 products[product_id]['unit_price'] * quantity)
+                for product_id, quantity in lines.items()
+            ]
+            total_amount = sum(item[3] for item in items)
             
             # Создаем заказ
             cursor.execute('''
                 INSERT INTO orders 
-                (order_number, client_id, employee_id, status, notes)
-                VALUES (?, ?, ?, ?, ?)
+                (order_number, client_id, employee_id, status, total_amount, notes)
+                VALUES (?, ?, ?, ?, ?, ?)
             ''', (
                 order_number,
                 order_data.get('client_id'),
                 employee_id,
                 'pending',
+                total_amount,
                 order_data.get('notes')
             ))
-            
             order_id = cursor.lastrowid
-            total_amount = 0
             
-            # Добавляем товары в заказ
-            for item in order_data.get('items', []):
-                product_id = item.get('product_id')
-                quantity = item.get('quantity')
-                
-                # Получаем цену товара
-                cursor.execute('SELECT unit_price, quantity FROM products WHERE id = ?', (product_id,))
-                product = cursor.fetchone()
-                
-                if not product:
-                    raise ValueError(f"Товар с ID {product_id} не найден")
-                
-                if product['quantity'] < quantity:
-                    raise ValueError(f"Недостаточно товара в наличии. Доступно: {product['quantity']}")
-                
-                unit_price = product['unit_price']
-                item_total = unit_price * quantity
-                total_amount += item_total
-                
-                # Добавляем позицию в заказ
-                cursor.execute('''
-                    INSERT INTO order_items 
-                    (order_id, product_id, quantity, unit_price, total_price)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (order_id, product_id, quantity, unit_price, item_total))
-                
-                # Обновляем количество товара
-                cursor.execute('''
-                    UPDATE products 
-                    SET quantity = quantity - ?, 
-                        last_updated = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (quantity, product_id))
+            cursor.executemany('''
+                INSERT INTO order_items 
+                (order_id, product_id, quantity, unit_price, total_price)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(order_id,) + item for item in items])
             
-            # Обновляем общую сумму заказа
+            # Списание остатков: строка обновляется, только если товара хватает
             cursor.execute('''
-                UPDATE orders 
-                SET total_amount = ?
-                WHERE id = ?
-            ''', (total_amount, order_id))
+                UPDATE products
+                SET quantity = products.quantity - d.quantity,
+                    last_updated = CURRENT_TIMESTAMP
+                FROM (SELECT json_extract(value, '$[0]') AS product_id,
+                             json_extract(value, '$[1]') AS quantity
+                      FROM json_each(?)) AS d
+                WHERE products.id = d.product_id AND products.quantity >= d.quantity
+            ''', (requested,))
+            if cursor.rowcount != len(lines):
+                stock = {row['id']: row['quantity'] for row in cursor.execute(
+                    "SELECT p.id, p.quantity FROM json_each(?) AS j JOIN products p ON p.id = json_extract(j.value, '$[0]')",
+                    (requested,)
+                )}
+                raise StockShortageError([
+                    {'product_id': product_id, 'sku': products[product_id]['sku'],
+                     'requested': quantity, 'available': stock.get(product_id, 0)}
+                    for product_id, quantity in lines.items()
+                    if stock.get(product_id, 0) < quantity
+                ])
             
             # Логируем действие
             self.log_audit(
@@ -454,11 +1434,12 @@ class Database:
             )
             
             conn.commit()
+            # Остатки товаров изменились - сбрасываем кэш страниц с ними
+            cache.invalidate('orders', 'products', *(f'product:{product_id}' for product_id in lines))
             return order_id
-        except Exception as e:
-            logger.error(f"Ошибка при создании заказа: {e}")
+        except Exception:
             conn.rollback()
-            return None
+            raise
         finally:
             conn.close()
     
@@ -488,6 +1469,7 @@ class Database:
                 )
                 
                 conn.commit()
+                cache.invalidate(f"employee:{employee_id}")
                 return True
             return False
         except Exception as e:
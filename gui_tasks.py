@@ -0,0 +1,193 @@
+# gui_tasks.py - Фоновое выполнение запросов к БД в настольном приложении
+#
+# Tk работает только в главном потоке, а запрос к большой таблице в нем
+# замораживает окно. TaskExecutor выполняет функции в пуле потоков
+# (у каждого потока свое соединение из пула Database) и передает результат
+# обработчику в главном потоке: потоки кладут результат в очередь, главный
+# поток забирает ее по таймеру root.after, пока есть незавершенные задачи.
+#
+# Задачи с одним ключом вытесняют друг друга: новая задача отменяет еще не
+# начатую предыдущую, а результат уже выполняющейся отбрасывается (например,
+# поиск по строке, которую пользователь продолжает набирать). С delay задача
+# стартует после паузы - ввод подряд порождает один запрос.
+#
+# ProgressIndicator - бегущая полоса, видимая, пока у вкладки есть задачи.
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ProgressIndicator:
+    """Индикатор выполнения: показывается при первой задаче, скрывается после последней"""
+    
+    def __init__(self, parent, **pack_options):
+        self.bar = ttk.Progressbar(parent, mode='indeterminate', length=100)
+        self.pack_options = pack_options or {'side': tk.RIGHT, 'padx': 5}
+        self.active = 0
+    
+    def begin(self):
+        self.active += 1
+        if self.active == 1 and self.bar.winfo_exists():
+            self.bar.pack(**self.pack_options)
+            self.bar.start(15)
+    
+    def end(self):
+        self.active = max(0, self.active - 1)
+        if self.active == 0 and self.bar.winfo_exists():
+            self.bar.stop()
+            self.bar.pack_forget()
+
+class Task:
+    """Задача пула: функция, обработчики результата и состояние"""
+    
+    def __init__(self, executor: 'TaskExecutor', key: str, func: Callable, args: tuple,
+                 on_done: Optional[Callable[[Any], None]], on_error: Callable[[Exception], None],
+                 indicator: Optional[ProgressIndicator]):
+        self.executor = executor
+        self.key = key
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.indicator = indicator
+        self.timer = None       # Отложенный запуск (root.after)
+        self.future = None
+        self.cancelled = False
+        self.finished = False
+    
+    def cancel(self):
+        """Отмена: результат задачи не будет передан обработчику"""
+        self.executor.cancel(self)
+
+class TaskExecutor:
+    """Пул потоков для запросов к БД с передачей результатов в главный поток Tk"""
+    
+    def __init__(self, root: tk.Misc, workers: int = None, poll_interval: int = None):
+        self.root = root
+        self.poll_interval = poll_interval or Config.GUI_POLL_INTERVAL
+        self._pool = ThreadPoolExecutor(max_workers=workers or Config.GUI_WORKERS,
+                                        thread_name_prefix='gui-db')
+        self._results = queue.Queue()
+        self._current: Dict[str, Task] = {}     # Ключ -> последняя задача
+        self._running: Set[Task] = set()         # Отданы в пул, результат еще не забран
+        self._poll_id = None
+        self._closed = False
+    
+    def submit(self, key: str, func: Callable, *args,
+               on_done: Callable[[Any], None] = None,
+               on_error: Callable[[Exception], None] = None,
+               indicator: ProgressIndicator = None, delay: int = 0) -> Task:
+        """Выполнение func(*args) в пуле; on_done(результат) вызывается в главном потоке.
+        
+        Предыдущая задача с тем же ключом отменяется; delay - задержка запуска, мс.
+        """
+        previous = self._current.get(key)
+        if previous is not None:
+            previous.cancel()
+        
+        task = Task(self, key, func, args, on_done, on_error or self.report_error, indicator)
+        self._current[key] = task
+        if indicator is not None:
+            indicator.begin()
+        if delay:
+            task.timer = self.root.after(delay, self._start, task)
+        else:
+            self._start(task)
+        return task
+    
+    def _start(self, task: Task):
+        task.timer = None
+        if task.cancelled or self._closed:
+            return
+        self._running.add(task)
+        task.future = self._pool.submit(self._run, task)
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+    
+    def _run(self, task: Task):
+        """Выполнение в потоке пула (без обращений к Tk)"""
+        if task.cancelled:
+            self._results.put((task, None, None))
+            return
+        try:
+            self._results.put((task, task.func(*task.args), None))
+        except Exception as e:
+            self._results.put((task, None, e))
+    
+    def _poll(self):
+        """Разбор готовых результатов в главном потоке"""
+        self._poll_id = None
+        while True:
+            try:
+                task, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._running.discard(task)
+            if task.cancelled:
+                continue
+            self._finish(task)
+            try:
+                if error is not None:
+                    task.on_error(error)
+                elif task.on_done is not None:
+                    task.on_done(result)
+            except Exception:
+                logger.exception(f"Ошибка обработки результата задачи {task.key}")
+        
+        if self._running and not self._closed:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+    
+    def _finish(self, task: Task):
+        if task.finished:
+            return
+        task.finished = True
+        if self._current.get(task.key) is task:
+            del self._current[task.key]
+        if task.indicator is not None:
+            task.indicator.end()
+    
+    def cancel(self, task: Task):
+        """Отмена задачи: до запуска - не выполняется, во время выполнения - результат отбрасывается"""
+        if task.finished:
+            return
+        task.cancelled = True
+        if task.timer is not None:
+            self.root.after_cancel(task.timer)
+            task.timer = None
+        if task.future is not None and task.future.cancel():
+            self._running.discard(task)
+        self._finish(task)
+    
+    def cancel_key(self, key: str):
+        """Отмена последней задачи с ключом (если она еще не завершена)"""
+        task = self._current.get(key)
+        if task is not None:
+            task.cancel()
+    
+    def cancel_all(self):
+        """Отмена всех задач (например, при закрытии вкладок)"""
+        for task in list(self._current.values()):
+            task.cancel()
+    
+    def report_error(self, error: Exception):
+        """Обработчик ошибок по умолчанию"""
+        logger.error(f"Ошибка фоновой задачи: {error}")
+        messagebox.showerror("Ошибка", f"Не удалось загрузить данные: {error}")
+    
+    def shutdown(self):
+        """Остановка пула: отмена ожидающих задач, ожидание выполняющихся"""
+        self.cancel_all()
+        self._closed = True
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except tk.TclError:
+                pass
+            self._poll_id = None
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,40 @@
+# gunicorn.conf.py - Настройки gunicorn для веб-приложения (см. wsgi.py)
+#
+# Запуск:             gunicorn -c gunicorn.conf.py wsgi:app
+# Плавный перезапуск: kill -HUP <pid главного процесса> - новые воркеры
+#                     стартуют, старые дообслуживают текущие запросы
+# Обновление кода:    kill -USR2 <pid> (новый главный процесс с новым кодом),
+#                     затем kill -TERM <pid старого главного процесса>
+import multiprocessing
+import os
+
+# До импорта config: Config.WEB_PROFILE читается при импорте, а gunicorn
+# загружает этот файл раньше wsgi.py
+os.environ.setdefault('WEB_PROFILE', 'production')
+
+from config import Config
+
+bind = Config.WEB_BIND
+# Процессы обходят GIL при отрисовке шаблонов; потоки внутри процесса
+# ждут SQLite и сеть, не занимая ядро
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count()
+worker_class = 'gthread'
+threads = Config.WEB_THREADS
+
+# Приложение, схема БД и шаблоны загружаются до fork (web_app.preload)
+preload_app = True
+
+# Перезапуск воркеров: ограничивает рост памяти процесса
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS_JITTER
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+def worker_exit(server, worker):
+    """Дописывание аудита и закрытие соединений воркера при остановке"""
+    from web_app import release_db
+    release_db()
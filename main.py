@@ -36,6 +36,11 @@ def main():
     try:
         db = Database(Config.DATABASE_PATH)
         print("✓ База данных инициализирована")
+        settings = db.get_effective_settings()
+        print(f"  Профиль БД: {settings['profile']} (journal_mode={settings['journal_mode']}, "
+              f"synchronous={settings['synchronous']}, busy_timeout={settings['busy_timeout']} мс, "
+              f"cache_size={settings['cache_size']}, mmap_size={settings['mmap_size']}, "
+              f"temp_store={settings['temp_store']})")
     except Exception as e:
         print(f"✗ Ошибка инициализации БД: {e}")
         sys.exit(1)
@@ -6,12 +6,19 @@ from datetime import datetime, timedelta
 import json
 import csv
 import os
-from database import Database
+from database import Database, StockShortageError, TimeRange
 from auth import AuthManager
 from config import Config
+from gui_tasks import TaskExecutor, ProgressIndicator
+from virtual_list import VirtualTreeview, list_fetch
 import sqlite3
 
 class TradingAppGUI:
+    # Максимум строк в результатах поиска клиентов (таблицы подгружаются при прокрутке)
+    PAGE_SIZE = 200
+    # Число вариантов в автодополнении клиента
+    COMBO_SIZE = 30
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title(Config.APP_NAME)
@@ -21,6 +28,8 @@ class TradingAppGUI:
         self.db = Database()
         self.auth = AuthManager(self.db, Config.SECRET_KEY)
         self.current_user = None
+        # Запросы к БД для таблиц и отчетов выполняются в фоне
+        self.tasks = TaskExecutor(self.root)
         
         self.setup_styles()
         self.show_login_screen()
@@ -39,6 +48,8 @@ class TradingAppGUI:
     
     def clear_window(self):
         """Очистка окна"""
+        # Результаты незавершенных запросов больше некуда выводить
+        self.tasks.cancel_all()
         for widget in self.root.winfo_children():
             widget.destroy()
     
@@ -164,6 +175,11 @@ class TradingAppGUI:
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
+        # Версия данных до загрузки вкладок: обновление применяет изменения после
+        # нее (изменения во время загрузки применятся повторно, но не потеряются).
+        # Два чтения MAX(id) по первичному ключу - без фоновой задачи
+        self.change_version = self.db.get_changes()['version']
+        
         # Создаем вкладки в зависимости от роли
         if self.auth.has_permission(self.current_user['role'], 'viewer'):
             self.create_clients_tab()
@@ -184,20 +200,30 @@ class TradingAppGUI:
         refresh_button.pack(pady=5)
     
     def refresh_all_tabs(self):
-        """Обновление всех вкладок"""
-        current_tab = self.notebook.index(self.notebook.select())
-        
-        if hasattr(self, 'clients_tree'):
-            self.load_clients()
-        if hasattr(self, 'products_tree'):
-            self.load_products()
-        if hasattr(self, 'orders_tree'):
-            self.load_orders()
-        if hasattr(self, 'audit_tree'):
-            self.load_audit_logs()
-        
-        # Возвращаемся на текущую вкладку
-        self.notebook.select(current_tab)
+        """Обновление всех вкладок (только изменившихся таблиц и строк)"""
+        self.sync_tables()
+    
+    def sync_tables(self):
+        """Запрос изменений данных после загруженной версии (change_log.py)"""
+        since = self.change_version
+        self.tasks.submit('changes', lambda: self.db.get_changes(since), on_done=self.apply_changes)
+    
+    def apply_changes(self, changes):
+        """Обновление таблиц вкладок по изменениям; неизменившиеся таблицы не перечитываются"""
+        self.change_version = changes['version']
+        views = {
+            'clients': getattr(self, 'clients_view', None),
+            'products': getattr(self, 'products_view', None),
+            'orders': getattr(self, 'orders_view', None),
+            'audit_log': getattr(self, 'audit_view', None),
+        }
+        for table, view in views.items():
+            if view is None:
+                continue
+            if changes['reset']:
+                view.refresh()
+            elif table in changes['tables']:
+                view.apply_changes(changes['tables'][table])
     
     def create_clients_tab(self):
         """Вкладка управления клиентами"""
@@ -213,6 +239,7 @@ class TradingAppGUI:
         ttk.Button(toolbar, text="Удалить", command=self.delete_client_dialog, style='Danger.TButton').pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Экспорт в CSV", command=self.export_clients_csv).pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Обновить", command=self.load_clients).pack(side=tk.LEFT, padx=2)
+        self.clients_progress = ProgressIndicator(toolbar, side=tk.LEFT, padx=5)
         
         # Поиск
         search_frame = ttk.Frame(toolbar)
@@ -223,43 +250,40 @@ class TradingAppGUI:
         self.client_search_entry.bind('<KeyRelease>', lambda e: self.search_clients())
         ttk.Button(search_frame, text="Очистить", command=self.clear_client_search).pack(side=tk.LEFT)
         
-        # Таблица клиентов
+        # Таблица клиентов (строки подгружаются при прокрутке, сортировка - щелчком по заголовку)
         columns = ("ID", "Код", "ФИО", "Телефон", "Email", "Адрес", "Дата регистрации")
-        self.clients_tree = ttk.Treeview(frame, columns=columns, show="headings", height=20)
+        self.clients_view = VirtualTreeview(
+            frame, self.tasks, 'clients', columns, self.client_row,
+            sorts={"ID": 'id', "Код": 'client_code', "ФИО": 'full_name',
+                   "Дата регистрации": 'registration_date'},
+            sort='id', descending=True, indicator=self.clients_progress)
+        self.clients_tree = self.clients_view.tree
         
         for col in columns:
-            self.clients_tree.heading(col, text=col)
             self.clients_tree.column(col, width=100, minwidth=50)
         
-        # Полоса прокрутки
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.clients_tree.yview)
-        self.clients_tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.clients_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.clients_view.pack(fill=tk.BOTH, expand=True)
         
         # Загружаем данные
         self.load_clients()
     
     def load_clients(self):
-        """Загрузка клиентов из БД"""
-        if not hasattr(self, 'clients_tree'):
+        """Загрузка клиентов из БД (по мере прокрутки)"""
+        if not hasattr(self, 'clients_view'):
             return
-            
-        for item in self.clients_tree.get_children():
-            self.clients_tree.delete(item)
-        
-        clients = self.db.get_clients()
-        for client in clients:
-            self.clients_tree.insert('', tk.END, values=(
-                client['id'],
-                client['client_code'],
-                client['full_name'],
-                client['phone'] or '',
-                client['email'] or '',
-                client['address'] or '',
-                client['registration_date']
-            ))
+        self.clients_view.reload(self.db.get_clients_page)
+    
+    def client_row(self, client):
+        """Значения строки таблицы клиентов"""
+        return (
+            client['id'],
+            client['client_code'],
+            client['full_name'],
+            client['phone'] or '',
+            client['email'] or '',
+            client['address'] or '',
+            client['registration_date']
+        )
     
     def add_client_dialog(self):
         """Диалог добавления клиента"""
@@ -324,7 +348,7 @@ class TradingAppGUI:
             client_id = self.db.create_client(client_data, self.current_user['id'])
             if client_id:
                 messagebox.showinfo("Успех", "Клиент успешно добавлен")
-                self.load_clients()
+                self.sync_tables()
                 dialog.destroy()
                 
                 # Обновляем список клиентов для заказов, если он существует
@@ -443,7 +467,7 @@ class TradingAppGUI:
                 )
                 
                 messagebox.showinfo("Успех", "Данные клиента обновлены")
-                self.load_clients()
+                self.sync_tables()
                 dialog.destroy()
             except Exception as e:
                 conn.rollback()
@@ -504,7 +528,7 @@ class TradingAppGUI:
                 )
                 
                 messagebox.showinfo("Успех", "Клиент удален")
-                self.load_clients()
+                self.sync_tables()
             except Exception as e:
                 conn.rollback()
                 messagebox.showerror("Ошибка", f"Не удалось удалить клиента: {e}")
@@ -523,7 +547,7 @@ class TradingAppGUI:
             return
         
         try:
-            clients = self.db.get_clients(limit=10000)
+            clients = list(self.db.iter_pages(self.db.get_clients_page, limit=500))
             
             with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
                 fieldnames = ['ID', 'Код', 'ФИО', 'Телефон', 'Email', 'Адрес', 'Дата регистрации', 'Согласие на обработку']
@@ -555,33 +579,16 @@ class TradingAppGUI:
             messagebox.showerror("Ошибка", f"Не удалось экспортировать данные: {e}")
     
     def search_clients(self):
-        """Поиск клиентов"""
-        search_term = self.client_search_entry.get().strip().lower()
+        """Поиск клиентов по коду, телефону, email и ФИО"""
+        search_term = self.client_search_entry.get().strip()
         if not search_term:
             self.load_clients()
             return
         
-        for item in self.clients_tree.get_children():
-            self.clients_tree.delete(item)
-        
-        clients = self.db.get_clients(limit=1000)
-        for client in clients:
-            # Проверяем совпадение по разным полям
-            if (search_term in client['full_name'].lower() or
-                search_term in (client['phone'] or '').lower() or
-                search_term in (client['email'] or '').lower() or
-                search_term in (client['client_code'] or '').lower() or
-                search_term in (client['address'] or '').lower()):
-                
-                self.clients_tree.insert('', tk.END, values=(
-                    client['id'],
-                    client['client_code'],
-                    client['full_name'],
-                    client['phone'] or '',
-                    client['email'] or '',
-                    client['address'] or '',
-                    client['registration_date']
-                ))
+        # Результаты поиска (не больше PAGE_SIZE) сортируются и листаются в памяти.
+        # Запрос уходит после паузы в наборе; незавершенный поиск по старой строке отменяется
+        self.clients_view.reload(list_fetch(lambda: self.db.search_clients(search_term, limit=self.PAGE_SIZE)),
+                                 delay=Config.GUI_SEARCH_DELAY)
     
     def clear_client_search(self):
         """Очистка поиска клиентов"""
@@ -601,6 +608,7 @@ class TradingAppGUI:
         ttk.Button(toolbar, text="Редактировать", command=self.edit_product_dialog).pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Удалить", command=self.delete_product_dialog, style='Danger.TButton').pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Обновить", command=self.load_products).pack(side=tk.LEFT, padx=2)
+        self.products_progress = ProgressIndicator(toolbar, side=tk.LEFT, padx=5)
         
         # Фильтры
         filter_frame = ttk.Frame(toolbar)
@@ -616,20 +624,23 @@ class TradingAppGUI:
         self.product_search_entry.pack(side=tk.LEFT, padx=5)
         self.product_search_entry.bind('<KeyRelease>', lambda e: self.search_products())
         
-        # Таблица товаров
+        # Таблица товаров (строки подгружаются при прокрутке, сортировка - щелчком по заголовку)
         columns = ("ID", "Артикул", "Название", "Категория", "Цена", "Кол-во", "Мин", "Макс", "Поставщик")
-        self.products_tree = ttk.Treeview(frame, columns=columns, show="headings", height=20)
+        self.products_view = VirtualTreeview(
+            frame, self.tasks, 'products', columns, self.product_row, row_tags=self.product_tags,
+            sorts={"ID": 'id', "Артикул": 'sku', "Название": 'name', "Цена": 'unit_price',
+                   "Кол-во": 'quantity'},
+            sort='name', indicator=self.products_progress)
+        self.products_tree = self.products_view.tree
+        self.products_sort_before_search = None
         
         for col in columns:
-            self.products_tree.heading(col, text=col)
             self.products_tree.column(col, width=80, minwidth=50)
         
-        # Полоса прокрутки
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.products_tree.yview)
-        self.products_tree.configure(yscrollcommand=scrollbar.set)
+        # Настройка тегов для подсветки
+        self.products_tree.tag_configure('low_stock', background='#ffcccc')
         
-        self.products_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.products_view.pack(fill=tk.BOTH, expand=True)
         
         # Загружаем категории и данные
         self.load_product_categories()
@@ -637,55 +648,65 @@ class TradingAppGUI:
     
     def load_product_categories(self):
         """Загрузка списка категорий товаров"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM products WHERE category IS NOT NULL ORDER BY category")
-        categories = ['Все'] + [row['category'] for row in cursor.fetchall()]
-        conn.close()
+        def query():
+            conn = self.db.get_connection()
+            try:
+                rows = conn.execute(
+                    "SELECT DISTINCT category FROM products WHERE category IS NOT NULL ORDER BY category").fetchall()
+            finally:
+                conn.close()
+            return ['Все'] + [row['category'] for row in rows]
+        
+        def show(categories):
+            self.category_filter['values'] = categories
         
-        self.category_filter['values'] = categories
-        self.category_filter.set('Все')
+        # Выбранная категория сохраняется при обновлении списка
+        if not self.category_filter.get():
+            self.category_filter.set('Все')
+        self.tasks.submit('product_categories', query, on_done=show, indicator=self.products_progress)
     
-    def load_products(self):
-        """Загрузка товаров из БД"""
-        if not hasattr(self, 'products_tree'):
+    def load_products(self, delay=0):
+        """Загрузка товаров из БД (по мере прокрутки)"""
+        if not hasattr(self, 'products_view'):
             return
-            
-        for item in self.products_tree.get_children():
-            self.products_tree.delete(item)
         
         category = None if self.category_filter.get() == 'Все' else self.category_filter.get()
-        
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        if category:
-            cursor.execute("SELECT * FROM products WHERE is_active = 1 AND category = ? ORDER BY name", (category,))
-        else:
-            cursor.execute("SELECT * FROM products WHERE is_active = 1 ORDER BY name")
-        
-        products = cursor.fetchall()
-        conn.close()
-        
-        for product in products:
-            self.products_tree.insert('', tk.END, values=(
-                product['id'],
-                product['sku'],
-                product['name'],
-                product['category'] or '',
-                f"{product['unit_price']:.2f}",
-                product['quantity'],
-                product['min_quantity'],
-                product['max_quantity'],
-                product['supplier'] or ''
-            ))
-            
-            # Подсветка товаров с низким запасом
-            if product['quantity'] < product['min_quantity']:
-                self.products_tree.item(self.products_tree.get_children()[-1], tags=('low_stock',))
-        
-        # Настройка тегов для подсветки
-        self.products_tree.tag_configure('low_stock', background='#ffcccc')
+        search_term = self.product_search_entry.get().strip() if hasattr(self, 'product_search_entry') else ''
+        
+        # Поиск начинается с порядка по релевантности (щелчок по заголовку
+        # сортирует найденное), после поиска возвращается прежняя сортировка
+        view = self.products_view
+        if search_term and self.products_sort_before_search is None:
+            self.products_sort_before_search = (view.sort, view.descending)
+            view.set_sort(None)
+        elif not search_term and self.products_sort_before_search is not None:
+            view.set_sort(*self.products_sort_before_search)
+            self.products_sort_before_search = None
+        
+        def fetch(**page_args):
+            if search_term:
+                return self.db.search_products(search_term, category=category, **page_args)
+            return self.db.get_products_page(category=category, **page_args)
+        
+        self.products_view.reload(fetch, delay=delay)
+    
+    def product_row(self, product):
+        """Значения строки таблицы товаров"""
+        return (
+            product['id'],
+            product['sku'],
+            product['name'],
+            product['category'] or '',
+            f"{product['unit_price']:.2f}",
+            product['quantity'],
+            product['min_quantity'],
+            product['max_quantity'],
+            product['supplier'] or ''
+        )
+    
+    def product_tags(self, product):
+        """Подсветка товаров с низким запасом"""
+        return ('low_stock',) if product['quantity'] < product['min_quantity'] else ()
     
     def add_product_dialog(self):
         """Диалог добавления товара"""
@@ -762,7 +783,7 @@ class TradingAppGUI:
                     raise ValueError("Цена не может быть отрицательной")
                 if product_data['quantity'] < 0:
                     raise ValueError("Количество не может быть отрицательным")
-                
+            
             except ValueError as e:
                 messagebox.showerror("Ошибка", f"Неверный формат числа: {e}")
                 return
@@ -803,7 +824,7 @@ class TradingAppGUI:
                 
                 messagebox.showinfo("Успех", "Товар успешно добавлен")
                 self.load_product_categories()
-                self.load_products()
+                self.sync_tables()
                 dialog.destroy()
                 
                 # Обновляем список товаров для заказов
@@ -914,7 +935,7 @@ class TradingAppGUI:
                     raise ValueError("Цена не может быть отрицательной")
                 if product_data['quantity'] < 0:
                     raise ValueError("Количество не может быть отрицательным")
-                
+            
             except ValueError as e:
                 messagebox.showerror("Ошибка", f"Неверный формат числа: {e}")
                 return
@@ -956,7 +977,7 @@ class TradingAppGUI:
                 
                 messagebox.showinfo("Успех", "Данные товара обновлены")
                 self.load_product_categories()
-                self.load_products()
+                self.sync_tables()
                 dialog.destroy()
             except Exception as e:
                 conn.rollback()
@@ -980,11 +1001,7 @@ class TradingAppGUI:
         product_name = item['values'][2]
         
         # Проверяем, есть ли товар в заказах
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM order_items WHERE product_id = ?", (product_id,))
-        order_count = cursor.fetchone()['count']
-        conn.close()
+        order_count = self.db.count_product_orders(product_id)
         
         if order_count > 0:
             messagebox.showerror("Ошибка", 
@@ -1018,7 +1035,7 @@ class TradingAppGUI:
                 
                 messagebox.showinfo("Успех", "Товар удален")
                 self.load_product_categories()
-                self.load_products()
+                self.sync_tables()
             except Exception as e:
                 conn.rollback()
                 messagebox.showerror("Ошибка", f"Не удалось удалить товар: {e}")
@@ -1026,46 +1043,8 @@ class TradingAppGUI:
                 conn.close()
     
     def search_products(self):
-        """Поиск товаров"""
-        search_term = self.product_search_entry.get().strip().lower()
-        if not search_term:
-            self.load_products()
-            return
-        
-        for item in self.products_tree.get_children():
-            self.products_tree.delete(item)
-        
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        category = None if self.category_filter.get() == 'Все' else self.category_filter.get()
-        
-        if category:
-            cursor.execute("SELECT * FROM products WHERE is_active = 1 AND category = ? ORDER BY name", (category,))
-        else:
-            cursor.execute("SELECT * FROM products WHERE is_active = 1 ORDER BY name")
-        
-        products = cursor.fetchall()
-        conn.close()
-        
-        for product in products:
-            if (search_term in product['name'].lower() or
-                search_term in (product['sku'] or '').lower() or
-                search_term in (product['description'] or '').lower() or
-                search_term in (product['supplier'] or '').lower() or
-                search_term in (product['category'] or '').lower()):
-                
-                self.products_tree.insert('', tk.END, values=(
-                    product['id'],
-                    product['sku'],
-                    product['name'],
-                    product['category'] or '',
-                    f"{product['unit_price']:.2f}",
-                    product['quantity'],
-                    product['min_quantity'],
-                    product['max_quantity'],
-                    product['supplier'] or ''
-                ))
+        """Поиск товаров (полнотекстовый, по префиксам слов)"""
+        self.load_products(delay=Config.GUI_SEARCH_DELAY)
     
     def create_orders_tab(self):
         """Вкладка создания заказов"""
@@ -1085,7 +1064,10 @@ class TradingAppGUI:
         paned_window.add(right_frame, weight=1)
         
         # Левая панель: форма создания заказа
-        ttk.Label(left_frame, text="Новый заказ", style='Heading.TLabel').pack(anchor=tk.W, padx=5, pady=5)
+        header_frame = ttk.Frame(left_frame)
+        header_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(header_frame, text="Новый заказ", style='Heading.TLabel').pack(side=tk.LEFT)
+        self.order_form_progress = ProgressIndicator(header_frame)
         
         # Выбор клиента
         client_frame = ttk.LabelFrame(left_frame, text="Клиент", padding=10)
@@ -1176,6 +1158,7 @@ class TradingAppGUI:
         orders_toolbar.pack(fill=tk.X, padx=5, pady=5)
         
         ttk.Button(orders_toolbar, text="Обновить", command=self.load_orders).pack(side=tk.LEFT, padx=2)
+        self.orders_progress = ProgressIndicator(orders_toolbar, side=tk.LEFT, padx=5)
         ttk.Button(orders_toolbar, text="Просмотр", command=self.view_order_details).pack(side=tk.LEFT, padx=2)
         ttk.Button(orders_toolbar, text="Отменить", command=self.cancel_order, style='Warning.TButton').pack(side=tk.LEFT, padx=2)
         ttk.Button(orders_toolbar, text="Завершить", command=self.complete_order, style='Success.TButton').pack(side=tk.LEFT, padx=2)
@@ -1192,19 +1175,24 @@ class TradingAppGUI:
         self.order_status_filter.set('Все')
         self.order_status_filter.bind('<<ComboboxSelected>>', lambda e: self.load_orders())
         
-        # Таблица заказов
+        # Таблица заказов (строки подгружаются при прокрутке, сортировка - щелчком по заголовку)
         columns = ("ID", "Номер", "Клиент", "Сумма", "Статус", "Дата")
-        self.orders_tree = ttk.Treeview(right_frame, columns=columns, show="headings", height=20)
+        self.orders_view = VirtualTreeview(
+            right_frame, self.tasks, 'orders', columns, self.order_row, row_tags=self.order_tags,
+            sorts={"ID": 'id', "Номер": 'order_number', "Сумма": 'total_amount',
+                   "Статус": 'status', "Дата": 'created_at'},
+            sort='created_at', descending=True, indicator=self.orders_progress)
+        self.orders_tree = self.orders_view.tree
         
         for col in columns:
-            self.orders_tree.heading(col, text=col)
             self.orders_tree.column(col, width=100, minwidth=50)
         
-        orders_scrollbar = ttk.Scrollbar(right_frame, orient=tk.VERTICAL, command=self.orders_tree.yview)
-        self.orders_tree.configure(yscrollcommand=orders_scrollbar.set)
+        # Настройка цветов
+        self.orders_tree.tag_configure('completed', background='#d4edda')
+        self.orders_tree.tag_configure('cancelled', background='#f8d7da')
+        self.orders_tree.tag_configure('processing', background='#fff3cd')
         
-        self.orders_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        orders_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.orders_view.pack(fill=tk.BOTH, expand=True)
         
         # Загружаем заказы
         self.load_orders()
@@ -1213,45 +1201,67 @@ class TradingAppGUI:
         """Загрузка клиентов для автодополнения"""
         if not hasattr(self, 'client_search_combo'):
             return
-            
-        clients = self.db.get_clients(limit=1000)
-        # Создаем список для отображения: ФИО + телефон (если есть)
-        client_display = []
-        self.clients_for_order = []  # Сохраняем полные данные
         
-        for client in clients:
-            display_text = f"{client['full_name']}"
-            if client['phone']:
-                display_text += f" ({client['phone']})"
-            client_display.append(display_text)
-            self.clients_for_order.append(client)
+        def fill(clients):
+            # Создаем список для отображения: ФИО + телефон (если есть)
+            self.clients_for_order = clients  # Сохраняем полные данные
+            self.client_search_combo['values'] = [self.client_display_text(client) for client in clients]
+        
+        # До ввода показываем последних добавленных клиентов
+        self.clients_for_order = []
+        recent = []
+        
+        def fill_recent(clients):
+            recent[:] = clients
+            if not self.client_search_combo.get().strip():
+                fill(clients)
         
-        self.client_search_combo['values'] = client_display
+        self.tasks.submit('order_clients_recent', lambda: self.db.get_clients_page(limit=self.COMBO_SIZE)['items'],
+                          on_done=fill_recent, indicator=self.order_form_progress)
         
-        # Настраиваем автодополнение
+        # Автодополнение: поиск по индексам после паузы в наборе
         def autocomplete(event):
-            typed = self.client_search_combo.get().lower()
+            if event.keysym in ('Return', 'Up', 'Down', 'Escape'):
+                return
+            typed = self.client_search_combo.get().strip()
             if not typed:
-                self.client_search_combo['values'] = client_display
+                self.tasks.cancel_key('order_clients')
+                fill(recent)
                 return
             
-            # Фильтруем клиентов по введенному тексту
-            matching = [name for name in client_display if typed in name.lower()]
-            self.client_search_combo['values'] = matching if matching else client_display
+            self.tasks.submit('order_clients', lambda: self.db.search_clients(typed, limit=self.COMBO_SIZE),
+                              on_done=fill, indicator=self.order_form_progress, delay=Config.GUI_SEARCH_DELAY)
         
         self.client_search_combo.bind('<KeyRelease>', autocomplete)
     
+    @staticmethod
+    def client_display_text(client):
+        """Строка клиента в выпадающем списке"""
+        display_text = f"{client['full_name']}"
+        if client['phone']:
+            display_text += f" ({client['phone']})"
+        return display_text
+    
     def load_products_for_combo(self):
         """Загрузка товаров для выпадающего списка"""
         if not hasattr(self, 'product_combo'):
             return
-            
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, sku, name, unit_price, quantity FROM products WHERE is_active = 1 AND quantity > 0 ORDER BY name")
-        products = cursor.fetchall()
-        conn.close()
         
+        def query():
+            conn = self.db.get_connection()
+            try:
+                return conn.execute("SELECT id, sku, name, unit_price, quantity FROM products "
+                                    "WHERE is_active = 1 AND quantity > 0 ORDER BY name").fetchall()
+            finally:
+                conn.close()
+        
+        if not hasattr(self, 'products_list'):
+            self.products_list = []
+        self.tasks.submit('order_products', query, on_done=self.fill_products_combo,
+                          indicator=self.order_form_progress)
+    
+    def fill_products_combo(self, products):
+        """Заполнение выпадающего списка товаров"""
         self.products_list = []
         product_names = []
         for product in products:
@@ -1279,11 +1289,7 @@ class TradingAppGUI:
         # Ищем клиента в списке
         selected_client = None
         for client in self.clients_for_order:
-            display_text = f"{client['full_name']}"
-            if client['phone']:
-                display_text += f" ({client['phone']})"
-            
-            if selected_text == display_text:
+            if selected_text == self.client_display_text(client):
                 selected_client = client
                 break
         
@@ -1409,74 +1415,48 @@ class TradingAppGUI:
             'notes': self.order_notes_text.get("1.0", tk.END).strip()
         }
         
-        order_id = self.db.create_order(order_data, self.current_user['id'])
-        if order_id:
-            messagebox.showinfo("Успех", f"Заказ №{order_id} успешно создан")
-            self.clear_order_form()
-            self.load_orders()
+        try:
+            order_id = self.db.create_order_checked(order_data, self.current_user['id'])
+        except StockShortageError as e:
+            details = "\n".join(
+                f"{s['sku']}: нужно {s['requested']}, в наличии {s['available']}" for s in e.shortages
+            )
+            messagebox.showerror("Недостаточно товара", f"Заказ не создан. Не хватает:\n{details}")
             self.load_products_for_combo()  # Обновляем остатки товаров
-        else:
-            messagebox.showerror("Ошибка", "Не удалось создать заказ")
+            return
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось создать заказ: {e}")
+            return
+        
+        messagebox.showinfo("Успех", f"Заказ №{order_id} успешно создан")
+        self.clear_order_form()
+        self.sync_tables()
+        self.load_products_for_combo()  # Обновляем остатки товаров
     
     def load_orders(self):
-        """Загрузка заказов из БД"""
-        if not hasattr(self, 'orders_tree'):
+        """Загрузка заказов (по мере прокрутки)"""
+        if not hasattr(self, 'orders_view'):
             return
-            
-        for item in self.orders_tree.get_children():
-            self.orders_tree.delete(item)
         
         status_filter = None if self.order_status_filter.get() == 'Все' else self.order_status_filter.get()
-        
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        if status_filter:
-            cursor.execute('''
-                SELECT o.*, c.full_name as client_name 
-                FROM orders o
-                LEFT JOIN clients c ON o.client_id = c.id
-                WHERE o.status = ?
-                ORDER BY o.created_at DESC
-                LIMIT 100
-            ''', (status_filter,))
-        else:
-            cursor.execute('''
-                SELECT o.*, c.full_name as client_name 
-                FROM orders o
-                LEFT JOIN clients c ON o.client_id = c.id
-                ORDER BY o.created_at DESC
-                LIMIT 100
-            ''')
-        
-        orders = cursor.fetchall()
-        conn.close()
-        
-        for order in orders:
-            client_name = order['client_name'] or 'Без клиента'
-            
-            # Цвет в зависимости от статуса
-            tags = ()
-            if order['status'] == 'completed':
-                tags = ('completed',)
-            elif order['status'] == 'cancelled':
-                tags = ('cancelled',)
-            elif order['status'] == 'processing':
-                tags = ('processing',)
-            
-            self.orders_tree.insert('', tk.END, values=(
-                order['id'],
-                order['order_number'],
-                client_name,
-                f"{order['total_amount']:.2f}",
-                order['status'],
-                order['created_at']
-            ), tags=tags)
-        
-        # Настройка цветов
-        self.orders_tree.tag_configure('completed', background='#d4edda')
-        self.orders_tree.tag_configure('cancelled', background='#f8d7da')
-        self.orders_tree.tag_configure('processing', background='#fff3cd')
+        self.orders_view.reload(lambda **page_args: self.db.get_orders_page(status=status_filter, **page_args))
+    
+    def order_row(self, order):
+        """Значения строки таблицы заказов"""
+        return (
+            order['id'],
+            order['order_number'],
+            order['client_name'] or 'Без клиента',
+            f"{order['total_amount']:.2f}",
+            order['status'],
+            order['created_at']
+        )
+    
+    def order_tags(self, order):
+        """Цвет строки в зависимости от статуса"""
+        if order['status'] in ('completed', 'cancelled', 'processing'):
+            return (order['status'],)
+        return ()
     
     def view_order_details(self):
         """Просмотр деталей заказа"""
@@ -1504,17 +1484,11 @@ class TradingAppGUI:
         
         order = cursor.fetchone()
         
-        # Товары в заказе
-        cursor.execute('''
-            SELECT oi.*, p.name, p.sku
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id = ?
-        ''', (order_id,))
-        
-        items = cursor.fetchall()
         conn.close()
         
+        # Товары в заказе
+        items = self.db.get_order_items(order_id)
+        
         # Создаем диалоговое окно
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Детали заказа №{order['order_number']}")
@@ -1629,9 +1603,9 @@ Email: {order['email'] or 'Не указан'}
             if new_status == 'cancelled' and order['status'] != 'cancelled':
                 self.return_order_items_to_stock(order_id)
             
-            # Обновляем список заказов
-            self.load_orders()
-            
+            # Обновляем список заказов (и остатки товаров при отмене)
+            self.sync_tables()
+        
         except Exception as e:
             conn.rollback()
             messagebox.showerror("Ошибка", f"Не удалось обновить статус: {e}")
@@ -1645,8 +1619,7 @@ Email: {order['email'] or 'Не указан'}
         
         try:
             # Получаем товары из заказа
-            cursor.execute("SELECT product_id, quantity FROM order_items WHERE order_id = ?", (order_id,))
-            items = cursor.fetchall()
+            items = self.db.get_order_item_quantities(order_id)
             
             # Возвращаем каждый товар на склад
             for item in items:
@@ -1658,7 +1631,7 @@ Email: {order['email'] or 'Не указан'}
                 ''', (item['quantity'], item['product_id']))
             
             conn.commit()
-            
+        
         except Exception as e:
             conn.rollback()
             print(f"Ошибка при возврате товаров: {e}")
@@ -1720,6 +1693,7 @@ Email: {order['email'] or 'Не указан'}
         ttk.Button(toolbar, text="Продажи за месяц", command=self.generate_monthly_sales_report).pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Товарный отчет", command=self.generate_inventory_report).pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Клиентский отчет", command=self.generate_client_report).pack(side=tk.LEFT, padx=2)
+        self.reports_progress = ProgressIndicator(toolbar, side=tk.LEFT, padx=5)
         
         # Область отчета
         report_frame = ttk.LabelFrame(frame, text="Отчет", padding=10)
@@ -1735,41 +1709,31 @@ Email: {order['email'] or 'Не указан'}
         self.stats_label = ttk.Label(stats_frame, text="Выберите отчет для генерации", font=('Arial', 10))
         self.stats_label.pack()
     
-    def generate_today_sales_report(self):
-        """Генерация отчета по продажам за сегодня"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as order_count,
-                SUM(total_amount) as total_sales,
-                AVG(total_amount) as avg_order
-            FROM orders 
-            WHERE DATE(created_at) = DATE('now') 
-                AND status = 'completed'
-        ''')
+    def show_report(self, build):
+        """Построение отчета в фоне; новый отчет отменяет еще не готовый"""
+        def show(report):
+            self.report_text.delete("1.0", tk.END)
+            self.report_text.insert("1.0", report)
+            
+            self.stats_label.config(text=f"Отчет сгенерирован: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        stats = cursor.fetchone()
+        def failed(error):
+            self.stats_label.config(text="Отчет не сформирован")
+            self.tasks.report_error(error)
         
-        cursor.execute('''
-            SELECT 
-                o.order_number,
-                c.full_name as client_name,
-                o.total_amount,
-                o.created_at,
-                COUNT(oi.id) as item_count
-            FROM orders o
-            LEFT JOIN clients c ON o.client_id = c.id
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            WHERE DATE(o.created_at) = DATE('now') 
-                AND o.status = 'completed'
-            GROUP BY o.id
-            ORDER BY o.created_at DESC
-        ''')
+        self.stats_label.config(text="Отчет формируется...")
+        self.tasks.submit('report', build, on_done=show, on_error=failed, indicator=self.reports_progress)
+    
+    def generate_today_sales_report(self):
+        """Генерация отчета по продажам за сегодня"""
+        self.show_report(self.build_today_sales_report)
+    
+    def build_today_sales_report(self):
+        """Текст отчета (выполняется в фоновом потоке)"""
+        # Итоги дня - из сводной таблицы
+        stats = self.db.get_today_sales()
         
-        orders = cursor.fetchall()
-        conn.close()
+        orders = self.db.get_completed_orders(TimeRange.today())
         
         report = "=" * 60 + "\n"
         report += "ОТЧЕТ О ПРОДАЖАХ ЗА СЕГОДНЯ\n"
@@ -1790,57 +1754,24 @@ Email: {order['email'] or 'Не указан'}
             report += f"Время: {order['created_at']}\n"
             report += "-" * 40 + "\n"
         
-        self.report_text.delete("1.0", tk.END)
-        self.report_text.insert("1.0", report)
-        
-        self.stats_label.config(text=f"Отчет сгенерирован: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
         # Логируем генерацию отчета
         self.db.log_audit(
             self.current_user['id'],
             'GENERATE_TODAY_SALES_REPORT',
             new_values={'order_count': stats['order_count'] or 0, 'total_sales': stats['total_sales'] or 0}
         )
+        return report
     
     def generate_monthly_sales_report(self):
         """Генерация отчета по продажам за месяц"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                strftime('%Y-%m', created_at) as month,
-                COUNT(*) as order_count,
-                SUM(total_amount) as total_sales,
-                AVG(total_amount) as avg_order
-            FROM orders 
-            WHERE status = 'completed'
-                AND created_at >= date('now', '-6 months')
-            GROUP BY strftime('%Y-%m', created_at)
-            ORDER BY month DESC
-        ''')
-        
-        monthly_stats = cursor.fetchall()
-        
-        cursor.execute('''
-            SELECT 
-                p.name,
-                p.sku,
-                p.category,
-                SUM(oi.quantity) as total_sold,
-                SUM(oi.total_price) as total_revenue
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.status = 'completed'
-                AND o.created_at >= date('now', '-30 days')
-            GROUP BY p.id
-            ORDER BY total_revenue DESC
-            LIMIT 10
-        ''')
-        
-        top_products = cursor.fetchall()
-        conn.close()
+        self.show_report(self.build_monthly_sales_report)
+    
+    def build_monthly_sales_report(self):
+        """Текст отчета (выполняется в фоновом потоке)"""
+        # Все цифры - из сводных таблиц продаж
+        sales = self.db.get_sales_summary(months=6, top_days=30, top_limit=10)
+        monthly_stats = sales['monthly']
+        top_products = sales['top_products']
         
         report = "=" * 60 + "\n"
         report += "ОТЧЕТ О ПРОДАЖАХ ЗА ПОСЛЕДНИЕ 6 МЕСЯЦЕВ\n"
@@ -1878,10 +1809,12 @@ Email: {order['email'] or 'Не указан'}
             report += f"  Выручка: {product['total_revenue']:.2f} руб.\n"
             report += "-" * 40 + "\n"
         
-        self.report_text.delete("1.0", tk.END)
-        self.report_text.insert("1.0", report)
+        report += "\nПРОДАЖИ СОТРУДНИКОВ ЗА ПОСЛЕДНИЙ МЕСЯЦ:\n"
+        report += "-" * 60 + "\n"
         
-        self.stats_label.config(text=f"Отчет сгенерирован: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        for employee in sales['employees']:
+            report += f"{employee['full_name']} ({employee['username']}): "
+            report += f"заказов {employee['order_count']}, продажи {employee['total_sales']:.2f} руб.\n"
         
         # Логируем генерацию отчета
         self.db.log_audit(
@@ -1889,9 +1822,14 @@ Email: {order['email'] or 'Не указан'}
             'GENERATE_MONTHLY_SALES_REPORT',
             new_values={'total_orders': total_orders, 'total_sales': total_sales}
         )
+        return report
     
     def generate_inventory_report(self):
         """Генерация товарного отчета"""
+        self.show_report(self.build_inventory_report)
+    
+    def build_inventory_report(self):
+        """Текст отчета (выполняется в фоновом потоке)"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -1982,72 +1920,24 @@ Email: {order['email'] or 'Не указан'}
             report += f"  Стоимость запаса: {product['stock_value']:.2f} руб.\n"
             report += "-" * 40 + "\n"
         
-        self.report_text.delete("1.0", tk.END)
-        self.report_text.insert("1.0", report)
-        
-        self.stats_label.config(text=f"Отчет сгенерирован: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
         # Логируем генерацию отчета
         self.db.log_audit(
             self.current_user['id'],
             'GENERATE_INVENTORY_REPORT',
             new_values={'total_products': stats['total_products'] or 0, 'total_value': stats['total_value'] or 0}
         )
+        return report
     
     def generate_client_report(self):
         """Генерация клиентского отчета"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        # Статистика по клиентам
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_clients,
-                COUNT(CASE WHEN personal_data_consent = 1 THEN 1 END) as consented_clients,
-                COUNT(CASE WHEN DATE(registration_date) = DATE('now') THEN 1 END) as new_today
-            FROM clients 
-            WHERE is_active = 1
-        ''')
-        
-        stats = cursor.fetchone()
-        
-        # Самые активные клиенты
-        cursor.execute('''
-            SELECT 
-                c.full_name,
-                c.phone,
-                c.email,
-                COUNT(o.id) as order_count,
-                SUM(o.total_amount) as total_spent,
-                MAX(o.created_at) as last_order_date
-            FROM clients c
-            LEFT JOIN orders o ON c.id = o.client_id
-            WHERE c.is_active = 1
-                AND o.status = 'completed'
-            GROUP BY c.id
-            HAVING order_count > 0
-            ORDER BY total_spent DESC
-            LIMIT 10
-        ''')
-        
-        top_clients = cursor.fetchall()
-        
-        # Новые клиенты за месяц
-        cursor.execute('''
-            SELECT 
-                full_name,
-                phone,
-                email,
-                registration_date
-            FROM clients 
-            WHERE is_active = 1
-                AND registration_date >= date('now', '-30 days')
-            ORDER BY registration_date DESC
-            LIMIT 10
-        ''')
-        
-        new_clients = cursor.fetchall()
-        conn.close()
+        self.show_report(self.build_client_report)
+    
+    def build_client_report(self):
+        """Текст отчета (выполняется в фоновом потоке)"""
+        client_report = self.db.get_client_report(new_days=30, top_limit=10)
+        stats = client_report['stats']
+        top_clients = client_report['top_clients']
+        new_clients = client_report['new_clients']
         
         report = "=" * 60 + "\n"
         report += "КЛИЕНТСКИЙ ОТЧЕТ\n"
@@ -2087,17 +1977,13 @@ Email: {order['email'] or 'Не указан'}
         else:
             report += "Нет новых клиентов за последний месяц\n"
         
-        self.report_text.delete("1.0", tk.END)
-        self.report_text.insert("1.0", report)
-        
-        self.stats_label.config(text=f"Отчет сгенерирован: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
         # Логируем генерацию отчета
         self.db.log_audit(
             self.current_user['id'],
             'GENERATE_CLIENT_REPORT',
             new_values={'total_clients': stats['total_clients'] or 0}
         )
+        return report
     
     def create_admin_tab(self):
         """Вкладка администрирования"""
@@ -2113,6 +1999,7 @@ Email: {order['email'] or 'Не указан'}
         ttk.Button(toolbar, text="Блокировать", command=self.toggle_user_status, style='Warning.TButton').pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Сбросить пароль", command=self.reset_user_password).pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Обновить", command=self.load_users).pack(side=tk.LEFT, padx=2)
+        self.users_progress = ProgressIndicator(toolbar, side=tk.LEFT, padx=5)
         
         # Таблица пользователей
         columns = ("ID", "Логин", "ФИО", "Должность", "Роль", "Активен", "Последний вход")
@@ -2135,16 +2022,19 @@ Email: {order['email'] or 'Не указан'}
         """Загрузка пользователей из БД"""
         if not hasattr(self, 'users_tree'):
             return
-            
-        for item in self.users_tree.get_children():
-            self.users_tree.delete(item)
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM employees ORDER BY role, username")
-        users = cursor.fetchall()
-        conn.close()
+        def query():
+            conn = self.db.get_connection()
+            try:
+                return conn.execute("SELECT * FROM employees ORDER BY role, username").fetchall()
+            finally:
+                conn.close()
         
+        self.tasks.submit('users', query, on_done=self.show_users, indicator=self.users_progress)
+    
+    def show_users(self, users):
+        """Вывод списка пользователей"""
+        self.users_tree.delete(*self.users_tree.get_children())
         for user in users:
             is_active = "Да" if user['is_active'] else "Нет"
             last_login = user['last_login'] or "Никогда"
@@ -2522,6 +2412,7 @@ Email: {order['email'] or 'Не указан'}
         
         ttk.Button(toolbar, text="Обновить", command=self.load_audit_logs).pack(side=tk.LEFT, padx=2)
         ttk.Button(toolbar, text="Очистить старые", command=self.clear_old_audit_logs).pack(side=tk.LEFT, padx=2)
+        self.audit_progress = ProgressIndicator(toolbar, side=tk.LEFT, padx=5)
         
         # Фильтры
         filter_frame = ttk.Frame(toolbar)
@@ -2535,67 +2426,45 @@ Email: {order['email'] or 'Не указан'}
         
         ttk.Button(filter_frame, text="Применить", command=self.load_audit_logs).pack(side=tk.LEFT)
         
-        # Таблица аудита
+        # Таблица аудита (строки подгружаются при прокрутке, сортировка - щелчком по заголовку)
         columns = ("ID", "Дата", "Пользователь", "Действие", "Таблица", "Запись", "IP")
-        self.audit_tree = ttk.Treeview(frame, columns=columns, show="headings", height=20)
+        self.audit_view = VirtualTreeview(
+            frame, self.tasks, 'audit', columns, self.audit_row,
+            sorts={"ID": 'id', "Дата": 'created_at', "Действие": 'action'},
+            sort='created_at', descending=True, indicator=self.audit_progress)
+        self.audit_tree = self.audit_view.tree
         
         for col in columns:
-            self.audit_tree.heading(col, text=col)
             self.audit_tree.column(col, width=100, minwidth=50)
         
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.audit_tree.yview)
-        self.audit_tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.audit_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.audit_view.pack(fill=tk.BOTH, expand=True)
         
         # Загружаем логи
         self.load_audit_logs()
     
     def load_audit_logs(self):
-        """Загрузка логов аудита"""
-        if not hasattr(self, 'audit_tree'):
+        """Загрузка логов аудита (по мере прокрутки)"""
+        if not hasattr(self, 'audit_view'):
             return
-            
-        for item in self.audit_tree.get_children():
-            self.audit_tree.delete(item)
         
         try:
             days = int(self.audit_days_filter.get())
         except ValueError:
             days = 7
         
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                a.*,
-                e.username as employee_username
-            FROM audit_log a
-            LEFT JOIN employees e ON a.employee_id = e.id
-            WHERE a.created_at >= date('now', ?)
-            ORDER BY a.created_at DESC
-            LIMIT 1000
-        ''', (f'-{days} days',))
-        
-        logs = cursor.fetchall()
-        conn.close()
-        
-        for log in logs:
-            employee = log['employee_username'] or 'Система'
-            table_name = log['table_name'] or ''
-            record_id = log['record_id'] or ''
-            
-            self.audit_tree.insert('', tk.END, values=(
-                log['id'],
-                log['created_at'],
-                employee,
-                log['action'],
-                table_name,
-                record_id,
-                log['ip_address'] or ''
-            ))
+        self.audit_view.reload(lambda **page_args: self.db.get_audit_page(days=days, **page_args))
+    
+    def audit_row(self, log):
+        """Значения строки журнала аудита"""
+        return (
+            log['id'],
+            log['created_at'],
+            log['employee_username'] or 'Система',
+            log['action'],
+            log['table_name'] or '',
+            log['record_id'] or '',
+            log['ip_address'] or ''
+        )
     
     def clear_old_audit_logs(self):
         """Очистка старых логов аудита"""
@@ -2603,13 +2472,8 @@ Email: {order['email'] or 'Не указан'}
                                "Удалить логи аудита старше 30 дней?\n"
                                "Это действие нельзя отменить."):
             
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
             try:
-                cursor.execute("DELETE FROM audit_log WHERE created_at < date('now', '-30 days')")
-                deleted_count = cursor.rowcount
-                conn.commit()
+                deleted_count = self.db.delete_audit_before(30)
                 
                 messagebox.showinfo("Успех", f"Удалено {deleted_count} записей аудита")
                 self.load_audit_logs()
@@ -2621,10 +2485,7 @@ Email: {order['email'] or 'Не указан'}
                     new_values={'deleted_count': deleted_count}
                 )
             except Exception as e:
-                conn.rollback()
                 messagebox.showerror("Ошибка", f"Не удалось очистить логи: {e}")
-            finally:
-                conn.close()
     
     def logout(self):
         """Выход из системы"""
@@ -2635,7 +2496,11 @@ Email: {order['email'] or 'Не указан'}
     
     def run(self):
         """Запуск приложения"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.tasks.shutdown()
+            self.db.close()
 
 # Запуск приложения
 if __name__ == "__main__":
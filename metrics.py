@@ -0,0 +1,216 @@
+# metrics.py - Метрики производительности веб-запросов
+#
+# По каждому запросу собираются: маршрут, статус, длительность, число
+# SQL-запросов и их суммарное время (наблюдатель database.add_query_observer),
+# время отрисовки шаблонов. Значения копятся в гистограммах процесса и
+# отдаются в текстовом формате Prometheus (render()). Запросы дольше
+# Config.SLOW_REQUEST_THRESHOLD пишутся в журнал медленных запросов вместе с
+# самыми долгими и самыми частыми SQL-запросами.
+#
+# Гистограммы живут в памяти процесса: при нескольких воркерах веб-сервера
+# каждый отдает свои значения, суммирует их Prometheus.
+import heapq
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from config import Config
+import database
+
+slow_logger = logging.getLogger('slow_requests')
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(pairs: Iterable[Tuple[str, Any]]) -> str:
+    labels = ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs)
+    return f'{{{labels}}}' if labels else ''
+
+class Histogram:
+    """Гистограмма Prometheus с метками"""
+    
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # метки -> [счетчики корзин (не накопленные), сумма, количество]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels: Any):
+        """Учет значения для набора меток (в порядке labelnames)"""
+        labels = tuple(str(label) for label in labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def render(self) -> List[str]:
+        """Строки в текстовом формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count)
+                      for labels, (counts, total, count) in sorted(self._series.items())]
+        for labels, counts, total, count in series:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(pairs + [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', "Длительность обработки запроса",
+    ('method', 'route', 'status'))
+REQUEST_SQL_QUERIES = Histogram(
+    'http_request_sql_queries', "Число SQL-запросов на запрос", ('route',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram(
+    'http_request_sql_seconds', "Суммарное время SQL-запросов на запрос", ('route',))
+REQUEST_TEMPLATE_SECONDS = Histogram(
+    'http_request_template_seconds', "Время отрисовки шаблонов на запрос", ('route',))
+
+HISTOGRAMS = [REQUEST_DURATION, REQUEST_SQL_QUERIES, REQUEST_SQL_SECONDS, REQUEST_TEMPLATE_SECONDS]
+
+class RequestStats:
+    """Показатели одного запроса"""
+    
+    def __init__(self, keep_queries: int = None):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_started_at = None
+        self._keep = Config.SLOW_REQUEST_QUERIES if keep_queries is None else keep_queries
+        # Самые долгие запросы: куча (время, номер, sql) ограниченного размера
+        self._slowest: List[Tuple[float, int, str]] = []
+        # sql -> [сколько раз, суммарное время] - для поиска N+1
+        self._by_statement: Dict[str, List[Any]] = {}
+    
+    def add_query(self, sql: str, seconds: float):
+        self.sql_count += 1
+        self.sql_time += seconds
+        statement = self._by_statement.get(sql)
+        if statement is None:
+            self._by_statement[sql] = [1, seconds]
+        else:
+            statement[0] += 1
+            statement[1] += seconds
+        entry = (seconds, self.sql_count, sql)
+        if len(self._slowest) < self._keep:
+            heapq.heappush(self._slowest, entry)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+    
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+    
+    def slowest_queries(self) -> List[Tuple[float, str]]:
+        """Самые долгие запросы, от долгого к быстрому"""
+        return [(seconds, sql) for seconds, _, sql in sorted(self._slowest, reverse=True)]
+    
+    def repeated_queries(self, min_count: int = 2) -> List[Tuple[int, float, str]]:
+        """Запросы, выполненные несколько раз: (раз, суммарное время, sql)"""
+        repeated = [(count, total, sql) for sql, (count, total) in self._by_statement.items()
+                    if count >= min_count]
+        return sorted(repeated, reverse=True)[:self._keep]
+
+_local = threading.local()
+
+def current() -> Optional[RequestStats]:
+    """Показатели запроса, обрабатываемого текущим потоком"""
+    return getattr(_local, 'stats', None)
+
+def _observe_query(event: database.QueryEvent):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.add_query(event.sql, event.seconds)
+
+def install():
+    """Подписка на выполнение SQL (однократно при старте приложения)"""
+    database.add_query_observer(_observe_query)
+
+def begin_request() -> RequestStats:
+    _local.stats = RequestStats()
+    return _local.stats
+
+def template_started():
+    stats = current()
+    if stats is not None:
+        stats.template_started_at = time.perf_counter()
+
+def template_finished():
+    stats = current()
+    if stats is not None and stats.template_started_at is not None:
+        stats.template_time += time.perf_counter() - stats.template_started_at
+        stats.template_started_at = None
+
+def end_request(method: str, route: str, status: int) -> Optional[RequestStats]:
+    """Учет завершенного запроса в гистограммах и журнале медленных запросов"""
+    stats = current()
+    _local.stats = None
+    if stats is None:
+        return None
+    
+    elapsed = stats.elapsed
+    REQUEST_DURATION.observe(elapsed, method, route, status)
+    REQUEST_SQL_QUERIES.observe(stats.sql_count, route)
+    REQUEST_SQL_SECONDS.observe(stats.sql_time, route)
+    REQUEST_TEMPLATE_SECONDS.observe(stats.template_time, route)
+    
+    if elapsed >= Config.SLOW_REQUEST_THRESHOLD:
+        log_slow_request(method, route, status, elapsed, stats)
+    return stats
+
+def log_slow_request(method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+    """Запись медленного запроса с его самыми долгими и повторяющимися SQL"""
+    lines = [f"{method} {route} {status}: {elapsed * 1000:.1f} мс, "
+             f"SQL {stats.sql_count} шт. / {stats.sql_time * 1000:.1f} мс, "
+             f"шаблоны {stats.template_time * 1000:.1f} мс"]
+    for seconds, sql in stats.slowest_queries():
+        lines.append(f"  {seconds * 1000:8.2f} мс  {' '.join(sql.split())[:300]}")
+    for count, total, sql in stats.repeated_queries():
+        lines.append(f"  {count} раз, {total * 1000:.2f} мс  {' '.join(sql.split())[:300]}")
+    slow_logger.warning('\n'.join(lines))
+
+def _gauge_lines(name: str, source: str, stats: Dict[str, Any]) -> List[str]:
+    """Числовые значения словаря статистики (pool_stats(), ResponseCache.stats())"""
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            labels = _format_labels([('source', source), ('stat', key)])
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return lines
+
+def render(extra: Dict[str, Dict[str, Any]] = None) -> str:
+    """Все гистограммы и дополнительная статистика (источник -> словарь) в формате Prometheus"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    if extra:
+        lines.append("# HELP app_stat Счетчики пулов и кэшей процесса")
+        lines.append("# TYPE app_stat gauge")
+        for source, stats in extra.items():
+            lines.extend(_gauge_lines('app_stat', source, stats))
+    return '\n'.join(lines) + '\n'
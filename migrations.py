@@ -0,0 +1,598 @@
+# migrations.py - Версионные миграции схемы базы данных
+import sqlite3
+import logging
+from typing import List, Tuple, Union, Callable
+
+from client_search import PHONE_EXPR, EMAIL_EXPR
+from rollups import order_rollup_sql, product_rollup_sql, item_rollup_sql, rebuild_rollups
+from counters import counter_sql, order_status_counter, repair_counters, version_triggers, init_versions
+from change_log import CHANGE_LOG_TABLES, change_triggers, prune_trigger
+
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: SQL-выражение или функция, получающая курсор
+Step = Union[str, Callable[[sqlite3.Cursor], None]]
+
+def analyze_indexes(*names: str) -> Step:
+    """Шаг миграции: статистика по новым индексам, если БД уже анализировалась.
+    
+    Без нее планировщик оценивает новый индекс по умолчанию и может выбрать его
+    вместо индексов, для которых статистика есть.
+    """
+    def step(cursor: sqlite3.Cursor):
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            for name in names:
+                cursor.execute(f"ANALYZE {name}")
+    return step
+
+# Список миграций по возрастанию версии: (версия, описание, шаги).
+# Уже примененные миграции менять нельзя - изменения схемы добавляются
+# новой записью в конец списка.
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Начальная схема', [
+        # Таблица сотрудников
+        '''
+            CREATE TABLE IF NOT EXISTS employees (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                email TEXT,
+                phone TEXT,
+                position TEXT,
+                role TEXT CHECK(role IN ('admin', 'manager', 'cashier', 'content_manager', 'viewer')) DEFAULT 'viewer',
+                is_active INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP,
+                password_changed_at TIMESTAMP,
+                failed_login_attempts INTEGER DEFAULT 0,
+                session_token TEXT,
+                must_change_password INTEGER DEFAULT 1
+            )
+        ''',
+        # Таблица клиентов (соответствует ФЗ-152)
+        '''
+            CREATE TABLE IF NOT EXISTS clients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_code TEXT UNIQUE NOT NULL,
+                full_name TEXT NOT NULL,
+                phone TEXT,
+                email TEXT,
+                address TEXT,
+                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                personal_data_consent INTEGER DEFAULT 0,
+                consent_date TIMESTAMP,
+                is_active INTEGER DEFAULT 1,
+                notes TEXT,
+                created_by INTEGER,
+                FOREIGN KEY (created_by) REFERENCES employees(id)
+            )
+        ''',
+        # Таблица товаров
+        '''
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sku TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT,
+                category TEXT,
+                unit_price REAL NOT NULL CHECK(unit_price >= 0),
+                quantity INTEGER DEFAULT 0 CHECK(quantity >= 0),
+                min_quantity INTEGER DEFAULT 10,
+                max_quantity INTEGER DEFAULT 100,
+                supplier TEXT,
+                barcode TEXT,
+                is_active INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        # Таблица заказов (ордеров)
+        '''
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_number TEXT UNIQUE NOT NULL,
+                client_id INTEGER,
+                employee_id INTEGER NOT NULL,
+                status TEXT CHECK(status IN ('pending', 'processing', 'completed', 'cancelled')) DEFAULT 'pending',
+                total_amount REAL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP,
+                notes TEXT,
+                FOREIGN KEY (client_id) REFERENCES clients(id),
+                FOREIGN KEY (employee_id) REFERENCES employees(id)
+            )
+        ''',
+        # Таблица позиций заказа
+        '''
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL CHECK(quantity > 0),
+                unit_price REAL NOT NULL,
+                total_price REAL NOT NULL,
+                FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+                FOREIGN KEY (product_id) REFERENCES products(id)
+            )
+        ''',
+        # Таблица контента для сайта
+        '''
+            CREATE TABLE IF NOT EXISTS website_content (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                page_name TEXT NOT NULL,
+                section TEXT NOT NULL,
+                content_type TEXT CHECK(content_type IN ('text', 'html', 'json', 'image_path')) DEFAULT 'text',
+                content TEXT,
+                metadata TEXT,
+                is_published INTEGER DEFAULT 1,
+                created_by INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER DEFAULT 1,
+                FOREIGN KEY (created_by) REFERENCES employees(id)
+            )
+        ''',
+        # Таблица логов действий (для аудита)
+        '''
+            CREATE TABLE IF NOT EXISTS audit_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER,
+                action TEXT NOT NULL,
+                table_name TEXT,
+                record_id INTEGER,
+                old_values TEXT,
+                new_values TEXT,
+                ip_address TEXT,
+                user_agent TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (employee_id) REFERENCES employees(id)
+            )
+        ''',
+        # Таблица сессий
+        '''
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                employee_id INTEGER NOT NULL,
+                session_token TEXT UNIQUE NOT NULL,
+                ip_address TEXT,
+                user_agent TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP,
+                is_active INTEGER DEFAULT 1,
+                FOREIGN KEY (employee_id) REFERENCES employees(id)
+            )
+        ''',
+        # Создаем индексы для производительности
+        'CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients(phone)',
+        'CREATE INDEX IF NOT EXISTS idx_clients_email ON clients(email)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_client ON orders(client_id)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_employee ON orders(employee_id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_sku ON products(sku)',
+        'CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)',
+        'CREATE INDEX IF NOT EXISTS idx_employees_username ON employees(username)',
+        'CREATE INDEX IF NOT EXISTS idx_audit_employee ON audit_log(employee_id)',
+        'CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_log(created_at)',
+    ]),
+    (2, 'Индексы для постраничной выборки по ключу', [
+        # Каталог: WHERE is_active = 1 [AND category = ?] ORDER BY name, id
+        'CREATE INDEX IF NOT EXISTS idx_products_active_name ON products(is_active, name)',
+        'CREATE INDEX IF NOT EXISTS idx_products_category_active_name ON products(category, is_active, name)',
+        # Заказы: [WHERE status = ?] ORDER BY created_at DESC, id DESC
+        'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at)',
+    ]),
+    (3, 'Полнотекстовый индекс товаров (FTS5)', [
+        # Отдельная FTS-таблица (не external content): в индекс пишется текст
+        # с заменой ё -> е, которую токенизатор unicode61 сам не делает.
+        # Регистр (в том числе кириллицы) токенизатор приводит сам.
+        '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, sku, description, supplier, category,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''',
+        '''
+            INSERT INTO products_fts (rowid, name, sku, description, supplier, category)
+            SELECT id,
+                   replace(replace(name, 'ё', 'е'), 'Ё', 'Е'),
+                   sku,
+                   replace(replace(description, 'ё', 'е'), 'Ё', 'Е'),
+                   replace(replace(supplier, 'ё', 'е'), 'Ё', 'Е'),
+                   replace(replace(category, 'ё', 'е'), 'Ё', 'Е')
+            FROM products
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products
+            BEGIN
+                INSERT INTO products_fts (rowid, name, sku, description, supplier, category)
+                VALUES (new.id,
+                        replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+                        new.sku,
+                        replace(replace(new.description, 'ё', 'е'), 'Ё', 'Е'),
+                        replace(replace(new.supplier, 'ё', 'е'), 'Ё', 'Е'),
+                        replace(replace(new.category, 'ё', 'е'), 'Ё', 'Е'));
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products
+            BEGIN
+                DELETE FROM products_fts WHERE rowid = old.id;
+            END
+        ''',
+        # Изменение остатков и цен индекс не трогает
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_products_fts_update
+            AFTER UPDATE OF name, sku, description, supplier, category ON products
+            BEGIN
+                UPDATE products_fts
+                SET name = replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+                    sku = new.sku,
+                    description = replace(replace(new.description, 'ё', 'е'), 'Ё', 'Е'),
+                    supplier = replace(replace(new.supplier, 'ё', 'е'), 'Ё', 'Е'),
+                    category = replace(replace(new.category, 'ё', 'е'), 'Ё', 'Е')
+                WHERE rowid = new.id;
+            END
+        ''',
+    ]),
+    (4, 'Индексы поиска клиентов', [
+        # Текст выражений должен совпадать с запросами client_search
+        f'CREATE INDEX IF NOT EXISTS idx_clients_phone_norm ON clients({PHONE_EXPR})',
+        f'CREATE INDEX IF NOT EXISTS idx_clients_email_lower ON clients({EMAIL_EXPR})',
+        '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                full_name, address,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''',
+        '''
+            INSERT INTO clients_fts (rowid, full_name, address)
+            SELECT id,
+                   replace(replace(full_name, 'ё', 'е'), 'Ё', 'Е'),
+                   replace(replace(address, 'ё', 'е'), 'Ё', 'Е')
+            FROM clients
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_clients_fts_insert AFTER INSERT ON clients
+            BEGIN
+                INSERT INTO clients_fts (rowid, full_name, address)
+                VALUES (new.id,
+                        replace(replace(new.full_name, 'ё', 'е'), 'Ё', 'Е'),
+                        replace(replace(new.address, 'ё', 'е'), 'Ё', 'Е'));
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_clients_fts_delete AFTER DELETE ON clients
+            BEGIN
+                DELETE FROM clients_fts WHERE rowid = old.id;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_clients_fts_update
+            AFTER UPDATE OF full_name, address ON clients
+            BEGIN
+                UPDATE clients_fts
+                SET full_name = replace(replace(new.full_name, 'ё', 'е'), 'Ё', 'Е'),
+                    address = replace(replace(new.address, 'ё', 'е'), 'Ё', 'Е')
+                WHERE rowid = new.id;
+            END
+        ''',
+    ]),
+    (5, 'Сводные таблицы продаж', [
+        '''
+            CREATE TABLE IF NOT EXISTS sales_daily (
+                day TEXT PRIMARY KEY,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS sales_monthly (
+                month TEXT PRIMARY KEY,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS sales_product_daily (
+                day TEXT NOT NULL,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, product_id)
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS sales_employee_daily (
+                day TEXT NOT NULL,
+                employee_id INTEGER NOT NULL,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, employee_id)
+            ) WITHOUT ROWID
+        ''',
+        # Заказ стал выполненным или перестал им быть
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_status
+            AFTER UPDATE OF status ON orders
+            WHEN (old.status = 'completed') <> (new.status = 'completed')
+            BEGIN
+                {''.join(order_rollup_sql('old', "(CASE WHEN old.status = 'completed' THEN -1 ELSE 0 END)"))}
+                {''.join(order_rollup_sql('new', "(CASE WHEN new.status = 'completed' THEN 1 ELSE 0 END)"))}
+                {product_rollup_sql('new', "(CASE WHEN new.status = 'completed' THEN 1 ELSE -1 END)")}
+            END
+        ''',
+        # Изменение суммы или даты выполненного заказа
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_amount
+            AFTER UPDATE OF total_amount, created_at, employee_id ON orders
+            WHEN old.status = 'completed' AND new.status = 'completed'
+            BEGIN
+                {''.join(order_rollup_sql('old', '-1'))}
+                {''.join(order_rollup_sql('new', '1'))}
+                {product_rollup_sql('old', '-1')}
+                {product_rollup_sql('new', '1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_insert
+            AFTER INSERT ON orders
+            WHEN new.status = 'completed'
+            BEGIN
+                {''.join(order_rollup_sql('new', '1'))}
+            END
+        ''',
+        # BEFORE: позиции заказа еще не удалены каскадом
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_rollup_delete
+            BEFORE DELETE ON orders
+            WHEN old.status = 'completed'
+            BEGIN
+                {''.join(order_rollup_sql('old', '-1'))}
+                {product_rollup_sql('old', '-1')}
+            END
+        ''',
+        # Позиции, добавленные или удаленные у уже выполненного заказа
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_order_items_rollup_insert
+            AFTER INSERT ON order_items
+            BEGIN
+                {item_rollup_sql('new', '1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_order_items_rollup_delete
+            AFTER DELETE ON order_items
+            BEGIN
+                {item_rollup_sql('old', '-1')}
+            END
+        ''',
+        rebuild_rollups,
+    ]),
+    (6, 'Счетчики для панелей управления', [
+        '''
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_counter_insert
+            AFTER INSERT ON products WHEN new.is_active = 1
+            BEGIN
+                {counter_sql("'products_active'", '1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_counter_delete
+            AFTER DELETE ON products WHEN old.is_active = 1
+            BEGIN
+                {counter_sql("'products_active'", '-1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_products_counter_active
+            AFTER UPDATE OF is_active ON products
+            WHEN (old.is_active = 1) IS NOT (new.is_active = 1)
+            BEGIN
+                {counter_sql("'products_active'", "(CASE WHEN new.is_active = 1 THEN 1 ELSE -1 END)")}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_clients_counter_insert
+            AFTER INSERT ON clients WHEN new.is_active = 1
+            BEGIN
+                {counter_sql("'clients_active'", '1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_clients_counter_delete
+            AFTER DELETE ON clients WHEN old.is_active = 1
+            BEGIN
+                {counter_sql("'clients_active'", '-1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_clients_counter_active
+            AFTER UPDATE OF is_active ON clients
+            WHEN (old.is_active = 1) IS NOT (new.is_active = 1)
+            BEGIN
+                {counter_sql("'clients_active'", "(CASE WHEN new.is_active = 1 THEN 1 ELSE -1 END)")}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_counter_insert
+            AFTER INSERT ON orders
+            BEGIN
+                {counter_sql("'orders_total'", '1')}
+                {counter_sql(order_status_counter('new'), '1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_counter_delete
+            AFTER DELETE ON orders
+            BEGIN
+                {counter_sql("'orders_total'", '-1')}
+                {counter_sql(order_status_counter('old'), '-1')}
+            END
+        ''',
+        f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_counter_status
+            AFTER UPDATE OF status ON orders
+            WHEN old.status IS NOT new.status
+            BEGIN
+                {counter_sql(order_status_counter('old'), '-1')}
+                {counter_sql(order_status_counter('new'), '1')}
+            END
+        ''',
+        repair_counters,
+    ]),
+    (7, 'Составные индексы для выборок по периодам', [
+        # Новые клиенты за период и доля согласий на обработку ПДн
+        'CREATE INDEX IF NOT EXISTS idx_clients_active_registered ON clients(is_active, registration_date)',
+        'CREATE INDEX IF NOT EXISTS idx_clients_active_consent ON clients(is_active, personal_data_consent)',
+        # Итоги выполненных заказов по клиентам читаются из индекса без обращения к таблице
+        'CREATE INDEX IF NOT EXISTS idx_orders_status_client ON orders(status, client_id, total_amount, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id, product_id)',
+        # Последние действия сотрудника; заменяет индекс только по employee_id
+        'CREATE INDEX IF NOT EXISTS idx_audit_employee_created ON audit_log(employee_id, created_at)',
+        'DROP INDEX IF EXISTS idx_audit_employee',
+    ]),
+    (8, 'Индексы по результатам проверки планов (query_plans.py)', [
+        # Страница активных клиентов по id (rowid входит в индекс неявно)
+        'CREATE INDEX IF NOT EXISTS idx_clients_active ON clients(is_active)',
+        # Проверка, использован ли товар в заказах (перед удалением)
+        'CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_barcode ON products(barcode)',
+        # Разделы страницы сайта и проверка существования раздела
+        'CREATE INDEX IF NOT EXISTS idx_website_content_page_section ON website_content(page_name, section)',
+        # Товары с низким запасом: частичный индекс только по таким товарам
+        '''
+            CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(quantity)
+            WHERE is_active = 1 AND quantity < min_quantity
+        ''',
+    ]),
+    (9, 'Версии данных для условных ответов API', [
+        '''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                modified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        ''',
+        *version_triggers(('products', 'content', 'stats')),
+        init_versions,
+    ]),
+    (10, 'Версия данных сотрудников и индекс сессий', [
+        *version_triggers(('employees',)),
+        init_versions,
+        # Активные сессии сотрудника (проверка сессии веб-приложения)
+        'CREATE INDEX IF NOT EXISTS idx_user_sessions_employee ON user_sessions(employee_id, is_active)',
+    ]),
+    (11, 'Индексы сортировок таблиц настольного приложения', [
+        # Сортировка по столбцу таблицы идет по индексу (rowid в конце индекса дает
+        # порядок "столбец, id"), без сортировки всей выборки на каждую порцию строк
+        'CREATE INDEX IF NOT EXISTS idx_clients_active_name ON clients(is_active, full_name)',
+        'CREATE INDEX IF NOT EXISTS idx_products_active_price ON products(is_active, unit_price)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_total ON orders(total_amount)',
+        'CREATE INDEX IF NOT EXISTS idx_audit_action_created ON audit_log(action, created_at)',
+        analyze_indexes('idx_clients_active_name', 'idx_products_active_price', 'idx_orders_total',
+                        'idx_audit_action_created'),
+    ]),
+    (12, 'Журнал изменений строк для обновления таблиц настольного приложения', [
+        # AUTOINCREMENT: номера удаленных записей не используются повторно (номер - версия данных)
+        '''
+            CREATE TABLE IF NOT EXISTS change_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                operation TEXT NOT NULL
+            )
+        ''',
+        *change_triggers(CHANGE_LOG_TABLES),
+        prune_trigger(),
+    ]),
+]
+
+def ensure_migrations_table(conn: sqlite3.Connection):
+    """Создание таблицы версий схемы"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы (0 - миграции не применялись)"""
+    ensure_migrations_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+def run_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Применение всех непримененных миграций.
+    
+    Каждая миграция выполняется в отдельной транзакции BEGIN IMMEDIATE, так что
+    несколько процессов, стартующих одновременно, не применят ее дважды.
+    Возвращает список примененных версий.
+    """
+    ensure_migrations_table(conn)
+    done_versions = {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+    applied = []
+    
+    for version, description, steps in MIGRATIONS:
+        if version in done_versions:
+            continue
+        
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = ?", (version,)
+            ).fetchone()
+            if done:
+                conn.rollback()
+                continue
+            
+            cursor = conn.cursor()
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+            applied.append(version)
+            logger.info(f"Применена миграция {version}: {description}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Ошибка миграции {version} ({description}): {e}")
+            raise
+    
+    return applied
+
+if __name__ == "__main__":
+    import sys
+    from config import Config
+    
+    db_path = sys.argv[1] if len(sys.argv) > 1 else Config.DATABASE_PATH
+    conn = sqlite3.connect(db_path)
+    try:
+        before = get_schema_version(conn)
+        applied = run_migrations(conn)
+        print(f"База данных: {db_path}")
+        print(f"Версия схемы: {before} -> {get_schema_version(conn)}")
+        for version in applied:
+            print(f"  ✓ применена миграция {version}")
+        if not applied:
+            print("Схема актуальна")
+    finally:
+        conn.close()
\ No newline at end of file
@@ -0,0 +1,161 @@
+# pagination.py - Постраничная выборка по ключу (keyset/cursor pagination)
+#
+# Вместо LIMIT ? OFFSET ? следующая страница выбирается условием
+# "(ключ сортировки) > (ключ последней строки)", поэтому страница N стоит
+# столько же, сколько первая: SQLite сразу переходит по индексу к нужной строке.
+import base64
+import json
+import re
+import sqlite3
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(values: Sequence[Any], direction: str = 'next') -> str:
+    """Непрозрачный курсор из значений ключа сортировки"""
+    payload = json.dumps({'v': list(values), 'd': direction}, ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, key_count: int) -> Dict[str, Any]:
+    """Разбор курсора; ValueError, если курсор поврежден или от другой выборки"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values = payload['v']
+        direction = payload.get('d', 'next')
+    except (ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Неверный курсор: {e}")
+    
+    if not isinstance(values, list) or len(values) != key_count or direction not in ('next', 'prev'):
+        raise ValueError("Неверный курсор")
+    return {'values': values, 'direction': direction}
+
+def clamp_limit(limit: Any, default: int = 50) -> int:
+    """Размер страницы из пользовательского ввода"""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def resolve_sort(sorts: Dict[str, Sequence[str]], sort: Optional[str]) -> Tuple[List[str], List[str]]:
+    """Выражения ORDER BY и поля ключа для сортировки из списка разрешенных.
+    
+    sorts - имя сортировки -> выражения (последним - уникальный id); первая
+    сортировка словаря - по умолчанию. Поле ключа - имя столбца без псевдонима таблицы.
+    """
+    if sort is None:
+        sort = next(iter(sorts))
+    if sort not in sorts:
+        raise ValueError(f"Недопустимая сортировка: {sort}")
+    order_by = list(sorts[sort])
+    return order_by, [expr.split('.')[-1] for expr in order_by]
+
+def seek_key(conn: sqlite3.Connection, select_sql: str, where_sql: str, params: List[Any],
+             order_by: Sequence[str], order_sql: str, offset: int) -> Optional[List[Any]]:
+    """Значения ключа строки с номером offset (для перехода к произвольной позиции).
+    
+    Выбираются только столбцы ключа, поэтому OFFSET проходит по индексу сортировки,
+    не читая строки таблицы; дальше страница выбирается по ключу как обычно.
+    """
+    from_sql = re.split(r'\bFROM\b', select_sql, maxsplit=1, flags=re.IGNORECASE)[1]
+    row = conn.execute(
+        f"SELECT {', '.join(order_by)} FROM{from_sql}{where_sql} ORDER BY {order_sql} LIMIT 1 OFFSET ?",
+        list(params) + [offset]
+    ).fetchone()
+    return list(row) if row is not None else None
+
+def count_rows(conn: sqlite3.Connection, count_sql: str, where: List[str], params: List[Any]) -> int:
+    """Число строк выборки: count_sql - "SELECT COUNT(*) FROM ..." без WHERE"""
+    count_where = f" WHERE {' AND '.join(where)}" if where else ""
+    return conn.execute(f"{count_sql}{count_where}", list(params)).fetchone()[0]
+
+def fetch_page(conn: sqlite3.Connection, select_sql: str, where: List[str], params: List[Any],
+               order_by: Sequence[str], key_fields: Sequence[str], descending: bool = False,
+               limit: int = 50, cursor: Optional[str] = None, with_total: bool = False,
+               count_sql: Optional[str] = None, offset: Optional[int] = None) -> Dict[str, Any]:
+    """Выборка одной страницы.
+    
+    select_sql - "SELECT ... FROM ..." без WHERE/ORDER BY;
+    where, params - условия фильтра и их параметры;
+    order_by - выражения сортировки (последним должен идти уникальный столбец,
+               например id, чтобы порядок был стабильным; значения не NULL);
+    key_fields - имена этих же столбцов в строках результата;
+    count_sql - "SELECT COUNT(*) FROM ..." для общего количества (with_total);
+    offset - без курсора: страница начинается со строки с этим номером
+             (прокрутка к произвольной позиции в настольном приложении).
+    
+    Возвращает словарь: items, next_cursor, prev_cursor, has_more, total,
+    key_fields (поля, по которым упорядочены строки).
+    """
+    if len(order_by) != len(key_fields):
+        raise ValueError("order_by и key_fields должны совпадать по длине")
+    
+    limit = clamp_limit(limit)
+    direction = 'next'
+    conditions = list(where)
+    query_params = list(params)
+    
+    if not cursor and offset:
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+        order_sql = ', '.join(f"{expr} {'DESC' if descending else 'ASC'}" for expr in order_by)
+        key = seek_key(conn, select_sql, where_sql, params, order_by, order_sql, offset - 1)
+        if key is None:
+            # Позиция за концом выборки - пустая страница без запроса строк
+            return {
+                'items': [],
+                'has_more': False,
+                'next_cursor': None,
+                'prev_cursor': None,
+                'total': count_rows(conn, count_sql, where, params) if with_total else None,
+                'key_fields': list(key_fields),
+            }
+        cursor = encode_cursor(key, 'next')
+    
+    if cursor:
+        decoded = decode_cursor(cursor, len(key_fields))
+        direction = decoded['direction']
+        # Назад по убывающей сортировке - то же, что вперед по возрастающей
+        forward_op = '<' if descending else '>'
+        backward_op = '>' if descending else '<'
+        op = forward_op if direction == 'next' else backward_op
+        placeholders = ', '.join('?' for _ in key_fields)
+        conditions.append(f"({', '.join(order_by)}) {op} ({placeholders})")
+        query_params.extend(decoded['values'])
+    
+    reverse_scan = direction == 'prev'
+    order_desc = descending != reverse_scan
+    order_sql = ', '.join(f"{expr} {'DESC' if order_desc else 'ASC'}" for expr in order_by)
+    where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    rows = conn.execute(
+        f"{select_sql}{where_sql} ORDER BY {order_sql} LIMIT ?",
+        query_params + [limit + 1]
+    ).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    extra = len(rows) > limit
+    
+    if reverse_scan:
+        items.reverse()
+        has_more = True            # пришли со следующей страницы
+        has_prev = extra
+    else:
+        has_more = extra
+        has_prev = cursor is not None
+    
+    def key_of(item):
+        return [item[field] for field in key_fields]
+    
+    page = {
+        'items': items,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(key_of(items[-1]), 'next') if items and has_more else None,
+        'prev_cursor': encode_cursor(key_of(items[0]), 'prev') if items and has_prev else None,
+        'total': None,
+        'key_fields': list(key_fields),
+    }
+    
+    if with_total:
+        page['total'] = count_rows(conn, count_sql, where, params)
+    
+    return page
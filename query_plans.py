@@ -0,0 +1,610 @@
+# query_plans.py - Проверка планов выполнения запросов и подбор индексов
+#
+# Вызывает методы Database, перехватывает выполненные SQL-запросы (trace
+# callback) и проверяет их EXPLAIN QUERY PLAN на заполненной тестовыми данными
+# БД (seed_dataset, затем ANALYZE):
+#   - полный просмотр таблицы (SCAN t без индекса) - ошибка;
+#   - обход индекса целиком (SCAN t USING INDEX) и временное B-дерево для
+#     сортировки или группировки (USE TEMP B-TREE) - предупреждение.
+# Для частых запросов (HOT_QUERIES) задан индекс, который они обязаны
+# использовать: пропажа индекса из плана - ошибка.
+#
+# Все запросы приложения можно собрать во время работы: переменная окружения
+# SQL_CAPTURE_PATH=файл включает StatementCollector во всех соединениях пула,
+# при завершении процесса запросы дописываются в файл (JSON по строке на запрос).
+# Собранный файл проверяется так же: --capture файл.
+#
+# Запуск: python query_plans.py [путь_к_БД] [--scale N] [--capture файл] [--advise] [-v]
+# Без пути проверка идет на временной БД со всеми миграциями и тестовыми данными
+# (--scale 0 - без данных); с путем - на копии указанной БД.
+# --advise - предложить индексы для проблемных запросов (каждое предложение
+# проверяется: индекс создается, план перестраивается, изменения откатываются).
+# Код возврата 1, если найден полный просмотр таблицы или частый запрос
+# потерял свой индекс. На таблицах меньше MIN_PLAN_ROWS строк планировщик
+# выбирает полный просмотр по объему данных, поэтому такие находки выводятся,
+# но ошибкой не считаются (relax_small_tables).
+import argparse
+import atexit
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Callable, Tuple, Optional
+
+from database import Database, TimeRange
+
+# Таблица меньше - полный просмотр или другой индекс не ошибка (план зависит от объема)
+MIN_PLAN_ROWS = 1000
+
+# Запросы отчетов и статистики: (название, вызов через Database)
+REPORT_QUERIES: List[Tuple[str, Callable[[Database], Any]]] = [
+    ('dashboard_counts', lambda db: db.get_dashboard_counts()),
+    ('today_sales', lambda db: db.get_today_sales()),
+    ('sales_summary', lambda db: db.get_sales_summary(months=6, top_days=30)),
+    ('today_completed_orders', lambda db: db.get_completed_orders(TimeRange.today())),
+    ('month_completed_orders', lambda db: db.get_completed_orders(TimeRange.last_months(1))),
+    ('client_report', lambda db: db.get_client_report(new_days=30)),
+    ('audit_page_30_days', lambda db: db.get_audit_page(days=30, with_total=True)),
+    ('audit_cleanup', lambda db: db.delete_audit_before(30)),
+]
+
+HOT_QUERIES: List[Tuple[str, Callable[[Database], Any], Tuple[str, ...]]] = [
+    ('products_page', lambda db: db.get_products_page(limit=50),
+     ('idx_products_active_name',)),
+    ('products_page_category', lambda db: db.get_products_page(category='Категория 1', limit=50),
+     ('idx_products_category_active_name',)),
+    ('products_search', lambda db: db.search_products('товар', limit=50), ()),
+    ('clients_page', lambda db: db.get_clients_page(limit=50),
+     ('idx_clients_active',)),
+    ('clients_search_phone', lambda db: db.search_clients('+7 903 1', limit=30),
+     ('idx_clients_phone_norm',)),
+    ('clients_search_email', lambda db: db.search_clients('client1@', limit=30),
+     ('idx_clients_email_lower',)),
+    ('orders_page', lambda db: db.get_orders_page(limit=50),
+     ('idx_orders_created',)),
+    ('orders_page_status', lambda db: db.get_orders_page(status='pending', limit=50),
+     ('idx_orders_status_created',)),
+    ('audit_page', lambda db: db.get_audit_page(limit=50),
+     ('idx_audit_created',)),
+    # Сортировки и переход к позиции в таблицах настольного приложения
+    ('clients_page_by_name', lambda db: db.get_clients_page(limit=50, sort='full_name', descending=False),
+     ('idx_clients_active_name',)),
+    ('clients_page_seek', lambda db: db.get_clients_page(limit=50, offset=1000),
+     ('idx_clients_active',)),
+    ('products_page_by_price', lambda db: db.get_products_page(limit=50, sort='unit_price', descending=True),
+     ('idx_products_active_price',)),
+    ('orders_page_by_total', lambda db: db.get_orders_page(limit=50, sort='total_amount'),
+     ('idx_orders_total',)),
+    ('orders_page_seek', lambda db: db.get_orders_page(limit=50, offset=1000),
+     ('idx_orders_created',)),
+    ('audit_page_by_action', lambda db: db.get_audit_page(limit=50, sort='action', descending=False),
+     ('idx_audit_action_created',)),
+    ('today_completed_orders', lambda db: db.get_completed_orders(TimeRange.today()),
+     ('idx_orders_status_created', 'idx_order_items_order')),
+    ('client_report', lambda db: db.get_client_report(new_days=30),
+     ('idx_clients_active_registered', 'idx_clients_active_consent', 'idx_orders_status_client')),
+    ('create_order', lambda db: db.create_order(
+        {'client_id': 1, 'items': [{'product_id': 1, 'quantity': 1}, {'product_id': 2, 'quantity': 1}]}, 1),
+     ()),
+    ('content_page', lambda db: db.get_page_content('index'), ('idx_website_content_page_section',)),
+    ('content_section_exists', lambda db: db.content_section_exists('index', 'hero'),
+     ('idx_website_content_page_section',)),
+    ('order_items', lambda db: db.get_order_items(1), ('idx_order_items_order',)),
+    ('order_items_restock', lambda db: db.get_order_item_quantities(1), ('idx_order_items_order',)),
+    ('product_in_orders', lambda db: db.count_product_orders(1), ('idx_order_items_product',)),
+    ('low_stock', lambda db: db.get_low_stock(limit=5), ('idx_products_low_stock',)),
+    ('recent_orders', lambda db: db.get_recent_orders(limit=5), ('idx_orders_created',)),
+    ('profile_orders', lambda db: db.get_employee_order_counts(1), ('idx_orders_employee',)),
+    ('profile_actions', lambda db: db.get_employee_actions(1, limit=10), ('idx_audit_employee_created',)),
+    ('data_version', lambda db: db.get_data_version('products'), ()),
+    ('user_sessions', lambda db: db.get_active_sessions(1), ('idx_user_sessions_employee',)),
+    ('login', lambda db: db.authenticate_user('admin', 'admin'), ()),
+]
+
+# Операторы, у которых есть план выполнения
+PLANNED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+# Служебные запросы FTS5 к своим теневым таблицам ('main'.'products_fts_config')
+_SHADOW_TABLE_RE = re.compile(r"'\w+'\.'\w+_(?:config|data|idx|docsize|content)'")
+
+def is_planned(sql: str) -> bool:
+    """Оператор имеет план выполнения (не BEGIN/COMMIT/PRAGMA и не строка триггера)"""
+    return sql.lstrip().upper().startswith(PLANNED_STATEMENTS)
+
+def is_internal(sql: str) -> bool:
+    """Запрос выполнен самим SQLite (модулем FTS5), а не приложением"""
+    return bool(_SHADOW_TABLE_RE.search(sql))
+
+def is_limited(sql: str) -> bool:
+    """Запрос верхнего уровня ограничен LIMIT"""
+    return bool(re.search(r'\bLIMIT\s+\S+\s*(?:OFFSET\s+\S+\s*)?$', sql.strip(), re.IGNORECASE))
+
+def capture_statements(db: Database, call: Callable[[Database], Any]) -> List[str]:
+    """SQL-запросы, выполненные при вызове call(db)"""
+    statements = []
+    conn = db.get_connection()
+    try:
+        # Вложенные вызовы в этом потоке получают это же соединение
+        conn.set_trace_callback(statements.append)
+        try:
+            call(db)
+        finally:
+            conn.set_trace_callback(db.pool.trace_callback)
+    finally:
+        conn.close()
+    # Для каждого срабатывания триггера трассировка повторяет текст оператора
+    return [sql for sql in dict.fromkeys(statements) if is_planned(sql) and not is_internal(sql)]
+
+def explain(db: Database, sql: str) -> List[str]:
+    """Строки EXPLAIN QUERY PLAN"""
+    conn = db.get_connection()
+    try:
+        return [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    finally:
+        conn.close()
+
+def _subqueries(plan: List[str]) -> set:
+    """Имена подзапросов и CTE плана (материализованных или сопрограмм)"""
+    return {detail.split()[1] for detail in plan
+            if detail.split()[0] in ('CO-ROUTINE', 'MATERIALIZE') and len(detail.split()) > 1}
+
+def find_scans(plan: List[str]) -> List[str]:
+    """Полные просмотры таблиц в плане.
+    
+    Просмотр подзапроса или CTE (материализованного или сопрограммы) и
+    виртуальной таблицы (json_each, FTS5) полным просмотром таблицы не считается.
+    """
+    subqueries = _subqueries(plan)
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        if words[0] == 'SCAN' and len(words) > 1:
+            if words[1] in subqueries or 'VIRTUAL TABLE' in detail or ' INDEX ' in f"{detail} ":
+                continue
+            scans.append(detail)
+    return scans
+
+def classify_plan(plan: List[str], limited: bool = False) -> Dict[str, List[str]]:
+    """Разбор плана: {'scans', 'index_scans', 'temp_btrees', 'indexes'}.
+    
+    limited - запрос с LIMIT: обход индекса целиком тогда не предупреждение.
+    """
+    subqueries = _subqueries(plan)
+    # Обход индекса с LIMIT останавливается после нужного числа строк
+    index_scans = [
+        detail for detail in plan
+        if detail.startswith('SCAN ') and ' INDEX ' in f"{detail} " and 'VIRTUAL TABLE' not in detail
+        and detail.split()[1] not in subqueries
+    ] if not limited else []
+    indexes = re.findall(r'USING (?:COVERING )?INDEX (\w+)', ' '.join(plan))
+    return {
+        'scans': find_scans(plan),
+        'index_scans': index_scans,
+        'temp_btrees': [detail for detail in plan if 'TEMP B-TREE' in detail],
+        'indexes': sorted(set(indexes)),
+    }
+
+def check_queries(db: Database, queries=None) -> List[Dict[str, Any]]:
+    """Планы запросов: [{'name', 'sql', 'plan', 'scans', 'index_scans', 'temp_btrees', 'indexes'}]"""
+    results = []
+    for name, call in (REPORT_QUERIES if queries is None else queries):
+        for sql in capture_statements(db, call):
+            plan = explain(db, sql)
+            results.append({'name': name, 'sql': ' '.join(sql.split()), 'plan': plan,
+                            **classify_plan(plan, is_limited(sql))})
+    return results
+
+def check_hot_queries(db: Database) -> List[Dict[str, Any]]:
+    """Планы частых запросов и индексы, которые из них пропали.
+    
+    Результат - check_queries() по HOT_QUERIES, у первого запроса каждого
+    вызова дополнительно 'missing' - ожидаемые индексы, которых нет в планах вызова.
+    """
+    results = []
+    for name, call, expected in HOT_QUERIES:
+        statements = check_queries(db, [(name, call)])
+        used = {index for r in statements for index in r['indexes']}
+        missing = [index for index in expected if index not in used]
+        if statements:
+            statements[0]['missing'] = missing
+        else:
+            statements = [{'name': name, 'sql': '', 'plan': [], 'scans': [], 'index_scans': [],
+                           'temp_btrees': [], 'indexes': [], 'missing': missing}]
+        results.extend(statements)
+    return results
+
+# Сбор запросов во время работы приложения
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+def normalize_sql(sql: str) -> str:
+    """Текст запроса без значений: литералы заменены на ?, списки IN (...) свернуты"""
+    sql = _LITERAL_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (?)', sql)
+    return ' '.join(sql.split())
+
+class StatementCollector:
+    """Сбор выполняемых SQL-запросов (trace callback соединений).
+    
+    Запросы группируются по тексту без значений (normalize_sql); для каждого
+    хранится число выполнений и один пример с подставленными значениями,
+    по которому строится план.
+    """
+    
+    def __init__(self):
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def __call__(self, sql: str):
+        if not is_planned(sql):
+            return
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                self._statements[key] = {'sql': ' '.join(sql.split()), 'count': 1}
+            else:
+                entry['count'] += 1
+    
+    def statements(self) -> Dict[str, Dict[str, Any]]:
+        """Собранные запросы: {нормализованный текст: {'sql', 'count'}}"""
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._statements.items()}
+    
+    def save(self, path: str):
+        """Дописывание собранных запросов в файл (JSON по строке на запрос)"""
+        statements = self.statements()
+        if not statements:
+            return
+        with open(path, 'a', encoding='utf-8') as f:
+            for key, entry in statements.items():
+                f.write(json.dumps({'key': key, **entry}, ensure_ascii=False) + '\n')
+    
+    @staticmethod
+    def load(path: str) -> Dict[str, Dict[str, Any]]:
+        """Запросы из файла; записи нескольких процессов объединяются"""
+        statements: Dict[str, Dict[str, Any]] = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                entry = statements.setdefault(record['key'], {'sql': record['sql'], 'count': 0})
+                entry['count'] += record['count']
+        return statements
+    
+    @classmethod
+    def capture_to_file(cls, pool, path: str) -> 'StatementCollector':
+        """Сбор всех запросов соединений пула с записью в файл при завершении процесса"""
+        collector = cls()
+        pool.trace_callback = collector
+        atexit.register(collector.save, path)
+        return collector
+
+def check_captured(db: Database, path: str) -> List[Dict[str, Any]]:
+    """Планы запросов, собранных в файл, частые сначала"""
+    results = []
+    statements = sorted(StatementCollector.load(path).values(), key=lambda e: -e['count'])
+    for entry in statements:
+        try:
+            plan = explain(db, entry['sql'])
+        except sqlite3.Error as e:
+            # Запрос к таблице, которой нет в проверяемой БД
+            plan = [f"ошибка: {e}"]
+        results.append({'name': f"captured x{entry['count']}", 'sql': entry['sql'], 'plan': plan,
+                        **classify_plan(plan, is_limited(entry['sql']))})
+    return results
+
+# Тестовые данные
+
+def seed_dataset(db: Database, scale: float = 1.0, seed: int = 1):
+    """Заполнение БД тестовыми данными.
+    
+    При scale=1: 20 сотрудников, 5 000 товаров, 20 000 клиентов, 50 000 заказов
+    по 1-5 позиций, 50 000 записей аудита, 200 разделов контента; даты за год.
+    После заполнения собирается статистика (ANALYZE), без нее планировщик
+    выбирает индексы иначе, чем на рабочей БД.
+    """
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    
+    def moment() -> str:
+        return (now - timedelta(minutes=rnd.randint(0, 365 * 24 * 60))).strftime('%Y-%m-%d %H:%M:%S')
+    
+    n_employees = 20
+    n_products = max(10, int(5000 * scale))
+    n_clients = max(10, int(20000 * scale))
+    n_orders = max(10, int(50000 * scale))
+    n_audit = max(10, int(50000 * scale))
+    
+    conn = db.get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany('''
+            INSERT INTO employees (username, password_hash, full_name, role, must_change_password)
+            VALUES (?, '', ?, ?, 0)
+        ''', [(f"seed_user{i}", f"Сотрудник {i}", rnd.choice(('manager', 'cashier')))
+              for i in range(n_employees)])
+        employee_ids = [row[0] for row in conn.execute("SELECT id FROM employees")]
+        
+        conn.executemany('''
+            INSERT INTO products (sku, name, description, category, unit_price, quantity,
+                                  min_quantity, supplier, barcode, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(f"SKU{i:06d}", f"Товар {i}", f"Описание товара {i}", f"Категория {i % 50}",
+               round(rnd.uniform(10, 5000), 2), rnd.randint(0, 500), 10, f"Поставщик {i % 100}",
+               f"46{i:011d}", int(rnd.random() > 0.05))
+              for i in range(n_products)])
+        prices = {row[0]: row[1] for row in conn.execute("SELECT id, unit_price FROM products")}
+        product_ids = list(prices)
+        
+        conn.executemany('''
+            INSERT INTO clients (client_code, full_name, phone, email, address,
+                                 registration_date, personal_data_consent, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(f"CL{i:07d}", f"Клиент {i} Тестовый", f"+7 903 {i:07d}", f"client{i}@example.com",
+               f"г. Москва, ул. Тестовая, д. {i % 300}", moment(), int(rnd.random() > 0.3),
+               int(rnd.random() > 0.05))
+              for i in range(n_clients)])
+        
+        orders = []
+        for i in range(n_orders):
+            orders.append((f"SEED{i:08d}", rnd.randint(1, n_clients), rnd.choice(employee_ids),
+                           rnd.choice(('pending', 'processing', 'completed', 'completed', 'cancelled')),
+                           moment()))
+        conn.executemany('''
+            INSERT INTO orders (order_number, client_id, employee_id, status, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', orders)
+        
+        items = []
+        for order_id in range(1, n_orders + 1):
+            for product_id in rnd.sample(product_ids, rnd.randint(1, 5)):
+                quantity = rnd.randint(1, 10)
+                items.append((order_id, product_id, quantity, prices[product_id],
+                              prices[product_id] * quantity))
+        first_order = conn.execute("SELECT MIN(id) FROM orders WHERE order_number LIKE 'SEED%'").fetchone()[0]
+        conn.executemany('''
+            INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(order_id + first_order - 1, *rest) for order_id, *rest in items])
+        conn.execute('''
+            UPDATE orders SET total_amount = (
+                SELECT SUM(total_price) FROM order_items WHERE order_id = orders.id
+            ) WHERE order_number LIKE 'SEED%'
+        ''')
+        
+        conn.executemany('''
+            INSERT INTO audit_log (employee_id, action, table_name, record_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(rnd.choice(employee_ids), rnd.choice(('LOGIN', 'CREATE_ORDER', 'UPDATE_PRODUCT')),
+               'orders', rnd.randint(1, n_orders), moment())
+              for _ in range(n_audit)])
+        
+        conn.executemany('''
+            INSERT INTO website_content (page_name, section, content, is_published)
+            VALUES (?, ?, ?, 1)
+        ''', [(page, f"section{s}", f"Текст {page}/{s}")
+              for page in ('index', 'about', 'contacts', *(f"page{p}" for p in range(17)))
+              for s in range(10)])
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# Подбор индексов
+
+_KEYWORDS = {'WHERE', 'ON', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'GROUP', 'ORDER', 'LIMIT',
+             'USING', 'AS', 'SET', 'HAVING', 'UNION', 'NATURAL', 'OUTER'}
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_VALUE = r"(?:\?|'(?:[^']|'')*'|-?\d+(?:\.\d+)?)"
+
+def _table_aliases(sql: str) -> Dict[str, str]:
+    """Псевдонимы таблиц запроса: {псевдоним или имя: таблица}"""
+    aliases = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def _columns(sql: str, alias: str, pattern: str, table_columns: List[str]) -> List[str]:
+    """Столбцы таблицы alias, подходящие под pattern (с группой для имени столбца)"""
+    found = []
+    for prefix, column in re.findall(pattern, sql, re.IGNORECASE):
+        if prefix and prefix.rstrip('.') != alias:
+            continue
+        if column in table_columns and column not in found:
+            found.append(column)
+    return found
+
+def propose_index(db: Database, sql: str, alias: str) -> Optional[str]:
+    """CREATE INDEX для таблицы alias запроса sql: сначала столбцы сравнений
+    на равенство, затем один столбец диапазона, затем столбцы ORDER BY"""
+    table = _table_aliases(sql).get(alias)
+    if not table:
+        return None
+    conn = db.get_connection()
+    try:
+        table_columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+    if not table_columns:
+        return None
+    
+    equal = _columns(sql, alias, rf"(\w+\.)?(\w+)\s*(?:=|\bIS\b)\s*{_VALUE}", table_columns)
+    ranges = _columns(sql, alias, rf"(\w+\.)?(\w+)\s*(?:<=|>=|<|>|\bBETWEEN\b)\s*{_VALUE}", table_columns)
+    order_match = re.search(r'\bORDER BY\s+(.+?)(?:\bLIMIT\b|$)', sql, re.IGNORECASE)
+    order = []
+    if order_match:
+        order = _columns(order_match.group(1), alias, r"(\w+\.)?(\w+)", table_columns)
+    
+    columns = []
+    for column in equal + ranges[:1] + order:
+        if column not in columns:
+            columns.append(column)
+    if not columns:
+        return None
+    return f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table}({', '.join(columns)})"
+
+def advise(db: Database, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Проверенные предложения индексов для запросов с полным просмотром таблицы
+    или индекса либо временным B-деревом: [{'name', 'sql', 'index', 'plan'}].
+    
+    Индекс создается в транзакции, план строится заново и изменения откатываются;
+    предложение принимается, только если новый индекс попал в план и
+    полный просмотр или B-дерево исчезли.
+    """
+    proposals = []
+    seen = set()
+    for r in results:
+        if not r['scans'] and not r['index_scans'] and not r['temp_btrees']:
+            continue
+        aliases = [scan.split()[1] for scan in r['scans'] + r['index_scans']]
+        if not aliases:
+            aliases = [alias for alias, table in _table_aliases(r['sql']).items() if alias != table][:1] \
+                or list(_table_aliases(r['sql']))[:1]
+        for alias in aliases:
+            ddl = propose_index(db, r['sql'], alias)
+            if not ddl or ddl in seen:
+                continue
+            seen.add(ddl)
+            index_name = ddl.split()[2]
+            
+            conn = db.get_connection()
+            try:
+                conn.execute("BEGIN")
+                conn.execute(ddl)
+                plan = [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {r['sql']}")]
+            except sqlite3.Error:
+                continue
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.close()
+            
+            after = classify_plan(plan, is_limited(r['sql']))
+            improved = (len(after['scans']) < len(r['scans'])
+                        or len(after['index_scans']) < len(r['index_scans'])
+                        or len(after['temp_btrees']) < len(r['temp_btrees']))
+            if index_name in after['indexes'] and improved:
+                proposals.append({'name': r['name'], 'sql': r['sql'], 'index': ddl, 'plan': plan})
+    return proposals
+
+def relax_small_tables(db: Database, results: List[Dict[str, Any]],
+                       min_rows: int = MIN_PLAN_ROWS) -> List[Dict[str, Any]]:
+    """Перенос полных просмотров и пропавших индексов таблиц меньше min_rows
+    строк из 'scans' и 'missing' в 'small' (выводятся, но не ошибка)"""
+    conn = db.get_connection()
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        sizes = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+        index_tables = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"))
+    finally:
+        conn.close()
+    
+    def is_small(table: str) -> bool:
+        return table in sizes and sizes[table] < min_rows
+    
+    for r in results:
+        aliases = _table_aliases(r['sql'])
+        small = [detail for detail in r['scans'] if is_small(aliases.get(detail.split()[1], detail.split()[1]))]
+        small_missing = [index for index in r.get('missing', ()) if is_small(index_tables.get(index, ''))]
+        if small or small_missing:
+            r['scans'] = [detail for detail in r['scans'] if detail not in small]
+            if 'missing' in r:
+                r['missing'] = [index for index in r['missing'] if index not in small_missing]
+            r['small'] = small + [f"нет индекса в плане: {index}" for index in small_missing]
+    return results
+
+def copy_database(source: str, target: str):
+    """Копия БД (проверка выполняет запросы с записью - на рабочей БД нельзя)"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def print_results(title: str, results: List[Dict[str, Any]], verbose: bool):
+    """Вывод планов: ✗ - ошибка, ! - предупреждение"""
+    print(f"\n{title}")
+    for r in results:
+        failed = r['scans'] or r.get('missing')
+        warned = r['index_scans'] or r['temp_btrees']
+        mark = '✗' if failed else '!' if warned else '✓'
+        print(f"{mark} {r['name']}: {r['sql'][:100]}")
+        if r.get('missing'):
+            print(f"      нет индекса в плане: {', '.join(r['missing'])}")
+        for detail in r.get('small', ()):
+            print(f"      таблица меньше {MIN_PLAN_ROWS} строк, не ошибка: {detail}")
+        if verbose or failed or warned:
+            for detail in r['plan']:
+                print(f"      {detail}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка планов выполнения SQL-запросов")
+    parser.add_argument('db_path', nargs='?', help="БД для проверки (проверяется копия)")
+    parser.add_argument('--scale', type=float, default=None,
+                        help="Объем тестовых данных (1 - 50 000 заказов, 0 - без данных); "
+                             "по умолчанию 1 для временной БД и 0 для указанной")
+    parser.add_argument('--capture', help="Файл запросов, собранных через SQL_CAPTURE_PATH")
+    parser.add_argument('--advise', action='store_true', help="Предложить индексы")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Выводить все планы")
+    args = parser.parse_args()
+    
+    scale = args.scale if args.scale is not None else (0 if args.db_path else 1)
+    
+    with tempfile.TemporaryDirectory(prefix='query_plans_') as work_dir:
+        db_path = os.path.join(work_dir, 'check.db')
+        if args.db_path:
+            copy_database(args.db_path, db_path)
+        
+        db = Database(db_path)
+        try:
+            if scale > 0:
+                seed_dataset(db, scale)
+            hot = check_hot_queries(db)
+            reports = check_queries(db)
+            captured = check_captured(db, args.capture) if args.capture else []
+            proposals = advise(db, hot + reports + captured) if args.advise else []
+            relax_small_tables(db, hot + reports + captured)
+        finally:
+            db.close()
+    
+    print_results("Частые запросы", hot, args.verbose)
+    print_results("Отчеты", reports, args.verbose)
+    if captured:
+        print_results(f"Собранные запросы ({args.capture})", captured, args.verbose)
+    if args.advise:
+        print("\nПредлагаемые индексы")
+        for p in proposals:
+            print(f"  {p['index']};  -- {p['name']}")
+            if args.verbose:
+                for detail in p['plan']:
+                    print(f"      {detail}")
+        if not proposals:
+            print("  нет")
+    
+    results = hot + reports + captured
+    scans = [r for r in results if r['scans']]
+    missing = [r for r in hot if r.get('missing')]
+    warnings = [r for r in results if r['index_scans'] or r['temp_btrees']]
+    print(f"\nЗапросов: {len(results)}, с полным просмотром таблицы: {len(scans)}, "
+          f"частых без своего индекса: {len(missing)}, с предупреждениями: {len(warnings)}")
+    return 1 if scans or missing else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# rollups.py - Сводные таблицы продаж
+#
+# Выполненные заказы (status = 'completed') агрегируются в таблицы:
+#   sales_daily          - заказы и выручка по дням;
+#   sales_monthly        - заказы и выручка по месяцам;
+#   sales_product_daily  - продажи товаров по дням;
+#   sales_employee_daily - заказы и выручка сотрудников по дням.
+# Таблицы обновляются триггерами (миграция 5) при переходе заказа в статус
+# 'completed' и обратно, поэтому отчеты читают десятки строк вместо всех заказов.
+# День и месяц берутся из orders.created_at (UTC, как DATE('now')).
+#
+# Пересчет с нуля: python rollups.py [путь_к_БД]
+import sqlite3
+from typing import List, Dict, Any
+
+ROLLUP_TABLES = ('sales_daily', 'sales_monthly', 'sales_product_daily', 'sales_employee_daily')
+
+def order_rollup_sql(row: str, sign: str) -> List[str]:
+    """Операторы триггера: учесть заказ row ('new'/'old') в сводках по заказам со знаком sign"""
+    amount = f"{sign} * COALESCE({row}.total_amount, 0)"
+    return [
+        f'''
+            INSERT INTO sales_daily (day, order_count, revenue)
+            VALUES (date({row}.created_at), {sign}, {amount})
+            ON CONFLICT (day) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                revenue = revenue + excluded.revenue;
+        ''',
+        f'''
+            INSERT INTO sales_monthly (month, order_count, revenue)
+            VALUES (strftime('%Y-%m', {row}.created_at), {sign}, {amount})
+            ON CONFLICT (month) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                revenue = revenue + excluded.revenue;
+        ''',
+        f'''
+            INSERT INTO sales_employee_daily (day, employee_id, order_count, revenue)
+            VALUES (date({row}.created_at), {row}.employee_id, {sign}, {amount})
+            ON CONFLICT (day, employee_id) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                revenue = revenue + excluded.revenue;
+        ''',
+    ]
+
+def product_rollup_sql(row: str, sign: str) -> str:
+    """Оператор триггера: учесть позиции заказа row в сводке по товарам со знаком sign"""
+    return f'''
+        INSERT INTO sales_product_daily (day, product_id, quantity, revenue)
+        SELECT date({row}.created_at), product_id, {sign} * SUM(quantity), {sign} * SUM(total_price)
+        FROM order_items
+        WHERE order_id = {row}.id
+        GROUP BY product_id
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue;
+    '''
+
+def item_rollup_sql(row: str, sign: str) -> str:
+    """Оператор триггера: учесть одну позицию row выполненного заказа со знаком sign"""
+    return f'''
+        INSERT INTO sales_product_daily (day, product_id, quantity, revenue)
+        SELECT date(o.created_at), {row}.product_id, {sign} * {row}.quantity, {sign} * {row}.total_price
+        FROM orders o
+        WHERE o.id = {row}.order_id AND o.status = 'completed'
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue;
+    '''
+
+def rebuild_rollups(cursor: sqlite3.Cursor):
+    """Пересчет всех сводных таблиц по заказам (в транзакции вызывающего кода)"""
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+    
+    cursor.execute('''
+        INSERT INTO sales_daily (day, order_count, revenue)
+        SELECT date(created_at), COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders WHERE status = 'completed'
+        GROUP BY date(created_at)
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_monthly (month, order_count, revenue)
+        SELECT strftime('%Y-%m', created_at), COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders WHERE status = 'completed'
+        GROUP BY strftime('%Y-%m', created_at)
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_employee_daily (day, employee_id, order_count, revenue)
+        SELECT date(created_at), employee_id, COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders WHERE status = 'completed'
+        GROUP BY date(created_at), employee_id
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_product_daily (day, product_id, quantity, revenue)
+        SELECT date(o.created_at), oi.product_id, SUM(oi.quantity), SUM(oi.total_price)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        WHERE o.status = 'completed'
+        GROUP BY date(o.created_at), oi.product_id
+    ''')
+
+# Чтение сводок. Границы периода - ключи 'YYYY-MM-DD' / 'YYYY-MM',
+# интервал полуоткрытый [start, end) (см. database.TimeRange).
+
+def get_day_sales(conn: sqlite3.Connection, day: str) -> Dict[str, Any]:
+    """Заказы, выручка и средний чек за день"""
+    row = conn.execute('''
+        SELECT COALESCE(SUM(order_count), 0) AS order_count,
+               COALESCE(SUM(revenue), 0) AS total_sales
+        FROM sales_daily
+        WHERE day = ?
+    ''', (day,)).fetchone()
+    stats = dict(row)
+    stats['avg_order'] = stats['total_sales'] / stats['order_count'] if stats['order_count'] else 0
+    return stats
+
+def get_monthly_sales(conn: sqlite3.Connection, start_month: str, end_month: str) -> List[Dict[str, Any]]:
+    """Продажи по календарным месяцам периода, новые сначала"""
+    rows = conn.execute('''
+        SELECT month, order_count, revenue AS total_sales,
+               revenue / order_count AS avg_order
+        FROM sales_monthly
+        WHERE month >= ? AND month < ? AND order_count > 0
+        ORDER BY month DESC
+    ''', (start_month, end_month)).fetchall()
+    return [dict(row) for row in rows]
+
+def get_top_products(conn: sqlite3.Connection, start_day: str, end_day: str,
+                     limit: int = 10) -> List[Dict[str, Any]]:
+    """Самые продаваемые за период товары по выручке"""
+    rows = conn.execute('''
+        SELECT p.name, p.sku, p.category,
+               s.total_sold, s.total_revenue
+        FROM (
+            SELECT product_id, SUM(quantity) AS total_sold, SUM(revenue) AS total_revenue
+            FROM sales_product_daily
+            WHERE day >= ? AND day < ?
+            GROUP BY product_id
+            HAVING SUM(quantity) > 0
+        ) AS s
+        JOIN products p ON p.id = s.product_id
+        ORDER BY s.total_revenue DESC
+        LIMIT ?
+    ''', (start_day, end_day, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def get_employee_sales(conn: sqlite3.Connection, start_day: str, end_day: str) -> List[Dict[str, Any]]:
+    """Заказы и выручка сотрудников за период"""
+    rows = conn.execute('''
+        SELECT e.full_name, e.username,
+               s.order_count, s.total_sales
+        FROM (
+            SELECT employee_id, SUM(order_count) AS order_count, SUM(revenue) AS total_sales
+            FROM sales_employee_daily
+            WHERE day >= ? AND day < ?
+            GROUP BY employee_id
+            HAVING SUM(order_count) > 0
+        ) AS s
+        JOIN employees e ON e.id = s.employee_id
+        ORDER BY s.total_sales DESC
+    ''', (start_day, end_day)).fetchall()
+    return [dict(row) for row in rows]
+
+if __name__ == "__main__":
+    import sys
+    from config import Config
+    
+    db_path = sys.argv[1] if len(sys.argv) > 1 else Config.DATABASE_PATH
+    conn = sqlite3.connect(db_path)
+    try:
+        from migrations import run_migrations
+        run_migrations(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_rollups(conn.cursor())
+        conn.commit()
+        print(f"База данных: {db_path}")
+        for table in ROLLUP_TABLES:
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            print(f"  {table}: {count} строк")
+    finally:
+        conn.close()
@@ -1,9 +1,145 @@
 # security.py - Модуль безопасности
 import re
 import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Tuple
 import hashlib
 import secrets
+from config import Config
+
+logger = logging.getLogger('security')
+
+class MemoryRateLimiter:
+    """Ограничение частоты запросов (token bucket) в памяти процесса.
+    
+    Ведро ключа вмещает limit попыток и пополняется со скоростью limit за
+    window секунд. Проверка - O(1); хранится не больше max_keys ведер,
+    давно не использованные вытесняются (вытесненный ключ получает полное ведро).
+    """
+    
+    def __init__(self, max_keys: int = None):
+        self.max_keys = max_keys or Config.RATE_LIMIT_MAX_KEYS
+        # ключ -> (остаток попыток, время обновления)
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def hit(self, key: str, limit: int, window: float) -> float:
+        """Попытка по ключу: 0 - разрешена, иначе секунд до следующей разрешенной"""
+        rate = limit / window
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(limit), now))
+            tokens = min(float(limit), tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / rate
+
+class SQLiteRateLimiter:
+    """Ограничение частоты запросов с ведрами в общей БД SQLite: лимиты
+    действуют для всех процессов веб-сервера. Проверка - один UPSERT
+    по первичному ключу, пополнение и списание считаются в самом запросе."""
+    
+    # Пополнение ведра и списание попытки, если после пополнения она есть;
+    # строка не возвращается - попыток нет
+    HIT_SQL = '''
+        INSERT INTO rate_limits (key, tokens, updated_at) VALUES (:key, :limit - 1, :now)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:limit, tokens + (excluded.updated_at - updated_at) * :rate) - 1,
+            updated_at = excluded.updated_at
+        WHERE min(:limit, tokens + (excluded.updated_at - updated_at) * :rate) >= 1
+        RETURNING tokens
+    '''
+    
+    def __init__(self, db_path: str = None, cleanup_every: int = 1000):
+        self.db_path = db_path or Config.RATE_LIMIT_DB_PATH
+        self.cleanup_every = cleanup_every
+        self._hits = 0
+        self._lock = threading.Lock()
+        # Свое соединение у каждого потока, без пула database: запросы ограничителя
+        # не попадают в метрики SQL запроса и журнал медленных запросов
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (открывается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            from database import apply_pragmas
+            conn = sqlite3.connect(self.db_path)
+            apply_pragmas(conn, Config.DB_PROFILES[Config.DB_PROFILE])
+            self._local.conn = conn
+        return conn
+    
+    def hit(self, key: str, limit: int, window: float) -> float:
+        """Попытка по ключу: 0 - разрешена, иначе секунд до следующей разрешенной"""
+        rate = limit / window
+        now = time.time()
+        conn = self._connection()
+        try:
+            allowed = conn.execute(self.HIT_SQL, {'key': key, 'limit': limit, 'rate': rate,
+                                                  'now': now}).fetchone() is not None
+            retry_after = 0.0
+            if not allowed:
+                tokens, updated = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = min(limit, tokens + (now - updated) * rate)
+                retry_after = (1 - tokens) / rate
+            conn.commit()
+            
+            with self._lock:
+                self._hits += 1
+                cleanup = self._hits % self.cleanup_every == 0
+            if cleanup:
+                # Ведро, не тронутое дольше суток, давно полное - удаляем
+                conn.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - 86400,))
+                conn.commit()
+            return retry_after
+        except sqlite3.Error as e:
+            # Недоступность хранилища лимитов не должна закрывать вход
+            conn.rollback()
+            logger.error(f"Ошибка хранилища ограничений частоты: {e}")
+            return 0.0
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Общий для процесса ограничитель (Config.RATE_LIMIT_MODE: 'memory' или 'sqlite')"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            if Config.RATE_LIMIT_MODE == 'sqlite':
+                _limiter = SQLiteRateLimiter()
+            elif Config.RATE_LIMIT_MODE == 'memory':
+                _limiter = MemoryRateLimiter()
+            else:
+                raise ValueError(f"Неизвестный режим ограничения частоты: {Config.RATE_LIMIT_MODE}")
+        return _limiter
+
+def check_rate_limit(ip: str, action: str, limit: int = 10, window: float = 60) -> float:
+    """Попытка действия action с адреса ip: 0 - разрешена, иначе секунд до следующей"""
+    retry_after = get_rate_limiter().hit(f"{action}:{ip}", limit, window)
+    if retry_after:
+        logger.warning(f"Превышен лимит запросов: IP={ip}, действие={action}, "
+                       f"лимит={limit} за {window} с")
+    return retry_after
 
 class SecurityManager:
     def __init__(self, db):
@@ -130,15 +266,5 @@ class SecurityManager:
     
     def check_rate_limit(self, ip: str, action: str, limit: int = 10, 
                         window: int = 60) -> bool:
-        """Проверка ограничения частоты запросов"""
-        # В реальной реализации здесь было бы кэширование (Redis и т.д.)
-        # Это упрощенная версия
-        import time
-        current_time = int(time.time())
-        
-        # Логируем запрос
-        logging.getLogger('security').info(
-            f"Rate limit check: IP={ip}, Action={action}, Time={current_time}"
-        )
-        
-        return True  # Всегда разрешаем в демо-версии
\ No newline at end of file
+        """Проверка ограничения частоты запросов (True - действие разрешено)"""
+        return not check_rate_limit(ip, action, limit, window)
\ No newline at end of file
@@ -0,0 +1,158 @@
+# slow_queries.py - Журнал медленных SQL-запросов
+#
+# Наблюдатель database.add_query_observer записывает каждый запрос дольше
+# Config.SLOW_QUERY_THRESHOLD (выполнение и выборка строк) в журнал с
+# ротацией Config.SLOW_QUERY_LOG_PATH: одна строка JSON на запрос - текст
+# без значений (query_plans.normalize_sql), типы параметров (сами значения
+# не пишутся - в них персональные данные), длительность, число строк и план
+# EXPLAIN QUERY PLAN. Подключается в Database.__init__ для веб-приложения и
+# настольного приложения.
+#
+# Сводка по журналу (запросы с наибольшим суммарным временем):
+#   python slow_queries.py [журнал] [--top 20] [--sort total|count|max|avg] [--plans]
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from config import Config
+import database
+from query_plans import normalize_sql
+
+_logger = logging.getLogger('slow_queries')
+
+# Запросы, для которых строится план
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+def param_shape(value: Any) -> str:
+    """Тип параметра без значения: 'int', 'str[12]', 'NULL'"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+def param_shapes(params: Any) -> Any:
+    """Типы параметров запроса (список или словарь для именованных)"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: param_shape(value) for name, value in params.items()}
+    return [param_shape(value) for value in params]
+
+def explain(conn: sqlite3.Connection, sql: str, params: Any) -> Optional[List[str]]:
+    """План запроса на том же соединении; None, если план построить нельзя"""
+    if params is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        # Обычный курсор: план не должен попасть к наблюдателям
+        cursor = conn.cursor(sqlite3.Cursor)
+        try:
+            return [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        finally:
+            cursor.close()
+    except sqlite3.Error as e:
+        return [f"(план недоступен: {e})"]
+
+def observe(event: 'database.QueryEvent'):
+    """Наблюдатель SQL: запись запроса дольше порога"""
+    if event.seconds < Config.SLOW_QUERY_THRESHOLD:
+        return
+    record = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'sql': normalize_sql(event.sql),
+        'params': param_shapes(event.params),
+        'ms': round(event.seconds * 1000, 3),
+        'rows': event.rows,
+        'plan': explain(event.connection, event.sql, event.params),
+    }
+    _logger.warning(json.dumps(record, ensure_ascii=False))
+
+def install(path: str = None):
+    """Подключение журнала (повторный вызов ничего не меняет)"""
+    if not any(isinstance(h, RotatingFileHandler) for h in _logger.handlers):
+        path = path or Config.SLOW_QUERY_LOG_PATH
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=Config.SLOW_QUERY_LOG_MAX_BYTES,
+                                      backupCount=Config.SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.WARNING)
+        # Записи JSON не дублируются в общий журнал приложения
+        _logger.propagate = False
+    database.add_query_observer(observe)
+
+def read_log(path: str) -> List[Dict[str, Any]]:
+    """Записи журнала и его архивов после ротации (path.N ... path.1, path)"""
+    paths = [f"{path}.{n}" for n in range(Config.SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [path]
+    records = []
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Группировка по тексту запроса: число, суммарное/среднее/максимальное время, строки"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        group = groups.get(record['sql'])
+        if group is None:
+            group = groups[record['sql']] = {
+                'sql': record['sql'], 'count': 0, 'total': 0.0, 'max': 0.0,
+                'rows': 0, 'params': set(), 'plan': None, 'last': None,
+            }
+        group['count'] += 1
+        group['total'] += record['ms']
+        group['max'] = max(group['max'], record['ms'])
+        group['rows'] += record.get('rows') or 0
+        group['params'].add(json.dumps(record.get('params'), ensure_ascii=False))
+        if record.get('plan'):
+            group['plan'] = record['plan']
+        group['last'] = record.get('time')
+    for group in groups.values():
+        group['avg'] = group['total'] / group['count']
+        group['avg_rows'] = group['rows'] / group['count']
+    return list(groups.values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка журнала медленных SQL-запросов")
+    parser.add_argument('log', nargs='?', default=Config.SLOW_QUERY_LOG_PATH, help="файл журнала")
+    parser.add_argument('--top', type=int, default=20, help="сколько запросов показать")
+    parser.add_argument('--sort', choices=('total', 'count', 'max', 'avg'), default='total',
+                        help="порядок: суммарное время, число, максимум, среднее")
+    parser.add_argument('--plans', action='store_true', help="показать планы запросов")
+    args = parser.parse_args()
+    
+    records = read_log(args.log)
+    if not records:
+        print(f"Журнал {args.log} пуст или не найден")
+        sys.exit(1)
+    
+    groups = sorted(summarize(records), key=lambda group: group[args.sort], reverse=True)
+    total = sum(group['total'] for group in groups)
+    print(f"Медленных запросов: {len(records)}, разных: {len(groups)}, суммарно {total:.0f} мс\n")
+    print(f"{'#':>3}{'Раз':>7}{'Всего, мс':>12}{'Сред., мс':>11}{'Макс., мс':>11}{'Строк':>9}  Запрос")
+    for number, group in enumerate(groups[:args.top], 1):
+        scan = ' [SCAN]' if any(line.startswith('SCAN') for line in group['plan'] or ()) else ''
+        print(f"{number:>3}{group['count']:>7}{group['total']:>12.1f}{group['avg']:>11.1f}"
+              f"{group['max']:>11.1f}{group['avg_rows']:>9.0f}  {group['sql'][:100]}{scan}")
+        if args.plans:
+            print(f"{'':>12}параметры: {', '.join(sorted(group['params']))}")
+            for line in group['plan'] or ['(нет плана)']:
+                print(f"{'':>12}{line}")
+            print()
+
+if __name__ == "__main__":
+    main()
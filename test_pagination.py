@@ -0,0 +1,44 @@
+# test_pagination.py - Постраничная выборка по ключу (pytest)
+import sqlite3
+
+import pytest
+
+from pagination import fetch_page
+
+SELECT_SQL = "SELECT * FROM items"
+COUNT_SQL = "SELECT COUNT(*) FROM items"
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, is_active INTEGER)")
+    conn.executemany("INSERT INTO items (id, is_active) VALUES (?, 1)", [(i,) for i in range(1, 11)])
+    yield conn
+    conn.close()
+
+def _page(conn, **kwargs):
+    return fetch_page(conn, SELECT_SQL, ["is_active = 1"], [], order_by=["id"], key_fields=["id"],
+                      count_sql=COUNT_SQL, **kwargs)
+
+def test_offset_seek(conn):
+    page = _page(conn, limit=3, offset=4, with_total=True)
+    assert [row['id'] for row in page['items']] == [5, 6, 7]
+    assert page['has_more'] and page['next_cursor'] and page['prev_cursor']
+    assert page['total'] == 10
+
+def test_offset_beyond_row_count(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    
+    page = _page(conn, limit=3, offset=25, with_total=True)
+    
+    assert page == {'items': [], 'has_more': False, 'next_cursor': None, 'prev_cursor': None,
+                    'total': 10, 'key_fields': ['id']}
+    # Только поиск ключа позиции и подсчет строк, без запроса страницы
+    assert len(statements) == 2
+    assert not any(statement.startswith(SELECT_SQL) for statement in statements)
+
+def test_offset_beyond_row_count_without_total(conn):
+    page = _page(conn, limit=3, offset=10)
+    assert page['items'] == [] and page['total'] is None and not page['has_more']
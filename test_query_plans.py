@@ -0,0 +1,50 @@
+# test_query_plans.py - Планы запросов на заполненной БД (pytest)
+#
+# Падает, если запрос приложения начал читать таблицу целиком или частый
+# запрос перестал использовать свой индекс (см. query_plans.py).
+import pytest
+
+from database import Database
+from query_plans import check_hot_queries, check_queries, seed_dataset
+
+# Объем тестовых данных: 5 000 заказов, клиентов больше, чем сдвиг
+# постраничного перехода в HOT_QUERIES
+SEED_SCALE = 0.1
+
+@pytest.fixture(scope='module')
+def seeded_db(tmp_path_factory):
+    db = Database(str(tmp_path_factory.mktemp('query_plans') / 'check.db'))
+    seed_dataset(db, SEED_SCALE)
+    yield db
+    db.close()
+
+@pytest.fixture
+def empty_db(tmp_path):
+    db = Database(str(tmp_path / 'empty.db'))
+    yield db
+    db.close()
+
+def _describe(results):
+    return "\n".join(f"{r['name']}: {r['sql']}\n    " + "\n    ".join(r['plan']) for r in results)
+
+def test_hot_queries_use_their_indexes(seeded_db):
+    missing = [r for r in check_hot_queries(seeded_db) if r.get('missing')]
+    assert not missing, "Частые запросы без своего индекса:\n" + "\n".join(
+        f"{r['name']}: нет {', '.join(r['missing'])}" for r in missing
+    )
+
+def test_no_full_table_scans(seeded_db):
+    results = check_hot_queries(seeded_db) + check_queries(seeded_db)
+    scans = [r for r in results if r['scans']]
+    assert not scans, "Полный просмотр таблицы:\n" + _describe(scans)
+
+def test_dropped_index_is_reported(empty_db):
+    conn = empty_db.get_connection()
+    try:
+        conn.execute("DROP INDEX idx_order_items_order")
+    finally:
+        conn.close()
+    
+    missing = {r['name']: r['missing'] for r in check_hot_queries(empty_db) if r.get('missing')}
+    assert missing['order_items'] == ['idx_order_items_order']
+    assert missing['order_items_restock'] == ['idx_order_items_order']
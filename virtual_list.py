@@ -0,0 +1,396 @@
+# virtual_list.py - Таблица настольного приложения с подгрузкой строк по мере прокрутки
+#
+# ttk.Treeview хранит и перерисовывает все вставленные строки, поэтому таблица
+# на миллион строк занимает сотни мегабайт и заметное время на каждое обновление.
+# VirtualTreeview держит в Treeview ровно столько строк, сколько помещается
+# в окне, и при прокрутке только меняет их значения. Строки выбираются
+# порциями по ключу (pagination.fetch_page): вперед и назад от краев уже
+# загруженных порций, а при переходе к произвольной позиции (ползунок,
+# Home/End) - с нужной строки (offset). В памяти не больше
+# Config.GUI_CACHED_CHUNKS порций; дальняя от окна вытесняется. Следующая
+# порция запрашивается заранее, когда до края загруженных остается меньше
+# Config.GUI_PREFETCH_ROWS строк.
+#
+# Щелчок по заголовку столбца с сортировкой перезагружает таблицу с
+# сортировкой в БД (повторный щелчок меняет направление). Запросы выполняются
+# в фоне через gui_tasks.TaskExecutor; пока нужные строки не получены, окно
+# показывает прежние.
+#
+# apply_changes обновляет таблицу по журналу изменений (change_log.py):
+# измененные строки из загруженных порций перечитываются по id, а если строки
+# добавлены или удалены, порции перечитываются с текущей позиции.
+import tkinter as tk
+from tkinter import ttk
+from typing import Any, Callable, Dict, List, Sequence
+
+from config import Config
+from pagination import MAX_PAGE_SIZE
+
+# Стрелка направления сортировки в заголовке столбца
+SORT_MARKS = {False: ' ▲', True: ' ▼'}
+
+def list_fetch(load: Callable[[], List[Dict[str, Any]]]) -> Callable[..., Dict[str, Any]]:
+    """Источник строк для VirtualTreeview из списка (результаты поиска).
+    
+    load() выполняется в фоновом потоке при запросе первой порции и при
+    перечитывании (with_total - перезагрузка таблицы, ids - измененные строки).
+    """
+    loaded = []
+    
+    def fetch(limit: int, cursor: str = None, offset: int = None, with_total: bool = False,
+              sort: str = None, descending: bool = False, ids: List[int] = None) -> Dict[str, Any]:
+        if not loaded or with_total or ids:
+            loaded[:] = [load()]
+        rows = loaded[0]
+        if ids:
+            wanted = set(ids)
+            rows = [row for row in rows if row['id'] in wanted]
+        if sort is not None:
+            rows = sorted(rows, key=lambda row: row[sort], reverse=descending)
+        offset = offset or 0
+        # Порядок строк с равными значениями задает load(), поэтому ключа порядка нет
+        return {'items': rows[offset:offset + limit], 'has_more': offset + limit < len(rows),
+                'next_cursor': None, 'prev_cursor': None, 'total': len(rows), 'key_fields': None}
+    return fetch
+
+class Chunk:
+    """Порция строк подряд: номер первой строки и курсоры соседних порций"""
+    
+    def __init__(self, start: int, page: Dict[str, Any]):
+        self.start = start
+        self.items = page['items']
+        self.prev_cursor = page['prev_cursor']
+        self.next_cursor = page['next_cursor']
+    
+    @property
+    def end(self) -> int:
+        return self.start + len(self.items)
+
+class VirtualTreeview:
+    """Treeview с видимым окном строк, подгружаемых по ключу"""
+    
+    def __init__(self, parent, tasks, key: str, columns: Sequence[str],
+                 row_values: Callable[[Dict[str, Any]], tuple],
+                 row_tags: Callable[[Dict[str, Any]], tuple] = None,
+                 sorts: Dict[str, str] = None, sort: str = None, descending: bool = False,
+                 indicator=None, height: int = 20):
+        """columns - заголовки; row_values/row_tags - значения и теги строки;
+        sorts - заголовок -> имя сортировки в БД (sort параметр get_*_page)."""
+        self.tasks = tasks
+        self.key = key
+        self.row_values = row_values
+        self.row_tags = row_tags or (lambda row: ())
+        self.sorts = sorts or {}
+        self.sort = sort
+        self.descending = descending
+        self.indicator = indicator
+        self.chunk_size = Config.GUI_FETCH_CHUNK
+        
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", height=height,
+                                 selectmode='browse')
+        for column in columns:
+            if column in self.sorts:
+                self.tree.heading(column, text=column, command=lambda c=column: self.sort_by(c))
+            else:
+                self.tree.heading(column, text=column)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.show_sort_marks()
+        
+        self.fetch = None
+        self.chunks: List[Chunk] = []
+        self.total = 0
+        self.top = 0
+        self.visible = height
+        self.selected_id = None
+        self.pending = None         # Описание выполняющегося запроса
+        self.key_fields = None      # Поля порядка строк загруженных порций (None - неизвестен)
+        
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self.move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self.move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-self.visible))
+        self.tree.bind('<Next>', lambda e: self.scroll(self.visible))
+        self.tree.bind('<Home>', lambda e: self.scroll_to(0))
+        self.tree.bind('<End>', lambda e: self.scroll_to(self.total))
+    
+    def pack(self, **options):
+        self.frame.pack(**options)
+    
+    # Загрузка
+    
+    def reload(self, fetch: Callable[..., Dict[str, Any]] = None, delay: int = 0):
+        """Перезагрузка с первой строки.
+        
+        fetch(limit, cursor, offset, with_total, sort, descending) -> страница
+        fetch_page; фильтры выборки подставляются в fetch заранее (в главном потоке).
+        """
+        if fetch is not None:
+            self.fetch = fetch
+        self.tasks.cancel_key(self.key + ':patch')
+        self.chunks = []
+        self.top = 0
+        self.request('seek', 0, with_total=True, delay=delay)
+    
+    def refresh(self):
+        """Перечитывание строк с текущей позиции (окно до получения показывает прежние)"""
+        self.tasks.cancel_key(self.key + ':patch')
+        self.chunks = []
+        self.request('seek', max(0, self.top - Config.GUI_PREFETCH_ROWS), with_total=True)
+    
+    def apply_changes(self, changes: Dict[str, Any]):
+        """Обновление по изменениям таблицы {'inserted', 'deleted', 'updated'}
+        (change_log.read_changes); незагруженные строки не запрашиваются"""
+        if self.fetch is None:
+            return
+        if changes['inserted'] or changes['deleted']:
+            self.refresh()
+            return
+        
+        ids = [row['id'] for chunk in self.chunks for row in chunk.items if row['id'] in changes['updated']]
+        if len(ids) > MAX_PAGE_SIZE:
+            self.refresh()
+        elif ids:
+            # Отдельный ключ: перечитывание строк не отменяет подгрузку при прокрутке
+            fetch, sort, descending = self.fetch, self.sort, self.descending
+            self.tasks.submit(self.key + ':patch',
+                              lambda: fetch(limit=len(ids), sort=sort, descending=descending, ids=ids),
+                              on_done=lambda page: self.patched(set(ids), page['items']),
+                              on_error=self.tasks.report_error, indicator=self.indicator)
+    
+    def patched(self, ids, rows: List[Dict[str, Any]]):
+        """Измененные строки перечитаны (главный поток)"""
+        rows_by_id = {row['id']: row for row in rows}
+        for chunk in self.chunks:
+            for index, row in enumerate(chunk.items):
+                if row['id'] not in ids:
+                    continue
+                new = rows_by_id.get(row['id'])
+                if new is None or self.key_fields is None or any(
+                        new[field] != row[field] for field in self.key_fields):
+                    # Строка вышла из выборки или могла сменить место в сортировке
+                    self.refresh()
+                    return
+                chunk.items[index] = new
+        self.ensure()
+    
+    def request(self, kind: str, offset: int = 0, with_total: bool = False, delay: int = 0):
+        """Запрос порции: 'seek' - с номера строки, 'next'/'prev' - от края загруженных"""
+        if self.fetch is None:
+            return
+        fetch, sort, descending, limit = self.fetch, self.sort, self.descending, self.chunk_size
+        if kind == 'next':
+            args = {'cursor': self.chunks[-1].next_cursor}
+        elif kind == 'prev':
+            args = {'cursor': self.chunks[0].prev_cursor}
+        else:
+            args = {'offset': offset, 'with_total': with_total}
+        self.pending = (kind, offset)
+        self.tasks.submit(self.key, lambda: fetch(limit=limit, sort=sort, descending=descending, **args),
+                          on_done=lambda page: self.received(kind, offset, page),
+                          on_error=self.failed, indicator=self.indicator, delay=delay)
+    
+    def failed(self, error: Exception):
+        self.pending = None
+        self.tasks.report_error(error)
+    
+    def received(self, kind: str, offset: int, page: Dict[str, Any]):
+        """Порция строк получена (главный поток)"""
+        self.pending = None
+        self.key_fields = page['key_fields']
+        if page['total'] is not None:
+            self.total = page['total']
+        
+        if kind == 'seek':
+            self.chunks = [Chunk(offset, page)]
+            if not page['items'] and offset > 0:
+                # Строк стало меньше, чем было при подсчете
+                self.total = min(self.total, offset)
+                self.top = max(0, self.total - self.visible)
+                self.chunks = []
+            elif not page['has_more']:
+                self.total = offset + len(page['items'])
+        elif kind == 'next':
+            last = self.chunks[-1]
+            chunk = Chunk(last.end, page)
+            if chunk.items:
+                self.chunks.append(chunk)
+            else:
+                last.next_cursor = None
+            if not page['next_cursor']:
+                # Дошли до конца выборки - число строк известно точно
+                self.total = self.chunks[-1].end
+        else:
+            first = self.chunks[0]
+            chunk = Chunk(first.start - len(page['items']), page)
+            if chunk.items:
+                self.chunks.insert(0, chunk)
+            else:
+                first.prev_cursor = None
+            if not page['prev_cursor'] and self.chunks[0].start != 0:
+                # Дошли до начала выборки - нумерация строк сдвигается к нулю
+                shift = -self.chunks[0].start
+                for loaded in self.chunks:
+                    loaded.start += shift
+                self.top = max(0, self.top + shift)
+        
+        self.evict()
+        self.ensure()
+    
+    def evict(self):
+        """Вытеснение порций, дальних от видимого окна"""
+        while len(self.chunks) > Config.GUI_CACHED_CHUNKS:
+            if self.top - self.chunks[0].start > self.chunks[-1].end - (self.top + self.visible):
+                self.chunks.pop(0)
+            else:
+                self.chunks.pop()
+    
+    def ensure(self):
+        """Вывод окна, если его строки загружены; иначе - запрос недостающих"""
+        self.update_scrollbar()
+        need_start = self.top
+        need_end = min(self.top + self.visible, self.total)
+        if not self.chunks:
+            if self.pending is None:
+                self.request('seek', need_start)
+            return
+        
+        start, end = self.chunks[0].start, self.chunks[-1].end
+        if start <= need_start and need_end <= end:
+            self.render()
+            # Загрузка наперед, пока пользователь смотрит уже загруженные строки
+            if self.pending is None:
+                if end - need_end < Config.GUI_PREFETCH_ROWS and self.chunks[-1].next_cursor:
+                    self.request('next')
+                elif need_start - start < Config.GUI_PREFETCH_ROWS and self.chunks[0].prev_cursor:
+                    self.request('prev')
+            return
+        
+        # Окно рядом с загруженными строками - по ключу от края, далеко - переход по номеру
+        if need_end > end and need_start < end + self.chunk_size and self.chunks[-1].next_cursor:
+            wanted = ('next', 0)
+        elif need_start < start and need_end > start - self.chunk_size and self.chunks[0].prev_cursor:
+            wanted = ('prev', 0)
+        else:
+            wanted = ('seek', max(0, need_start - Config.GUI_PREFETCH_ROWS))
+        if self.pending != wanted:
+            self.request(*wanted)
+    
+    # Отображение
+    
+    def rows(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """Загруженные строки с номерами [start, end)"""
+        result = []
+        for chunk in self.chunks:
+            if chunk.end <= start or chunk.start >= end:
+                continue
+            result.extend(chunk.items[max(0, start - chunk.start):end - chunk.start])
+        return result
+    
+    def render(self):
+        """Значения строк Treeview для текущего окна (число строк Treeview не больше окна)"""
+        rows = self.rows(self.top, min(self.top + self.visible, self.total))
+        slots = self.tree.get_children()
+        if len(slots) > len(rows):
+            self.tree.delete(*slots[len(rows):])
+            slots = slots[:len(rows)]
+        for row, slot in zip(rows, slots):
+            self.tree.item(slot, values=self.row_values(row), tags=self.row_tags(row))
+        for row in rows[len(slots):]:
+            self.tree.insert('', tk.END, values=self.row_values(row), tags=self.row_tags(row))
+        
+        # Выделение следует за строкой, а не за позицией в окне
+        slots = self.tree.get_children()
+        selected = [slot for slot, row in zip(slots, rows) if row['id'] == self.selected_id]
+        if selected:
+            if self.tree.selection() != tuple(selected):
+                self.tree.selection_set(selected)
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+    
+    def update_scrollbar(self):
+        if self.total > self.visible:
+            self.scrollbar.set(self.top / self.total, min(1.0, (self.top + self.visible) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    # Прокрутка и выделение
+    
+    def scroll_to(self, top: int):
+        top = max(0, min(top, self.total - self.visible))
+        if top != self.top:
+            self.top = top
+            self.ensure()
+        return 'break'
+    
+    def scroll(self, rows: int):
+        return self.scroll_to(self.top + rows)
+    
+    def on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(value) * self.total))
+        elif unit == 'pages':
+            self.scroll(int(value) * self.visible)
+        else:
+            self.scroll(int(value))
+    
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            rows = self.rows(self.top, self.top + self.visible)
+            index = self.tree.index(selection[0])
+            if index < len(rows):
+                self.selected_id = rows[index]['id']
+    
+    def move_selection(self, step: int):
+        """Стрелки вверх/вниз у края окна прокручивают таблицу"""
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        index = self.tree.index(selection[0]) + step
+        if 0 <= index < len(self.tree.get_children()):
+            return None             # внутри окна - обычное поведение Treeview
+        target = self.rows(self.top + index, self.top + index + 1)
+        if target:
+            self.selected_id = target[0]['id']
+        return self.scroll(step)
+    
+    def on_resize(self, event):
+        """Число строк окна по фактической высоте таблицы"""
+        slots = self.tree.get_children()
+        bbox = self.tree.bbox(slots[0]) if slots else None
+        if not bbox:
+            return
+        header, row_height = bbox[1], bbox[3]
+        visible = max(1, (event.height - header) // row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, self.total - self.visible))
+            self.ensure()
+    
+    # Сортировка
+    
+    def sort_by(self, column: str):
+        """Сортировка в БД по столбцу; повторный щелчок меняет направление"""
+        sort = self.sorts[column]
+        self.descending = not self.descending if sort == self.sort else False
+        self.sort = sort
+        self.show_sort_marks()
+        self.reload()
+    
+    def set_sort(self, sort: str, descending: bool = False):
+        """Сортировка для следующей загрузки (None - порядок источника строк)"""
+        self.sort = sort
+        self.descending = descending
+        self.show_sort_marks()
+    
+    def show_sort_marks(self):
+        for column, sort in self.sorts.items():
+            mark = SORT_MARKS[self.descending] if sort == self.sort else ''
+            self.tree.heading(column, text=column + mark)
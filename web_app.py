@@ -1,19 +1,27 @@
 # web_app.py - Веб-приложение Flask
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g, make_response
+from flask import before_render_template, template_rendered
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
 import sqlite3
 import json
 import os
 import secrets
 from datetime import datetime
+from urllib.parse import urlencode
 from database import Database
-from auth import AuthManager
+from pagination import clamp_limit
+from auth import AuthManager, SessionCache, session_id
+from security import check_rate_limit
 from config import Config
+import cache
+import metrics
 
 app = Flask(__name__)
 app.secret_key = Config.SECRET_KEY
+web_profile = Config.WEB_PROFILES[Config.WEB_PROFILE]
 
 # Настройка безопасности
 app.config.update(
@@ -21,9 +29,15 @@ app.config.update(
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
     PERMANENT_SESSION_LIFETIME=Config.SESSION_TIMEOUT.total_seconds(),
-    TEMPLATES_AUTO_RELOAD=True
+    TEMPLATES_AUTO_RELOAD=web_profile['templates_auto_reload']
 )
 
+# За обратным прокси request.remote_addr - адрес клиента из X-Forwarded-For
+# (Config.WEB_PROXY_HOPS), а не адрес прокси
+if Config.WEB_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.WEB_PROXY_HOPS,
+                            x_proto=Config.WEB_PROXY_HOPS, x_host=Config.WEB_PROXY_HOPS)
+
 # Настройка CORS
 CORS(app, origins=Config.CORS_ORIGINS)
 
@@ -42,23 +56,132 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    db = Database()
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
+    """Пользователь запроса из кэша сессий: без обращения к БД, пока запись свежая"""
     try:
-        cursor.execute("SELECT * FROM employees WHERE id = ? AND is_active = 1", (user_id,))
-        user_data = cursor.fetchone()
-        
-        if user_data:
-            return User(dict(user_data))
+        user_id = int(user_id)
+    except (TypeError, ValueError):
         return None
-    finally:
-        conn.close()
+    
+    user_data = get_session_cache().get_user(user_id, session.get('sid'))
+    if user_data:
+        return User(user_data)
+    return None
+
+_db = None
+_session_cache = None
 
 def get_db():
-    """Получение подключения к БД"""
-    return Database()
+    """Общий для процесса экземпляр БД (схема инициализируется при первом вызове)"""
+    global _db
+    if _db is None:
+        _db = Database(Config.DATABASE_PATH)
+    return _db
+
+def get_session_cache():
+    """Общий для процесса кэш сотрудников и сессий"""
+    global _session_cache
+    if _session_cache is None:
+        _session_cache = SessionCache(get_db())
+    return _session_cache
+
+def release_db():
+    """Закрытие соединений и очередей аудита процесса (перед fork и при остановке воркера);
+    следующий get_db() откроет их заново"""
+    global _db, _session_cache
+    if _db is not None:
+        _db.close()
+    _db = None
+    _session_cache = None
+
+# Кэш публичных страниц (см. cache.py)
+response_cache = cache.ResponseCache(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_TTL)
+
+def cached_page(*tags):
+    """Декоратор: кэширование страницы для анонимных посетителей.
+    
+    tags - теги данных страницы, могут ссылаться на аргументы маршрута:
+    'product:{product_id}'. Ключ - путь и отсортированные аргументы запроса.
+    Ответы с ошибкой и страницы, при построении которых установлен
+    g.skip_page_cache, не кэшируются.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Вошедшим пользователям и при ожидающих flash-сообщениях страница
+            # строится заново: в ней есть персональные данные
+            if (not Config.RESPONSE_CACHE_ENABLED or request.method != 'GET'
+                    or current_user.is_authenticated or session.get('_flashes')):
+                return f(*args, **kwargs)
+            
+            key = f"{request.path}?{urlencode(sorted(request.args.items(multi=True)))}"
+            cached = response_cache.get(key)
+            if cached is not None:
+                body, mimetype = cached
+                response = app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            generation = response_cache.generation()
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not g.get('skip_page_cache'):
+                response_cache.set(key, (response.get_data(), response.mimetype),
+                                   [tag.format(**kwargs) for tag in tags],
+                                   generation=generation)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated_function
+    return decorator
+
+def conditional_response(resource: str, build, etag_suffix: str = ''):
+    """Ответ с ETag и Last-Modified по версии данных ресурса (см. Database.get_data_version).
+    
+    Если If-None-Match содержит текущий ETag (или, без If-None-Match,
+    If-Modified-Since не раньше последнего изменения), возвращается 304
+    без вызова build() - основной запрос не выполняется.
+    """
+    version = get_db().get_data_version(resource)
+    etag = f"{resource}-{version['version']}{etag_suffix}"
+    last_modified = version['modified_at']
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified <= request.if_modified_since)
+    
+    response = app.response_class(status=304) if not_modified else make_response(build())
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # Клиент хранит ответ, но перед использованием переспрашивает
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def rate_limited(action: str):
+    """Декоратор: ограничение частоты изменяющих запросов (POST/PUT/DELETE)
+    с одного IP по Config.RATE_LIMITS[action]; при превышении - 429 с Retry-After"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method in ('GET', 'HEAD', 'OPTIONS'):
+                return f(*args, **kwargs)
+            
+            limit, window = Config.RATE_LIMITS[action]
+            retry_after = check_rate_limit(request.remote_addr, action, limit, window)
+            if not retry_after:
+                return f(*args, **kwargs)
+            
+            message = "Слишком много запросов, повторите позже"
+            if request.path.startswith('/api/'):
+                response = jsonify({"error": message})
+            else:
+                flash(message, "error")
+                response = make_response(render_template('login.html'))
+            response.status_code = 429
+            response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response
+        return decorated_function
+    return decorator
 
 def role_required(role):
     """Декоратор для проверки роли"""
@@ -74,6 +197,28 @@ def role_required(role):
         return decorated_function
     return decorator
 
+# Метрики запросов (см. metrics.py)
+if Config.REQUEST_METRICS_ENABLED:
+    metrics.install()
+    
+    @app.before_request
+    def start_request_metrics():
+        metrics.begin_request()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.end_request(request.method, route, response.status_code)
+        return response
+    
+    @before_render_template.connect_via(app)
+    def start_template_metrics(sender, template, context, **extra):
+        metrics.template_started()
+    
+    @template_rendered.connect_via(app)
+    def finish_template_metrics(sender, template, context, **extra):
+        metrics.template_finished()
+
 @app.context_processor
 def inject_globals():
     """Добавляет глобальные переменные во все шаблоны"""
@@ -84,6 +229,7 @@ def inject_globals():
     }
 
 @app.route('/')
+@cached_page('content:index', 'products', 'orders', 'clients')
 def index():
     """Главная страница сайта"""
     db = get_db()
@@ -92,15 +238,8 @@ def index():
     
     try:
         # Получаем контент для главной страницы
-        cursor.execute("""
-            SELECT * FROM website_content 
-            WHERE page_name = 'index' AND is_published = 1 
-            ORDER BY section
-        """)
-        
         sections = {}
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in db.get_page_content('index'):
             sections[row_dict['section']] = {
                 'content': row_dict['content'],
                 'content_type': row_dict['content_type']
@@ -111,18 +250,11 @@ def index():
         products = [dict(row) for row in cursor.fetchall()]
         
         # Получаем статистику для отображения
-        cursor.execute("SELECT COUNT(*) as count FROM products WHERE is_active = 1")
-        products_count = cursor.fetchone()['count']
+        counts = db.get_dashboard_counts()
+        products_count = counts['products_count']
+        clients_count = counts['clients_count']
         
-        cursor.execute("SELECT COUNT(*) as count FROM clients WHERE is_active = 1")
-        clients_count = cursor.fetchone()['count']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM orders 
-            WHERE status = 'completed' 
-            AND DATE(created_at) = DATE('now')
-        """)
-        today_orders = cursor.fetchone()['count']
+        today_orders = db.get_today_sales()['order_count']
         
         return render_template('index.html', 
                              sections=sections, 
@@ -131,6 +263,7 @@ def index():
                              clients_count=clients_count,
                              today_orders=today_orders)
     except Exception as e:
+        g.skip_page_cache = True
         app.logger.error(f"Ошибка на главной странице: {e}")
         return render_template('error.html', 
                              error="Ошибка загрузки страницы",
@@ -139,6 +272,7 @@ def index():
         conn.close()
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limited('login')
 def web_login():
     """Вход на сайт для сотрудников"""
     if current_user.is_authenticated:
@@ -162,6 +296,8 @@ def web_login():
         if user:
             user_obj = User(user)
             login_user(user_obj)
+            # Сессия действует, пока активна запись user_sessions с этим токеном
+            session['sid'] = session_id(user['token'])
             
             # Логируем вход через веб
             db.log_audit(
@@ -199,6 +335,7 @@ def web_logout():
     
     auth.logout(current_user.id)
     logout_user()
+    session.pop('sid', None)
     flash("Вы успешно вышли из системы", "success")
     return redirect(url_for('index'))
 
@@ -208,45 +345,21 @@ def web_logout():
 def admin_panel():
     """Панель управления контентом"""
     db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
     
     try:
         # Получаем статистику для панели управления
-        cursor.execute("SELECT COUNT(*) as count FROM products WHERE is_active = 1")
-        products_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM clients WHERE is_active = 1")
-        clients_count = cursor.fetchone()['count']
+        counts = db.get_dashboard_counts()
+        products_count = counts['products_count']
+        clients_count = counts['clients_count']
+        orders_count = counts['orders_count']
         
-        cursor.execute("SELECT COUNT(*) as count FROM orders")
-        orders_count = cursor.fetchone()['count']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM orders 
-            WHERE status = 'completed' 
-            AND DATE(created_at) = DATE('now')
-        """)
-        today_orders = cursor.fetchone()['count']
+        today_orders = db.get_today_sales()['order_count']
         
         # Получаем последние заказы
-        cursor.execute("""
-            SELECT o.*, c.full_name as client_name 
-            FROM orders o
-            LEFT JOIN clients c ON o.client_id = c.id
-            ORDER BY o.created_at DESC 
-            LIMIT 5
-        """)
-        recent_orders = [dict(row) for row in cursor.fetchall()]
+        recent_orders = db.get_recent_orders(limit=5)
         
         # Получаем товары с низким запасом
-        cursor.execute("""
-            SELECT * FROM products 
-            WHERE is_active = 1 AND quantity < min_quantity
-            ORDER BY quantity ASC 
-            LIMIT 5
-        """)
-        low_stock = [dict(row) for row in cursor.fetchall()]
+        low_stock = db.get_low_stock(limit=5)
         
         return render_template('admin_panel.html',
                              products_count=products_count,
@@ -260,8 +373,6 @@ def admin_panel():
         return render_template('error.html',
                              error="Ошибка загрузки панели управления",
                              message="Произошла ошибка при загрузке данных")
-    finally:
-        conn.close()
 
 @app.route('/admin/content')
 @login_required
@@ -302,29 +413,22 @@ def content_management():
 
 @app.route('/api/content', methods=['GET'])
 def get_content():
-    """API для получения контента"""
+    """API для получения контента (поддерживает If-None-Match / If-Modified-Since)"""
     page = request.args.get('page', 'index')
     
-    db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
-            SELECT * FROM website_content 
-            WHERE page_name = ? AND is_published = 1
-            ORDER BY section
-        """, (page,))
+    def build():
+        db = get_db()
         
-        content = [dict(row) for row in cursor.fetchall()]
-        return jsonify(content)
-    except Exception as e:
-        app.logger.error(f"Ошибка получения контента: {e}")
-        return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+        try:
+            return jsonify(db.get_page_content(page))
+        except Exception as e:
+            app.logger.error(f"Ошибка получения контента: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    return conditional_response('content', build)
 
 @app.route('/api/content', methods=['POST', 'PUT', 'DELETE'])
+@rate_limited('api_write')
 @login_required
 def manage_content():
     """API для управления контентом"""
@@ -343,12 +447,7 @@ def manage_content():
     try:
         if request.method == 'POST':
             # Проверяем существование
-            cursor.execute("""
-                SELECT id FROM website_content 
-                WHERE page_name = ? AND section = ?
-            """, (data['page_name'], data['section']))
-            
-            if cursor.fetchone():
+            if db.content_section_exists(data['page_name'], data['section']):
                 return jsonify({"error": "Раздел уже существует"}), 400
             
             cursor.execute("""
@@ -366,7 +465,7 @@ def manage_content():
             ))
             
             action = 'CREATE_CONTENT'
-            
+        
         elif request.method == 'PUT':
             cursor.execute("""
                 UPDATE website_content 
@@ -390,7 +489,7 @@ def manage_content():
                 return jsonify({"error": "Раздел не найден"}), 404
             
             action = 'UPDATE_CONTENT'
-            
+        
         elif request.method == 'DELETE':
             cursor.execute("""
                 DELETE FROM website_content 
@@ -403,6 +502,7 @@ def manage_content():
             action = 'DELETE_CONTENT'
         
         conn.commit()
+        cache.invalidate(f"content:{data['page_name']}")
         
         # Логируем действие
         db.log_audit(
@@ -416,7 +516,7 @@ def manage_content():
         )
         
         return jsonify({"success": True})
-        
+    
     except Exception as e:
         conn.rollback()
         app.logger.error(f"Ошибка управления контентом: {e}")
@@ -425,11 +525,12 @@ def manage_content():
         conn.close()
 
 @app.route('/products')
+@cached_page('products')
 def products_page():
     """Страница товаров"""
     category = request.args.get('category')
     search = request.args.get('search', '')
-    page = int(request.args.get('page', 1))
+    page_cursor = request.args.get('cursor')
     per_page = 12
     
     db = get_db()
@@ -445,44 +546,29 @@ def products_page():
         """)
         categories = [row['category'] for row in cursor.fetchall()]
         
-        # Строим запрос в зависимости от параметров
-        query = """
-            SELECT * FROM products 
-            WHERE is_active = 1
-        """
-        params = []
-        
-        if category and category != 'Все':
-            query += " AND category = ?"
-            params.append(category)
-        
-        if search:
-            query += " AND (name LIKE ? OR sku LIKE ? OR description LIKE ?)"
-            search_term = f"%{search}%"
-            params.extend([search_term, search_term, search_term])
-        
-        query += " ORDER BY name"
-        
-        # Получаем товары
-        cursor.execute(query, params)
-        all_products = [dict(row) for row in cursor.fetchall()]
-        
-        # Пагинация
-        total = len(all_products)
-        start = (page - 1) * per_page
-        end = start + per_page
-        products = all_products[start:end]
-        total_pages = (total + per_page - 1) // per_page
+        # Получаем страницу товаров по курсору
+        try:
+            selected = category if category and category != 'Все' else None
+            if search.strip():
+                page = db.search_products(search, category=selected, limit=per_page,
+                                          cursor=page_cursor, with_total=True)
+            else:
+                page = db.get_products_page(category=selected, limit=per_page,
+                                            cursor=page_cursor, with_total=True)
+        except ValueError:
+            # Поврежденный курсор - показываем первую страницу
+            return redirect(url_for('products_page', category=category, search=search))
         
         return render_template('products.html', 
-                             products=products,
+                             products=page['items'],
                              categories=categories,
                              selected_category=category,
                              search=search,
-                             page=page,
-                             total_pages=total_pages,
-                             total=total)
+                             next_cursor=page['next_cursor'],
+                             prev_cursor=page['prev_cursor'],
+                             total=page['total'])
     except Exception as e:
+        g.skip_page_cache = True
         app.logger.error(f"Ошибка страницы товаров: {e}")
         return render_template('error.html',
                              error="Ошибка загрузки товаров",
@@ -491,6 +577,7 @@ def products_page():
         conn.close()
 
 @app.route('/product/<int:product_id>')
+@cached_page('product:{product_id}')
 def product_detail(product_id):
     """Страница товара"""
     db = get_db()
@@ -524,6 +611,7 @@ def product_detail(product_id):
                              product=dict(product),
                              similar_products=similar_products)
     except Exception as e:
+        g.skip_page_cache = True
         app.logger.error(f"Ошибка детальной страницы товара: {e}")
         return render_template('error.html',
                              error="Ошибка загрузки товара",
@@ -533,32 +621,41 @@ def product_detail(product_id):
 
 @app.route('/api/products')
 def api_products():
-    """API для получения товаров"""
+    """API для получения товаров.
+    
+    Тело ответа - список товаров; курсор следующей страницы передается
+    в заголовках X-Next-Cursor и Link (rel="next").
+    Поддерживает If-None-Match / If-Modified-Since.
+    """
     category = request.args.get('category')
-    limit = int(request.args.get('limit', 50))
+    limit = clamp_limit(request.args.get('limit', 50))
+    page_cursor = request.args.get('cursor')
     
-    db = get_db()
-    products = db.get_products(category=category, limit=limit)
+    def build():
+        db = get_db()
+        try:
+            page = db.get_products_page(category=category, limit=limit, cursor=page_cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        response = jsonify(page['items'])
+        if page['next_cursor']:
+            response.headers['X-Next-Cursor'] = page['next_cursor']
+            next_url = url_for('api_products', category=category, limit=limit, cursor=page['next_cursor'])
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        return response
     
-    return jsonify(products)
+    return conditional_response('products', build)
 
 @app.route('/about')
+@cached_page('content:about')
 def about_page():
     """Страница "О компании" """
     db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            SELECT * FROM website_content 
-            WHERE page_name = 'about' AND is_published = 1
-            ORDER BY section
-        """)
-        
         sections = {}
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in db.get_page_content('about'):
             sections[row_dict['section']] = {
                 'content': row_dict['content'],
                 'content_type': row_dict['content_type']
@@ -566,30 +663,21 @@ def about_page():
         
         return render_template('about.html', sections=sections)
     except Exception as e:
+        g.skip_page_cache = True
         app.logger.error(f"Ошибка страницы 'О компании': {e}")
         return render_template('error.html',
                              error="Ошибка загрузки страницы",
                              message="Произошла ошибка при загрузке данных")
-    finally:
-        conn.close()
 
 @app.route('/contacts')
+@cached_page('content:contacts')
 def contacts_page():
     """Страница контактов"""
     db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            SELECT * FROM website_content 
-            WHERE page_name = 'contacts' AND is_published = 1
-            ORDER BY section
-        """)
-        
         sections = {}
-        for row in cursor.fetchall():
-            row_dict = dict(row)
+        for row_dict in db.get_page_content('contacts'):
             sections[row_dict['section']] = {
                 'content': row_dict['content'],
                 'content_type': row_dict['content_type']
@@ -597,12 +685,11 @@ def contacts_page():
         
         return render_template('contacts.html', sections=sections)
     except Exception as e:
+        g.skip_page_cache = True
         app.logger.error(f"Ошибка страницы контактов: {e}")
         return render_template('error.html',
                              error="Ошибка загрузки страницы",
                              message="Произошла ошибка при загрузке данных")
-    finally:
-        conn.close()
 
 @app.route('/admin/users')
 @login_required
@@ -614,7 +701,12 @@ def users_management():
     cursor = conn.cursor()
     
     try:
-        cursor.execute("SELECT * FROM employees ORDER BY role, username")
+        # Без хэшей паролей и токенов сессий
+        cursor.execute("""
+            SELECT id, username, full_name, email, phone, position, role, is_active,
+                   created_at, last_login
+            FROM employees ORDER BY role, username
+        """)
         users = [dict(row) for row in cursor.fetchall()]
         
         return render_template('users_management.html', users=users)
@@ -632,51 +724,36 @@ def users_management():
 def orders_management():
     """Управление заказами (для менеджеров и админов)"""
     status = request.args.get('status', 'Все')
+    page_cursor = request.args.get('cursor')
+    per_page = 50
     
     db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
     
     try:
-        if status != 'Все':
-            cursor.execute("""
-                SELECT o.*, c.full_name as client_name, e.full_name as employee_name
-                FROM orders o
-                LEFT JOIN clients c ON o.client_id = c.id
-                LEFT JOIN employees e ON o.employee_id = e.id
-                WHERE o.status = ?
-                ORDER BY o.created_at DESC
-            """, (status,))
-        else:
-            cursor.execute("""
-                SELECT o.*, c.full_name as client_name, e.full_name as employee_name
-                FROM orders o
-                LEFT JOIN clients c ON o.client_id = c.id
-                LEFT JOIN employees e ON o.employee_id = e.id
-                ORDER BY o.created_at DESC
-            """)
+        try:
+            page = db.get_orders_page(
+                status=status if status != 'Все' else None,
+                limit=per_page,
+                cursor=page_cursor
+            )
+        except ValueError:
+            return redirect(url_for('orders_management', status=status))
         
-        orders = [dict(row) for row in cursor.fetchall()]
+        orders = page['items']
         
         # Статистика по заказам
-        cursor.execute("SELECT COUNT(*) as total FROM orders")
-        total_orders = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM orders WHERE status = 'pending'")
-        pending_orders = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM orders WHERE status = 'processing'")
-        processing_orders = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM orders WHERE status = 'completed'")
-        completed_orders = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM orders WHERE status = 'cancelled'")
-        cancelled_orders = cursor.fetchone()['count']
+        counts = db.get_dashboard_counts()
+        total_orders = counts['orders_count']
+        pending_orders = counts['orders_by_status']['pending']
+        processing_orders = counts['orders_by_status']['processing']
+        completed_orders = counts['orders_by_status']['completed']
+        cancelled_orders = counts['orders_by_status']['cancelled']
         
         return render_template('orders_management.html',
                              orders=orders,
                              status=status,
+                             next_cursor=page['next_cursor'],
+                             prev_cursor=page['prev_cursor'],
                              total_orders=total_orders,
                              pending_orders=pending_orders,
                              processing_orders=processing_orders,
@@ -687,8 +764,6 @@ def orders_management():
         return render_template('error.html',
                              error="Ошибка загрузки заказов",
                              message="Произошла ошибка при загрузке данных")
-    finally:
-        conn.close()
 
 @app.route('/profile')
 @login_required
@@ -706,29 +781,12 @@ def user_profile():
         user = cursor.fetchone()
         
         # Получаем статистику пользователя
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM orders 
-            WHERE employee_id = ?
-        """, (current_user.id,))
-        
-        user_orders = cursor.fetchone()['count']
-        
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM orders 
-            WHERE employee_id = ? AND status = 'completed'
-        """, (current_user.id,))
-        
-        completed_orders = cursor.fetchone()['count']
+        order_counts = db.get_employee_order_counts(current_user.id)
+        user_orders = order_counts['total']
+        completed_orders = order_counts['completed']
         
         # Получаем последние действия пользователя
-        cursor.execute("""
-            SELECT * FROM audit_log 
-            WHERE employee_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 10
-        """, (current_user.id,))
-        
-        recent_actions = [dict(row) for row in cursor.fetchall()]
+        recent_actions = db.get_employee_actions(current_user.id, limit=10)
         
         return render_template('profile.html',
                              user=dict(user),
@@ -775,14 +833,7 @@ def api_order_details(order_id):
             return jsonify({"error": "Заказ не найден"}), 404
         
         # Получаем товары в заказе
-        cursor.execute("""
-            SELECT oi.*, p.name, p.sku, p.category
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id = ?
-        """, (order_id,))
-        
-        items = [dict(row) for row in cursor.fetchall()]
+        items = db.get_order_items(order_id)
         
         return jsonify({
             'order': dict(order),
@@ -795,6 +846,7 @@ def api_order_details(order_id):
         conn.close()
 
 @app.route('/api/order/<int:order_id>/status', methods=['POST'])
+@rate_limited('api_write')
 @login_required
 def api_update_order_status(order_id):
     """API для обновления статуса заказа"""
@@ -828,6 +880,7 @@ def api_update_order_status(order_id):
         """, (new_status, new_status, order_id))
         
         conn.commit()
+        cache.invalidate('orders')
         
         # Логируем действие
         db.log_audit(
@@ -843,8 +896,7 @@ def api_update_order_status(order_id):
         
         # Если отмена заказа, возвращаем товары на склад
         if new_status == 'cancelled' and order['status'] != 'cancelled':
-            cursor.execute("SELECT product_id, quantity FROM order_items WHERE order_id = ?", (order_id,))
-            items = cursor.fetchall()
+            items = db.get_order_item_quantities(order_id)
             
             for item in items:
                 cursor.execute("""
@@ -855,6 +907,7 @@ def api_update_order_status(order_id):
                 """, (item['quantity'], item['product_id']))
             
             conn.commit()
+            cache.invalidate('products', *(f"product:{item['product_id']}" for item in items))
         
         return jsonify({"success": True})
     except Exception as e:
@@ -866,79 +919,44 @@ def api_update_order_status(order_id):
 
 @app.route('/api/stats')
 def api_stats():
-    """API для получения статистики"""
-    db = get_db()
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Общая статистика
-        cursor.execute("SELECT COUNT(*) as count FROM products WHERE is_active = 1")
-        products_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM clients WHERE is_active = 1")
-        clients_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM orders")
-        orders_count = cursor.fetchone()['count']
-        
-        # Статистика продаж за сегодня
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as today_orders,
-                COALESCE(SUM(total_amount), 0) as today_revenue
-            FROM orders 
-            WHERE DATE(created_at) = DATE('now') 
-                AND status = 'completed'
-        """)
-        today_stats = cursor.fetchone()
-        
-        # Статистика по месяцам
-        cursor.execute("""
-            SELECT 
-                strftime('%Y-%m', created_at) as month,
-                COUNT(*) as order_count,
-                COALESCE(SUM(total_amount), 0) as revenue
-            FROM orders 
-            WHERE status = 'completed'
-                AND created_at >= date('now', '-6 months')
-            GROUP BY strftime('%Y-%m', created_at)
-            ORDER BY month DESC
-        """)
-        monthly_stats = [dict(row) for row in cursor.fetchall()]
-        
-        # Топ товаров
-        cursor.execute("""
-            SELECT 
-                p.name,
-                p.sku,
-                SUM(oi.quantity) as total_sold,
-                SUM(oi.total_price) as total_revenue
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.status = 'completed'
-                AND o.created_at >= date('now', '-30 days')
-            GROUP BY p.id
-            ORDER BY total_revenue DESC
-            LIMIT 5
-        """)
-        top_products = [dict(row) for row in cursor.fetchall()]
+    """API для получения статистики (поддерживает If-None-Match / If-Modified-Since)"""
+    def build():
+        db = get_db()
         
-        return jsonify({
-            'products_count': products_count,
-            'clients_count': clients_count,
-            'orders_count': orders_count,
-            'today_orders': today_stats['today_orders'],
-            'today_revenue': today_stats['today_revenue'],
-            'monthly_stats': monthly_stats,
-            'top_products': top_products
-        })
-    except Exception as e:
-        app.logger.error(f"Ошибка получения статистики: {e}")
-        return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+        try:
+            # Общая статистика
+            counts = db.get_dashboard_counts()
+            products_count = counts['products_count']
+            clients_count = counts['clients_count']
+            orders_count = counts['orders_count']
+            
+            # Продажи из сводных таблиц
+            sales = db.get_sales_summary(months=6, top_days=30, top_limit=5)
+            monthly_stats = [
+                {'month': m['month'], 'order_count': m['order_count'], 'revenue': m['total_sales']}
+                for m in sales['monthly']
+            ]
+            top_products = [
+                {'name': p['name'], 'sku': p['sku'], 'total_sold': p['total_sold'],
+                 'total_revenue': p['total_revenue']}
+                for p in sales['top_products']
+            ]
+            
+            return jsonify({
+                'products_count': products_count,
+                'clients_count': clients_count,
+                'orders_count': orders_count,
+                'today_orders': sales['today']['order_count'],
+                'today_revenue': sales['today']['total_sales'],
+                'monthly_stats': monthly_stats,
+                'top_products': top_products
+            })
+        except Exception as e:
+            app.logger.error(f"Ошибка получения статистики: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    # Статистика зависит и от текущей даты (продажи за сегодня, последние 30 дней)
+    return conditional_response('stats', build, etag_suffix=f"-{datetime.utcnow():%Y%m%d}")
 
 @app.route('/health')
 def health_check():
@@ -954,7 +972,11 @@ def health_check():
             "status": "ok",
             "service": "trade_enterprise_web",
             "timestamp": datetime.now().isoformat(),
-            "database": "connected"
+            "database": "connected",
+            "db_pool": db.pool_stats(),
+            "audit": db.audit_stats(),
+            "response_cache": response_cache.stats(),
+            "user_cache": get_session_cache().stats()
         })
     except Exception as e:
         return jsonify({
@@ -964,6 +986,30 @@ def health_check():
             "error": str(e)
         }), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus: для администраторов
+    или сборщика с заголовком Authorization: Bearer <Config.METRICS_TOKEN>"""
+    token = Config.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if token and secrets.compare_digest(authorization, f"Bearer {token}"):
+        return metrics_response()
+    return admin_metrics_response()
+
+def metrics_response():
+    db = get_db()
+    body = metrics.render({
+        'db_pool': db.pool_stats(),
+        'audit': db.audit_stats(),
+        'response_cache': response_cache.stats(),
+        'user_cache': get_session_cache().stats(),
+    })
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+@role_required('admin')
+def admin_metrics_response():
+    return metrics_response()
+
 @app.errorhandler(404)
 def page_not_found(e):
     """Обработчик 404 ошибок"""
@@ -1057,19 +1103,32 @@ def init_website_content():
     finally:
         conn.close()
 
+def preload():
+    """Подготовка приложения в главном процессе gunicorn до запуска воркеров (wsgi.py):
+    миграции, контент сайта и компиляция шаблонов выполняются один раз, воркеры
+    получают результат через fork. Соединения SQLite через fork не переносятся -
+    они закрываются, и каждый воркер открывает свои."""
+    get_db()
+    init_website_content()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    release_db()
+
 if __name__ == '__main__':
     print(f"Запуск веб-приложения на http://localhost:5000")
     
     # Создаем директорию для шаблонов, если её нет
     os.makedirs('templates', exist_ok=True)
     
-    # Инициализируем контент сайта
+    # Инициализируем схему БД и контент сайта
+    settings = get_db().get_effective_settings()
+    print("Настройки SQLite: " + ", ".join(f"{k}={v}" for k, v in settings.items()))
     init_website_content()
     
     # Запускаем приложение
     app.run(
         host='0.0.0.0',
         port=5000,
-        debug=True,
+        debug=web_profile['debug'],
         ssl_context='adhoc' if Config.REQUIRE_HTTPS else None
     )
\ No newline at end of file
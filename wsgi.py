@@ -0,0 +1,13 @@
+# wsgi.py - Точка входа веб-приложения для production-сервера
+#
+# Запуск: gunicorn -c gunicorn.conf.py wsgi:app
+# Профиль 'production' (Config.WEB_PROFILES): без отладчика, шаблоны не
+# перечитываются с диска на каждом запросе.
+import os
+
+os.environ.setdefault('WEB_PROFILE', 'production')
+
+from web_app import app, preload
+
+# При preload_app (gunicorn.conf.py) выполняется один раз в главном процессе
+preload()